@@ -43,6 +43,7 @@ bmi_state_space_models=dict(
 extractors = dict(
     spikecounts = extractor.BinnedSpikeCountsExtractor,
     LFPpowerMTM = extractor.LFPMTMPowerExtractor,
+    LFPpowerMTMFast = extractor.FastLFPMTMPowerExtractor,
 )
 
 kin_extractors = dict(
@@ -15,14 +15,32 @@ import pickle
 import tables
 import matplotlib.pyplot as plt
 import time
+import traceback
 from collections import defaultdict, OrderedDict
+from concurrent.futures import ProcessPoolExecutor
 
 import db
 from tracker import models
+from utils.result_cache import ResultCache
 
 # default DB, change this variable from python session to switch to other database
 db_name = 'default'
 
+# location and maximum size of the cache of analysis results, see TaskEntry.get_cached_attr
+result_cache_dir = '/storage/task_supplement/cache'
+result_cache_max_bytes = 10*2**30
+_result_cache = None
+
+def get_result_cache():
+    '''
+    Returns the utils.result_cache.ResultCache in result_cache_dir
+    '''
+    global _result_cache
+    if _result_cache is None or _result_cache.cache_dir != result_cache_dir:
+        _result_cache = ResultCache(result_cache_dir, max_bytes=result_cache_max_bytes)
+    _result_cache.max_bytes = result_cache_max_bytes
+    return _result_cache
+
 
 class TaskEntry(object):
     '''
@@ -78,18 +96,6 @@ class TaskEntry(object):
         self.calendar_date = datetime.datetime(self.date.year, self.date.month, self.date.day)
 
         self.notes = self.record.notes
-        self.subject = models.Subject.objects.using(dbname).get(pk=self.record.subject_id).name
-
-        # Load decoder record
-        if 'decoder' in self.params:
-            self.decoder_record = models.Decoder.objects.using(self.record._state.db).get(pk=self.params['decoder'])
-        elif 'bmi' in self.params:
-            self.decoder_record = models.Decoder.objects.using(self.record._state.db).get(pk=self.params['bmi'])
-        else: # Try direct lookup
-            try:
-                self.decoder_record = models.Decoder.objects.using(self.record._state.db).get(entry_id=self.id)
-            except:
-                self.decoder_record = None
 
         # Load the event log (report)
         try:
@@ -97,61 +103,200 @@ class TaskEntry(object):
         except:
             self.report = ''
 
+        # The subject, the decoder record and the trial messages in the HDF file are
+        # looked up the first time they are used (see the properties below)
 
-        # Parse out trial messages into separate trials
-        if os.path.exists(self.hdf_filename):
-            try:
-                task_msgs = self.hdf.root.task_msgs[:]
-                # Ignore the last message if it's the "None" transition used to stop the task
-                if task_msgs[-1]['msg'] == 'None':
-                    task_msgs = task_msgs[:-1]
+    @classmethod
+    def from_ids(cls, task_entry_ids, dbname='default', **kwargs):
+        '''
+        Construct TaskEntry objects for many blocks at once. The task entry, subject, task,
+        decoder and HDF file records of all the blocks are fetched with a fixed number of
+        queries instead of several queries per block.
 
-                # ignore "update bmi" messages. These have been removed in later datasets
-                task_msgs = task_msgs[task_msgs['msg'] != 'update_bmi']
+        Parameters
+        ----------
+        task_entry_ids : iterable
+            'id' numbers (or models.TaskEntry records) of the TaskEntry blocks
+        dbname : string, optional, default='default'
+            Name of database, see TaskEntry.__init__
+        **kwargs : dict
+            Passed to the constructor of each block
 
-                # Try to add the target index.. these are not present in every task type
+        Returns
+        -------
+        list of TaskEntry instances, in the same order as task_entry_ids
+        '''
+        task_entry_ids = [x.id if isinstance(x, models.TaskEntry) else x for x in task_entry_ids]
+        records = models.TaskEntry.objects.using(dbname).select_related('subject', 'task').in_bulk(task_entry_ids)
+        missing = [x for x in task_entry_ids if x not in records]
+        if len(missing) > 0:
+            raise models.TaskEntry.DoesNotExist("No TaskEntry with id(s) %s" % missing)
+
+        task_entries = [cls(records[x], dbname=dbname, **kwargs) for x in task_entry_ids]
+
+        # decoders used in each block (from the 'decoder'/'bmi' parameters), or else trained in the block
+        decoder_ids = [te._decoder_id for te in task_entries if te._decoder_id is not None]
+        decoders = models.Decoder.objects.using(dbname).in_bulk(decoder_ids)
+        trained_decoders = defaultdict(list)
+        for dec in models.Decoder.objects.using(dbname).filter(entry_id__in=task_entry_ids):
+            trained_decoders[dec.entry_id].append(dec)
+
+        hdf_files = defaultdict(list)
+        for df in models.DataFile.objects.using(dbname).filter(entry_id__in=task_entry_ids, system__name='hdf').select_related('system'):
+            hdf_files[df.entry_id].append(df)
+        data_path = models.KeyValueStore.get('data_path', default='/storage', dbname=dbname)
+
+        for te in task_entries:
+            # (a missing decoder is looked up, and errors, on first use as for a single block)
+            if te._decoder_id in decoders:
+                te._decoder_record = decoders[te._decoder_id]
+            elif te._decoder_id is None:
+                if len(trained_decoders[te.id]) == 1:
+                    te._decoder_record = trained_decoders[te.id][0]
+                else:
+                    te._decoder_record = None
+
+            if len(hdf_files[te.id]) == 0:
+                te._hdf_filename = ''
+            elif len(hdf_files[te.id]) == 1:
+                q = hdf_files[te.id][0]
+                te._hdf_filename = os.path.join(data_path, 'rawdata', q.system.name, q.path)
+            else:
+                te._hdf_filename = None
+        return task_entries
+
+    @property
+    def subject(self):
+        '''
+        Name of the subject
+        '''
+        if not hasattr(self, '_subject'):
+            self._subject = self.record.subject.name
+        return self._subject
+
+    @subject.setter
+    def subject(self, value):
+        self._subject = value
+
+    @property
+    def _decoder_id(self):
+        '''
+        Database ID of the decoder specified in the block parameters, if any
+        '''
+        if 'decoder' in self.params:
+            return self.params['decoder']
+        elif 'bmi' in self.params:
+            return self.params['bmi']
+        else:
+            return None
+
+    @property
+    def decoder_record(self):
+        '''
+        Database record of the decoder used in this block, if specified in the parameters.
+        Otherwise, the decoder trained in this block, or None
+        '''
+        if not hasattr(self, '_decoder_record'):
+            if self._decoder_id is not None:
+                self._decoder_record = models.Decoder.objects.using(self.record._state.db).get(pk=self._decoder_id)
+            else: # Try direct lookup
                 try:
-                    target_index = self.hdf.root.task[:]['target_index'].ravel()
-                    task_msg_dtype = np.dtype([('msg', '|S256'), ('time', '<u4'), ('target_index', 'f8')])
-                    task_msgs_ext = np.zeros(len(task_msgs), dtype=task_msg_dtype)
-                    for k in range(len(task_msgs)):
-                        task_msgs_ext[k]['msg'] = task_msgs[k]['msg']
-                        task_msgs_ext[k]['time'] = task_msgs[k]['time']
-                        try:
-                            task_msgs_ext[k]['target_index'] = target_index[task_msgs[k]['time']]
-                        except:
-                            task_msgs_ext[k]['target_index'] = np.nan
-
-                    self.task_msgs = task_msgs_ext
+                    self._decoder_record = models.Decoder.objects.using(self.record._state.db).get(entry_id=self.id)
                 except:
-                    self.task_msgs = task_msgs
+                    self._decoder_record = None
+        return self._decoder_record
 
-                ## Split the task messages into separate trials
-                self.trial_end_states = self.record.task.get().trial_end_states
-                self.trial_msgs = []
-                try:
-                    # A new trial starts in either the 'wait' state or when 'targ_transition' has a target_index of -1
-                    trial_start = np.logical_or(self.task_msgs['msg'] == 'wait', np.logical_and(self.task_msgs['msg'] == 'targ_transition', self.task_msgs['target_index'] == -1))
-                    trial_start_inds, = np.nonzero(trial_start)
-                    trial_end_inds = np.hstack([trial_start_inds[1:], len(trial_start)])
+    @property
+    def trial_end_states(self):
+        '''
+        Names of the states which end a trial of the task performed during this block
+        '''
+        if not hasattr(self, '_trial_end_states'):
+            self._trial_end_states = self.record.task.get().trial_end_states
+        return self._trial_end_states
 
-                    for trial_st, trial_end in zip(trial_start_inds, trial_end_inds):
-                        self.trial_msgs.append(self.task_msgs[trial_st:trial_end])
-                except:
-                    # For tasks where there is no target index in the trial structure..
-                    trial_end = np.array([msg in self.trial_end_states for msg in self.task_msgs['msg']])
-                    trial_end_inds, = np.nonzero(trial_end)
-                    trial_start_inds = np.hstack([0, trial_end_inds[:-1]+1])
-                    trial_end = np.zeros(len(self.task_msgs))
+    @property
+    def task_msgs(self):
+        '''
+        State transition messages from the HDF file. Includes the target index at the time of
+        each transition for tasks which record it (see extend_task_msgs)
+        '''
+        if not hasattr(self, '_task_msgs'):
+            self._load_msgs()
+        return self._task_msgs
+
+    @task_msgs.setter
+    def task_msgs(self, value):
+        self._task_msgs = value
 
-                    for trial_st, trial_end in zip(trial_start_inds, trial_end_inds):
-                        self.trial_msgs.append(self.task_msgs[trial_st:trial_end+1])
+    @property
+    def trial_msgs(self):
+        '''
+        The task_msgs split into separate trials
+        '''
+        if not hasattr(self, '_trial_msgs'):
+            self._load_msgs()
+        return self._trial_msgs
 
+    @trial_msgs.setter
+    def trial_msgs(self, value):
+        self._trial_msgs = value
 
-            except:
-                print("Couldn't process HDF file!")
-                import traceback
-                traceback.print_exc()
+    def _load_msgs(self):
+        '''
+        Read the task messages from the HDF file and split them into trials. Blocks without 
+        an HDF file, or whose HDF file cannot be processed, have neither attribute 
+        (AttributeError); processing errors are printed once, the first time the messages are used
+        '''
+        if getattr(self, '_hdf_msgs_error', False):
+            raise AttributeError("Couldn't process the HDF file of task entry %d" % self.id)
+        if not hasattr(self, '_task_msgs') and not os.path.exists(self.hdf_filename):
+            raise AttributeError("No HDF file for task entry %d" % self.id)
+
+        try:
+            if not hasattr(self, '_task_msgs'):
+                self._task_msgs = self._read_task_msgs()
+            if not hasattr(self, '_trial_msgs'):
+                self._trial_msgs = self._split_trials(self._task_msgs)
+        except Exception:
+            print("Couldn't process HDF file!")
+            traceback.print_exc()
+            self._hdf_msgs_error = True
+            raise AttributeError("Couldn't process the HDF file of task entry %d" % self.id)
+
+    def _read_task_msgs(self):
+        task_msgs = self.hdf.root.task_msgs[:]
+        # Ignore the last message if it's the "None" transition used to stop the task
+        if len(task_msgs) > 0 and task_msgs[-1]['msg'] == _as_msg(task_msgs, 'None'):
+            task_msgs = task_msgs[:-1]
+
+        # ignore "update bmi" messages. These have been removed in later datasets
+        task_msgs = task_msgs[task_msgs['msg'] != _as_msg(task_msgs, 'update_bmi')]
+
+        # Try to add the target index.. these are not present in every task type
+        try:
+            target_index = self.hdf.root.task.col('target_index').ravel()
+            task_msgs = extend_task_msgs(task_msgs, target_index)
+        except (KeyError, tables.NoSuchNodeError):
+            pass
+        return task_msgs
+
+    def _split_trials(self, task_msgs):
+        msgs = task_msgs['msg']
+        if 'target_index' in task_msgs.dtype.names:
+            # A new trial starts in either the 'wait' state or when 'targ_transition' has a target_index of -1
+            trial_start = (msgs == _as_msg(task_msgs, 'wait')) | \
+                ((msgs == _as_msg(task_msgs, 'targ_transition')) & (task_msgs['target_index'] == -1))
+            trial_start_inds, = np.nonzero(trial_start)
+            trial_end_inds = np.hstack([trial_start_inds[1:], len(trial_start)])
+        else:
+            # For tasks where there is no target index in the trial structure..
+            trial_end = np.isin(msgs, _as_msg(task_msgs, list(self.trial_end_states)))
+            trial_end_inds, = np.nonzero(trial_end)
+            trial_start_inds = np.hstack([0, trial_end_inds[:-1]+1])
+            trial_end_inds = trial_end_inds + 1
+
+        return [task_msgs[st:end] for st, end in zip(trial_start_inds, trial_end_inds)]
 
     def get_decoders_trained_in_block(self, return_type='record'):
         '''
@@ -229,22 +374,11 @@ class TaskEntry(object):
             comb = kwargs.pop('data_comb_fn', default_data_comb_fn)
 
 
-        trial_filter_fn = filt
-        trial_condition_fn = cond
-        trial_proc_fn = proc
+        trial_filter_fn = _lookup_fn(filt, 'trial_filter_functions')
+        trial_condition_fn = _lookup_fn(cond, 'trial_condition_functions')
+        trial_proc_fn = _lookup_fn(proc, 'trial_proc_functions')
         data_comb_fn = comb
 
-        import trial_filter_functions, trial_proc_functions, trial_condition_functions
-        if isinstance(trial_filter_fn, str):
-            trial_filter_fn = getattr(trial_filter_functions, trial_filter_fn)
-
-        if isinstance(trial_proc_fn, str):
-            trial_proc_fn = getattr(trial_proc_functions, trial_proc_fn)
-
-        if isinstance(trial_condition_fn, str):
-            trial_condition_fn = getattr(trial_condition_functions, trial_condition_fn)
-
-
         te = self
         trial_msgs = [msgs for msgs in te.trial_msgs if trial_filter_fn(te, msgs)]
         n_trials = len(trial_msgs)
@@ -282,32 +416,79 @@ class TaskEntry(object):
 
     def get_cached_attr(self, key, fn, clean=False):
         '''
-        Generic method for saving the results of a computation to the supplementary_data_file associated with this block
+        Generic method for caching the results of a computation on this block. The results are
+        stored in the analysis result cache (see get_result_cache), keyed by the block, 'key', the 
+        source code of 'fn' and the size/modification time of the HDF file, so they are recomputed 
+        if any of these change.
 
         Parameters
         ----------
         key : string
-            Variable name in cache file
+            Name of the result
         fn : callable
-            Function to execute (no arguments) to get the required data, if it is not present in the file
+            Function to execute (no arguments) to get the required data, if it is not present in the cache
         clean : bool, default=False
-            If true, force the recomputation of the data product even if it is already present in the cache file
+            If true, force the recomputation of the data product even if it is already present in the cache
+
+        Returns
+        -------
+        object
+            Result of fn(). Arrays are returned as ordinary (writeable, in-memory) arrays, as
+            they were when the results were kept in the supplementary .mat file.
+
+        Notes
+        -----
+        Results saved to the supplementary_data_file by earlier versions of this method are
+        used the first time they are missing from the cache, and then copied into the cache.
         '''
-        from scipy.io import savemat, loadmat
-        if hasattr(self, '_%s' % key):
+        if hasattr(self, '_%s' % key) and not clean:
             return getattr(self, '_%s' % key)
+
+        try:
+            hdf_stat = os.stat(self.hdf_filename)
+            hdf_id = (self.hdf_filename, hdf_stat.st_size, hdf_stat.st_mtime)
+        except (OSError, TypeError):
+            hdf_id = None
+
+        cache = get_result_cache()
+        cache_key = ResultCache.key(self.record._state.db, self.id, key, fn, hdf_id)
+        missing = object()
+        value = missing if clean else cache.get(cache_key, missing)
+        if value is missing:
+            value = missing if clean else self._get_supplementary_data(key, missing)
+            if value is missing:
+                value = fn()
+            cache.put(cache_key, value)
+
+        if isinstance(value, np.memmap):
+            value = np.array(value)
+        setattr(self, '_%s' % key, value)
+        return value
+
+    def _get_supplementary_data(self, key, default=None):
+        '''
+        Look up a result saved in the supplementary_data_file by earlier versions of get_cached_attr
+
+        Parameters
+        ----------
+        key : string
+            Name of the result
+        default : object, optional, default=None
+            Value to return if the file or the result does not exist
+
+        Returns
+        -------
+        object
+        '''
+        from scipy.io import loadmat
         if not os.path.exists(self.supplementary_data_file):
-            data = fn()
-            savemat(self.supplementary_data_file, dict(key=data))
-            setattr(self, '_%s' % key, data)
-            return getattr(self, '_%s' % key)
-        else:
+            return default
+        try:
             supplementary_data = loadmat(self.supplementary_data_file)
-            if (not key in supplementary_data) or clean:
-                supplementary_data[key] = fn()
-                savemat(self.supplementary_data_file, supplementary_data)
-            setattr(self, '_%s' % key, supplementary_data[key])
-            return getattr(self, '_%s' % key)
+        except Exception:
+            traceback.print_exc()
+            return default
+        return supplementary_data.get(key, default)
 
     def get_matching_state_transition_seq(self, seq):
         '''
@@ -366,15 +547,19 @@ class TaskEntry(object):
         '''
         Get the task-generated HDF file linked to this TaskEntry
         '''
-        q = models.DataFile.objects.using(self.record._state.db).filter(entry_id=self.id, system__name='hdf')
-        if len(q) == 0:
-            # empty string for HDF filename if none is linked in the database
-            return ''
-        elif len(q) == 1:
-            q = q[0]
-            # dbconfig = getattr(config, 'db_config_%s' % self.record._state.db)
-            data_path = models.KeyValueStore.get('data_path', default='/storage', dbname=self.record._state.db)
-            return os.path.join(data_path, 'rawdata', q.system.name, q.path)
+        if not hasattr(self, '_hdf_filename'):
+            q = models.DataFile.objects.using(self.record._state.db).filter(entry_id=self.id, system__name='hdf')
+            if len(q) == 0:
+                # empty string for HDF filename if none is linked in the database
+                self._hdf_filename = ''
+            elif len(q) == 1:
+                q = q[0]
+                # dbconfig = getattr(config, 'db_config_%s' % self.record._state.db)
+                data_path = models.KeyValueStore.get('data_path', default='/storage', dbname=self.record._state.db)
+                self._hdf_filename = os.path.join(data_path, 'rawdata', q.system.name, q.path)
+            else:
+                self._hdf_filename = None
+        return self._hdf_filename
 
     @property
     def hdf(self):
@@ -399,6 +584,22 @@ class TaskEntry(object):
         '''
         self.close_hdf()
 
+    def __getstate__(self):
+        '''
+        Pickle the TaskEntry (e.g., to send it to a worker process, see TaskEntryCollection.proc_trials)
+        with the database lookups already done, so that the copy does not need to query the database.
+        Open files are not pickled and are reopened when next used.
+        '''
+        for attr in ['subject', 'decoder_record', 'hdf_filename', 'trial_end_states']:
+            try:
+                getattr(self, attr)
+            except:
+                pass
+        state = self.__dict__.copy()
+        for attr in ['hdf_file', '_plx']:
+            state.pop(attr, None)
+        return state
+
     @property
     def plx(self):
         '''
@@ -678,18 +879,61 @@ class TaskEntry(object):
                 inds[k] = 1
         return inds
 
+def _as_msg(task_msgs, msg):
+    '''
+    Convert a state name (or list of names) to the string type of the 'msg' field of
+    task_msgs (bytes when read from the HDF file) so that they can be compared
+    '''
+    return np.array(msg, dtype=task_msgs['msg'].dtype)
+
+def extend_task_msgs(task_msgs, target_index):
+    '''
+    Add the target index at the time of each state transition to the task messages
+
+    Parameters
+    ----------
+    task_msgs : np.ndarray
+        'task_msgs' table from the HDF file, with fields 'msg' and 'time'
+    target_index : np.ndarray of shape (n_iter,)
+        'target_index' column of the 'task' table from the HDF file
+
+    Returns
+    -------
+    np.ndarray
+        Messages with fields 'msg', 'time' and 'target_index'. The target index is NaN
+        for messages timed after the end of the task table.
+    '''
+    task_msg_dtype = np.dtype([('msg', '|S256'), ('time', '<u4'), ('target_index', 'f8')])
+    task_msgs_ext = np.zeros(len(task_msgs), dtype=task_msg_dtype)
+    task_msgs_ext['msg'] = task_msgs['msg']
+    task_msgs_ext['time'] = task_msgs['time']
+
+    times = task_msgs['time'].astype(np.int64)
+    valid = times < len(target_index)
+    task_msgs_ext['target_index'] = np.nan
+    task_msgs_ext['target_index'][valid] = target_index[times[valid]]
+    return task_msgs_ext
+
 def parse_blocks(blocks, cls=TaskEntry, **kwargs):
     '''
-    Parse out a hierarchical structure of block ids. Used to construct TaskEntryCollection objects
+    Parse out a hierarchical structure of block ids. Used to construct TaskEntryCollection objects.
+    All the blocks are constructed at once using cls.from_ids
     '''
-    data = []
-    for block in blocks:
-        if np.iterable(block):
-            te = parse_blocks(block, cls=cls, **kwargs)
-        else:
-            te = cls(block, **kwargs)
-        data.append(te)
-    return data
+    def flatten(blocks):
+        ids = []
+        for block in blocks:
+            if np.iterable(block):
+                ids += flatten(block)
+            else:
+                ids.append(block)
+        return ids
+
+    task_entries = iter(cls.from_ids(flatten(blocks), **kwargs))
+
+    def unflatten(blocks):
+        return [unflatten(block) if np.iterable(block) else next(task_entries) for block in blocks]
+
+    return unflatten(blocks)
 
 def group_ids(ids, grouping_fn=lambda te: te.calendar_date):
     '''
@@ -704,8 +948,7 @@ def group_ids(ids, grouping_fn=lambda te: te.calendar_date):
         by which to group the ids
     '''
     keyed_ids = defaultdict(list)
-    for id in ids:
-        te = TaskEntry(id)
+    for id, te in zip(ids, TaskEntry.from_ids(ids)):
         key = grouping_fn(te)
         keyed_ids[key].append(id)
 
@@ -732,6 +975,63 @@ def default_trial_proc_fn(te, trial_msgs):
 def default_trial_condition_fn(te, trial_msgs):
     return 0
 
+def _lookup_fn(fn, module_name):
+    '''
+    Look up an analysis function specified by name in the module 'module_name'
+    '''
+    if isinstance(fn, str):
+        import importlib
+        return getattr(importlib.import_module(module_name), fn)
+    else:
+        return fn
+
+def _proc_block_trials(te, trial_filter_fn, trial_proc_fn, trial_condition_fn, max_errors, kwargs):
+    '''
+    Run a trial-level analysis on one block, see TaskEntryCollection.proc_trials. Runs in a
+    worker process when the analysis is parallel.
+
+    Returns
+    -------
+    block_data : dict
+        Outputs of trial_proc_fn for each trial condition, in trial order
+    error_count : int
+        Number of trials resulting in an error. An Exception is raised if this exceeds max_errors
+    '''
+    block_data = defaultdict(list)
+    error_count = 0
+
+    # Filter out the trials you want
+    trial_msgs = [msgs for msgs in te.trial_msgs if trial_filter_fn(te, msgs)]
+    n_trials = len(trial_msgs)
+
+    ## Call a function on each trial
+    for k in range(n_trials):
+        try:
+            output = trial_proc_fn(te, trial_msgs[k], **kwargs)
+            trial_condition = trial_condition_fn(te, trial_msgs[k])
+            block_data[trial_condition].append(output)
+        except:
+            error_count += 1
+            print(trial_msgs[k])
+            traceback.print_exc()
+            if error_count > max_errors:
+                raise Exception
+    return dict(block_data), error_count
+
+def _proc_block(te, block_filter_fn, block_proc_fn, kwargs):
+    '''
+    Run a block-level analysis on one block, see TaskEntryCollection.proc_blocks.
+
+    Returns
+    -------
+    (bool, object)
+        Whether the block passed the filter and, if so, the output of block_proc_fn
+    '''
+    if block_filter_fn(te):
+        return True, block_proc_fn(te, **kwargs)
+    else:
+        return False, None
+
 def get_records_of_trained_decoders(task_entry):
     '''
     Returns unpickled decoder objects that were trained in a specified session.
@@ -1075,7 +1375,7 @@ class TaskEntryCollection(object):
     def __len__(self):
         return len(self.blocks)
 
-    def proc_trials(self, filt=None, proc=None, cond=None, comb=None, verbose=False, max_errors=10, **kwargs):
+    def proc_trials(self, filt=None, proc=None, cond=None, comb=None, verbose=False, max_errors=10, n_workers=1, **kwargs):
         '''
         Generic framework to perform a trial-level analysis on the entire dataset
 
@@ -1093,6 +1393,11 @@ class TaskEntryCollection(object):
             Feedback print statements so that you know processing is happening
         max_errors: int, optional, default = 10
             Number of trials resulting in error before the processing quits. Below this threshold, errors are printed but the code continues on to the next trial.
+        n_workers: int, optional, default = 1
+            Number of processes over which to distribute the blocks. If greater than 1, filt/proc/cond must
+            be picklable (e.g., module-level functions or names of functions, not lambdas). The results are
+            the same as for serial processing, but with parallel processing the blocks after the one which
+            exceeds max_errors may already have been processed.
 
         Returns
         -------
@@ -1100,8 +1405,6 @@ class TaskEntryCollection(object):
             The results of all the analysis. The length of the returned list equals len(self.blocks). Sub-blocks
             grouped by tuples are combined into a single result.
         '''
-
-        import trial_filter_functions, trial_proc_functions, trial_condition_functions
         if filt == None:
             filt = kwargs.pop('trial_filter_fn', default_trial_filter_fn)
         if cond == None:
@@ -1111,67 +1414,65 @@ class TaskEntryCollection(object):
         if comb == None:
             comb = kwargs.pop('data_comb_fn', default_data_comb_fn)
 
-
-        trial_filter_fn = filt
-        trial_condition_fn = cond
-        trial_proc_fn = proc
+        trial_filter_fn = _lookup_fn(filt, 'trial_filter_functions')
+        trial_condition_fn = _lookup_fn(cond, 'trial_condition_functions')
+        trial_proc_fn = _lookup_fn(proc, 'trial_proc_functions')
         data_comb_fn = comb
 
+        blocksets = [blockset if np.iterable(blockset) else (blockset,) for blockset in self.blocks]
 
-        if isinstance(trial_filter_fn, str):
-            trial_filter_fn = getattr(trial_filter_functions, trial_filter_fn)
-
-        if isinstance(trial_proc_fn, str):
-            trial_proc_fn = getattr(trial_proc_functions, trial_proc_fn)
-
-        if isinstance(trial_condition_fn, str):
-            trial_condition_fn = getattr(trial_condition_functions, trial_condition_fn)
-
-
-        result = []
-        error_count = 0
-        for blockset in self.blocks:
-            if not np.iterable(blockset):
-                blockset = (blockset,)
-
-            blockset_data = defaultdict(list)
-            for te in blockset:
-                if verbose:
-                    print(".")
-
-                # Filter out the trials you want
-                trial_msgs = [msgs for msgs in te.trial_msgs if trial_filter_fn(te, msgs)]
-                n_trials = len(trial_msgs)
-
-                ## Call a function on each trial
-                for k in range(n_trials):
-                    try:
-                        output = trial_proc_fn(te, trial_msgs[k], **kwargs)
-                        trial_condition = trial_condition_fn(te, trial_msgs[k])
-                        blockset_data[trial_condition].append(output)
-                    except:
-                        error_count += 1
-                        print(trial_msgs[k])
-                        import traceback
-                        traceback.print_exc()
-                        if error_count > max_errors:
-                            raise Exception
-
-            # Aggregate the data from the blockset, which may include multiple task entries
-            blockset_data_comb = dict()
-            for key in blockset_data:
-                blockset_data_comb[key] = data_comb_fn(blockset_data[key])
-            if len(list(blockset_data_comb.keys())) == 1:
-                key = list(blockset_data_comb.keys())[0]
-                result.append(blockset_data_comb[key])
-            else:
-                result.append(blockset_data_comb)
+        executor = ProcessPoolExecutor(max_workers=n_workers) if n_workers > 1 else None
+        futures = []
+        try:
+            if executor is not None:
+                # one job per block. The results are collected in order below
+                futures = [[executor.submit(_proc_block_trials, te, trial_filter_fn, trial_proc_fn, trial_condition_fn, max_errors, kwargs)
+                    for te in blockset] for blockset in blocksets]
+
+            result = []
+            error_count = 0
+            for i, blockset in enumerate(blocksets):
+                blockset_data = defaultdict(list)
+                for j, te in enumerate(blockset):
+                    if verbose:
+                        print(".")
+
+                    if executor is None:
+                        block_data, block_error_count = _proc_block_trials(te, trial_filter_fn, trial_proc_fn, trial_condition_fn,
+                            max_errors - error_count, kwargs)
+                    else:
+                        block_data, block_error_count = futures[i][j].result()
+
+                    error_count += block_error_count
+                    if error_count > max_errors:
+                        raise Exception
+
+                    for key in block_data:
+                        blockset_data[key] += block_data[key]
+
+                # Aggregate the data from the blockset, which may include multiple task entries
+                blockset_data_comb = dict()
+                for key in blockset_data:
+                    blockset_data_comb[key] = data_comb_fn(blockset_data[key])
+                if len(list(blockset_data_comb.keys())) == 1:
+                    key = list(blockset_data_comb.keys())[0]
+                    result.append(blockset_data_comb[key])
+                else:
+                    result.append(blockset_data_comb)
+        finally:
+            if executor is not None:
+                # don't start the remaining blocks if processing stopped early 
+                # (shutdown's 'cancel_futures' argument needs python 3.9)
+                for blockset_futures in futures:
+                    for future in blockset_futures:
+                        future.cancel()
+                executor.shutdown()
 
         if verbose:
             sys.stdout.write('\n')
         return result
 
-    def proc_blocks(self, filt=None, proc=None, cond=None, comb=None, verbose=False, return_type=list, **kwargs):
+    def proc_blocks(self, filt=None, proc=None, cond=None, comb=None, verbose=False, return_type=list, n_workers=1, **kwargs):
         '''
         Generic framework to perform a block-level analysis on the entire dataset,
         e.g., percent of trials correct, which require analyses across trials
@@ -1184,6 +1485,8 @@ class TaskEntryCollection(object):
             The main workhorse function
         data_comb_fn: callable; call signature: data_comb_fn(list)
             Combine the list into the desired output structure
+        n_workers: int, optional, default = 1
+            Number of processes over which to distribute the blocks, see proc_trials
 
         Returns
         -------
@@ -1200,35 +1503,45 @@ class TaskEntryCollection(object):
         if comb == None:
             comb = kwargs.pop('data_comb_fn', default_data_comb_fn)
 
-        import trial_filter_functions, trial_proc_functions, trial_condition_functions
-
-        block_filter_fn = filt
+        # Look up functions by name, if strings are given instead of functions
+        block_filter_fn = _lookup_fn(filt, 'trial_filter_functions')
         block_condition_fn = cond
-        block_proc_fn = proc
+        block_proc_fn = _lookup_fn(proc, 'trial_proc_functions')
         data_comb_fn = comb
 
-        # Look up functions by name, if strings are given instead of functions
-        if isinstance(block_filter_fn, str):
-            block_filter_fn = getattr(trial_filter_functions, block_filter_fn)
-
-        if isinstance(block_proc_fn, str):
-            block_proc_fn = getattr(block_proc_functions, block_proc_fn)
+        blocksets = [blockset if np.iterable(blockset) else (blockset,) for blockset in self.blocks]
 
-        result = []
-        for blockset in self.blocks:
-            if not np.iterable(blockset):
-                blockset = (blockset,)
-
-            blockset_data = []
-            for te in blockset:
-                if verbose:
-                    print(".")
-
-                if block_filter_fn(te):
-                    blockset_data.append(block_proc_fn(te, **kwargs))
-
-            blockset_data = data_comb_fn(blockset_data)
-            result.append(blockset_data)
+        executor = ProcessPoolExecutor(max_workers=n_workers) if n_workers > 1 else None
+        futures = []
+        try:
+            if executor is not None:
+                futures = [[executor.submit(_proc_block, te, block_filter_fn, block_proc_fn, kwargs) for te in blockset]
+                    for blockset in blocksets]
+
+            result = []
+            for i, blockset in enumerate(blocksets):
+                blockset_data = []
+                for j, te in enumerate(blockset):
+                    if verbose:
+                        print(".")
+
+                    if executor is None:
+                        valid, output = _proc_block(te, block_filter_fn, block_proc_fn, kwargs)
+                    else:
+                        valid, output = futures[i][j].result()
+                    if valid:
+                        blockset_data.append(output)
+
+                blockset_data = data_comb_fn(blockset_data)
+                result.append(blockset_data)
+        finally:
+            if executor is not None:
+                # don't start the remaining blocks if processing stopped early 
+                # (shutdown's 'cancel_futures' argument needs python 3.9)
+                for blockset_futures in futures:
+                    for future in blockset_futures:
+                        future.cancel()
+                executor.shutdown()
 
         if verbose:
             sys.stdout.write('\n')
@@ -411,3 +411,145 @@ class TestParamCast(TestCase):
         self.assertEqual(t1, 1.0)
 
         #self.assertRaises(Exception, json_param.norm_trait, t, '1.0')
+
+
+# analysis functions for TestDbfunctions, at module level so that they can be sent to worker processes
+def trial_length(te, trial_msgs):
+    if trial_msgs['time'][0] < 0:
+        raise ValueError("invalid trial")
+    return te.id, int(trial_msgs['time'][-1] - trial_msgs['time'][0])
+
+def trial_msg_count(te, trial_msgs):
+    return len(trial_msgs)
+
+def block_id(te):
+    return te.id
+
+class TestDbfunctions(TestCase):
+    def setUp(self):
+        subj = models.Subject(name="test_subject")
+        subj.save()
+        task = models.Task(name="test_task")
+        task.save()
+
+        self.te1 = models.TaskEntry(subject_id=subj.id, task_id=task.id, params=json.dumps(dict(reward_time=0.5)))
+        self.te1.save()
+        self.te2 = models.TaskEntry(subject_id=subj.id, task_id=task.id)
+        self.te2.save()
+
+    def test_task_entry_from_ids(self):
+        from db import dbfunctions as dbfn
+
+        task_entries = dbfn.TaskEntry.from_ids([self.te2.id, self.te1.id, self.te2.id])
+        self.assertEqual([te.id for te in task_entries], [self.te2.id, self.te1.id, self.te2.id])
+        self.assertEqual(task_entries[1].reward_time, 0.5)
+        for te in task_entries:
+            self.assertEqual(te.subject, "test_subject")
+            self.assertIsNone(te.decoder_record)
+            self.assertEqual(te.hdf_filename, '')
+
+        # blocks without an HDF file have no trial messages
+        self.assertFalse(hasattr(task_entries[0], 'trial_msgs'))
+
+        self.assertRaises(models.TaskEntry.DoesNotExist, dbfn.TaskEntry.from_ids, [self.te2.id + 1])
+
+    def test_task_entry_collection(self):
+        from db import dbfunctions as dbfn
+
+        col = dbfn.TaskEntryCollection([self.te1.id, (self.te1.id, self.te2.id)])
+        self.assertEqual(col.blocks[0].id, self.te1.id)
+        self.assertEqual([te.id for te in col.blocks[1]], [self.te1.id, self.te2.id])
+
+    def test_nested_blocks(self):
+        from db import dbfunctions as dbfn
+
+        blocks = dbfn.parse_blocks([self.te2.id, (self.te1.id, (self.te2.id, self.te1.id)), [self.te2.id]])
+        ids = [blocks[0].id, (blocks[1][0].id, (blocks[1][1][0].id, blocks[1][1][1].id)), [blocks[2][0].id]]
+        self.assertEqual(ids, [self.te2.id, (self.te1.id, (self.te2.id, self.te1.id)), [self.te2.id]])
+
+    def test_task_entry_decoder_record(self):
+        from db import dbfunctions as dbfn
+
+        trained = models.Decoder(name="trained_decoder", entry_id=self.te2.id, path="")
+        trained.save()
+        te3 = models.TaskEntry(subject_id=self.te1.subject_id, task_id=self.te1.task_id, params=json.dumps(dict(decoder=trained.id)))
+        te3.save()
+
+        for task_entries in [[dbfn.TaskEntry(x) for x in [self.te1.id, self.te2.id, te3.id]], 
+                dbfn.TaskEntry.from_ids([self.te1.id, self.te2.id, te3.id])]:
+            self.assertIsNone(task_entries[0].decoder_record)
+            self.assertEqual(task_entries[1].decoder_record.id, trained.id)
+            self.assertEqual(task_entries[2].decoder_record.id, trained.id)
+
+    def test_task_entry_msgs(self):
+        from db import dbfunctions as dbfn
+        import contextlib, io, shutil, tempfile
+        import numpy as np
+        import tables
+
+        data_path = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, data_path)
+        os.makedirs(os.path.join(data_path, 'rawdata', 'hdf'))
+        models.KeyValueStore.set('data_path', data_path)
+        system = models.System(name="hdf", path="", archive="")
+        system.save()
+
+        # te1 has a valid HDF file, te2 a file which isn't HDF
+        msgs = [(b'wait', 0), (b'targ_transition', 5), (b'reward', 10), (b'wait', 20), (b'targ_transition', 25), 
+            (b'update_bmi', 27), (b'None', 30)]
+        with tables.open_file(os.path.join(data_path, 'rawdata', 'hdf', 'te1.hdf'), 'w') as h5:
+            h5.create_table('/', 'task_msgs', np.array(msgs, dtype=[('msg', 'S256'), ('time', 'u4')]))
+            target_index = np.where(np.arange(30) < 5, -1, 0)
+            h5.create_table('/', 'task', np.array([(k,) for k in target_index], dtype=[('target_index', 'i4', (1,))]))
+        with open(os.path.join(data_path, 'rawdata', 'hdf', 'te2.hdf'), 'w') as f:
+            f.write("not an HDF file")
+        for te, filename in [(self.te1, 'te1.hdf'), (self.te2, 'te2.hdf')]:
+            models.DataFile(path=filename, system_id=system.id, entry_id=te.id).save()
+
+        for task_entries in [[dbfn.TaskEntry(self.te1.id), dbfn.TaskEntry(self.te2.id)], 
+                dbfn.TaskEntry.from_ids([self.te1.id, self.te2.id])]:
+            te1, te2 = task_entries
+            self.addCleanup(te1.close)
+            self.assertEqual(te1.hdf_filename, os.path.join(data_path, 'rawdata', 'hdf', 'te1.hdf'))
+
+            # the last 'None' message and the 'update_bmi' messages are dropped
+            self.assertEqual(list(te1.task_msgs['msg']), [b'wait', b'targ_transition', b'reward', b'wait', b'targ_transition'])
+            self.assertEqual(list(te1.task_msgs['target_index']), [-1, 0, 0, 0, 0])
+            self.assertEqual([list(trial['time']) for trial in te1.trial_msgs], [[0, 5, 10], [20, 25]])
+
+            # a file which can't be processed is reported once, and the block has no messages
+            stdout = io.StringIO()
+            with contextlib.redirect_stdout(stdout), contextlib.redirect_stderr(io.StringIO()):
+                self.assertFalse(hasattr(te2, 'task_msgs'))
+                self.assertFalse(hasattr(te2, 'trial_msgs'))
+            self.assertEqual(stdout.getvalue().count("Couldn't process HDF file!"), 1)
+
+    def test_parallel_proc(self):
+        from db import dbfunctions as dbfn
+        import numpy as np
+
+        col = dbfn.TaskEntryCollection([(self.te1.id, self.te2.id), self.te2.id])
+        for te in [col.blocks[0][0], col.blocks[0][1], col.blocks[1]]:
+            times = np.cumsum(np.arange(1, 3*te.id + 2))
+            task_msgs = np.array([(b'wait', t) for t in times], dtype=[('msg', 'S256'), ('time', 'i8')])
+            te.trial_msgs = [task_msgs[k:k+3] for k in range(0, len(task_msgs), 3)]
+
+        for kwargs in [dict(), dict(cond=trial_msg_count)]:
+            serial = col.proc_trials(proc=trial_length, **kwargs)
+            self.assertEqual(col.proc_trials(proc=trial_length, n_workers=2, **kwargs), serial)
+        self.assertEqual(col.proc_blocks(proc=block_id, n_workers=2), [[self.te1.id, self.te2.id], [self.te2.id]])
+
+        # the copies sent to the workers carry the database lookups with them
+        import pickle
+        te = pickle.loads(pickle.dumps(col.blocks[1]))
+        self.assertEqual(te.record.id, self.te2.id)
+        self.assertEqual(te.__dict__['_subject'], "test_subject")
+        self.assertEqual(te.__dict__['_hdf_filename'], '')
+        self.assertIsNone(te.__dict__['_decoder_record'])
+
+        # errors are counted across blocks
+        col.blocks[1].trial_msgs[0]['time'][0] = -1
+        col.blocks[0][0].trial_msgs[0]['time'][0] = -1
+        for n_workers in [1, 2]:
+            self.assertEqual(len(col.proc_trials(proc=trial_length, max_errors=2, n_workers=n_workers)), 2)
+            self.assertRaises(Exception, col.proc_trials, proc=trial_length, max_errors=1, n_workers=n_workers)
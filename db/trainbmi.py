@@ -116,9 +116,9 @@ def make_bmi(name, clsname, extractorname, entry, cells, channels, binlen, tslic
     if extractor_cls == extractor.BinnedSpikeCountsExtractor:
         extractor_kwargs['units'] = units
         extractor_kwargs['n_subbins'] = max(1, int((1./task_update_rate)/binlen))
-    elif extractor_cls == extractor.LFPButterBPFPowerExtractor:
+    elif extractor_cls in (extractor.LFPButterBPFPowerExtractor, extractor.StreamingLFPButterBPFPowerExtractor):
         extractor_kwargs['channels'] = channels
-    elif extractor_cls == extractor.LFPMTMPowerExtractor:
+    elif extractor_cls in (extractor.LFPMTMPowerExtractor, extractor.FastLFPMTMPowerExtractor):
         extractor_kwargs['channels'] = channels
     elif extractor_cls == extractor.AIMTMPowerExtractor:
         extractor_kwargs['channels'] = channels
@@ -14,6 +14,7 @@ from riglib.experiment import traits
 
 from riglib.bmi import accumulator, assist, bmi, clda, extractor, feedback_controllers, goal_calculators, robot_arms, sim_neurons, kfdecoder, ppfdecoder, state_space_models, train
 from riglib.bmi.sim_neurons import KalmanEncoder
+from utils.record_buffer import GrowingRecordArray
 
 import pickle
 
@@ -45,7 +46,7 @@ class SimHDF(object):
         '''
         from collections import defaultdict
         self.data = defaultdict(list)
-        self.task_data_hist = []
+        self.task_data_hist = None
         self.msgs = []        
         self.hdf = FakeHDF()
 
@@ -55,11 +56,14 @@ class SimHDF(object):
         '''
         Secondary init function. See riglib.experiment.Experiment.init()
         Prior to starting the task, this 'init' creates a fake task data variable so that 
-        code expecting SaveHDF runs smoothly.
+        code expecting SaveHDF runs smoothly. The history of the task data is 
+        kept in a GrowingRecordArray; use self.task_data_hist.get_all() 
+        to access it as a single record array.
         '''
         super(SimHDF, self).init()
         self.dtype = np.dtype(self.dtype)
         self.task_data = np.zeros((1,), dtype=self.dtype)
+        self.task_data_hist = GrowingRecordArray(self.dtype, capacity=60*60)
 
     def sendMsg(self, msg):
         '''
@@ -78,7 +82,7 @@ class SimHDF(object):
 
     def _cycle(self):
         super(SimHDF, self)._cycle()
-        self.task_data_hist.append(self.task_data.copy())
+        self.task_data_hist.append(self.task_data)
 
 
 class SimClock(object):
@@ -26,18 +26,40 @@ class Spikes(DataSourceSystem):
 
     def start(self):
         self.conn.start_data()
-        self.data = self.conn.get_event_data()
+        self.data = self.conn.get_event_data_batches()
+        self._pending = np.zeros(0, dtype=self.dtype)
 
     def stop(self):
         self.conn.stop_data()
 
+    def get_many(self):
+        '''
+        Return all the spikes received by the next call to cbpy.trial_event. 
+        Used by riglib.source.DataSource in place of 'get'
+
+        Returns
+        -------
+        np.ndarray of shape (N,) and dtype self.dtype
+            Spikes received, N >= 0
+        '''
+        if len(self._pending) > 0:
+            spikes, self._pending = self._pending, self._pending[:0]
+            return spikes
+
+        events = next(self.data)
+        spikes = np.empty(len(events), dtype=self.dtype)
+        spikes['ts'] = events['ts'] / self.update_freq
+        spikes['chan'] = events['chan']
+        spikes['unit'] = events['unit']
+        spikes['arrival_ts'] = events['arrival_ts']
+        return spikes
+
     def get(self):
-        d = next(self.data)
-        return np.array([(d.ts / self.update_freq, 
-                          d.chan, 
-                          d.unit, 
-                          d.arrival_ts)],
-                        dtype=self.dtype)
+        while len(self._pending) == 0:
+            self._pending = self.get_many()
+
+        spike, self._pending = self._pending[:1], self._pending[1:]
+        return spike
 
 
 class LFP(DataSourceSystem):
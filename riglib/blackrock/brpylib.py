@@ -346,6 +346,71 @@ nsx_header_dict = {
 # </editor-fold>
 
 
+# <editor-fold desc="Data packet functions">
+def nev_packet_dtype(bytes_in_packet, packet_type=None):
+    """
+    :param bytes_in_packet: {int} BytesInDataPackets from the NEV basic header
+    :param packet_type:     [optional] {str} one of 'digital', 'spike', 'comment', 'video_sync', 'tracking',
+                            'button_trigger' or 'configuration'. If None, only the common fields are included.
+    :return:                {numpy.dtype} structured dtype spanning one fixed-size data packet
+
+    All packets start with a uint32 timestamp and a uint16 packet ID. The remaining fields depend on the type.
+    """
+    fields = [('TimeStamp', '<u4', 0), ('PacketID', '<u2', 4)]
+    if packet_type == 'digital':
+        fields += [('Reason', 'u1', 6), ('Data', '<u2', 8)]
+        if bytes_in_packet >= 20:
+            fields += [('AnalogData', ('<i2', (5,)), 10)]
+    elif packet_type == 'spike':
+        fields += [('Classification', 'u1', 6), ('Waveform', ('u1', (bytes_in_packet - 8,)), 8)]
+    elif packet_type == 'comment':
+        fields += [('CharSet', 'u1', 6), ('Flag', 'u1', 7), ('Data', '<u4', 8),
+                   ('Comment', 'S%d' % (bytes_in_packet - 12), 12)]
+    elif packet_type == 'video_sync':
+        fields += [('VideoFileNum', '<u2', 6), ('VideoFrameNum', '<u4', 8), ('VideoElapsedTime_ms', '<u4', 12),
+                   ('VideoSourceID', '<u4', 16)]
+    elif packet_type == 'tracking':
+        fields += [('ParentID', '<u2', 6), ('NodeID', '<u2', 8), ('NodeCount', '<u2', 10), ('PointCount', '<u2', 12),
+                   ('TrackingPoints', ('<u2', ((bytes_in_packet - 14) // 2,)), 14)]
+    elif packet_type == 'button_trigger':
+        fields += [('TriggerType', '<u2', 6)]
+    elif packet_type == 'configuration':
+        fields += [('ConfigChangeType', '<u2', 6), ('ConfigChanged', ('u1', (bytes_in_packet - 8,)), 8)]
+    elif packet_type is not None:
+        raise ValueError("Unknown NEV packet type: %s" % packet_type)
+
+    names, formats, offsets = zip(*fields)
+    return np.dtype({'names': list(names), 'formats': list(formats), 'offsets': list(offsets),
+                     'itemsize': bytes_in_packet})
+
+
+def labelcodes(codes, labels, default):
+    """
+    :param codes:   {numpy.ndarray} integer codes read from the data packets
+    :param labels:  {dict} label for each known code
+    :param default: label for any code not in labels
+    :return:        {list} label of each code, looked up without a per-packet loop
+    """
+    keys = np.array(sorted(labels))
+    lut  = np.array([labels[k] for k in keys] + [default], dtype=object)
+
+    idx = np.minimum(np.searchsorted(keys, codes), len(keys) - 1)
+    idx[keys[idx] != codes] = len(keys)
+    return lut[idx].tolist()
+
+
+def groupbyfirst(keys):
+    """
+    :param keys: {numpy.ndarray} key of each packet, e.g., the packet ID
+    :return:     unique keys in order of first appearance, and a list of the (sorted) indices with each key
+    """
+    uniq, first, inverse = np.unique(keys, return_index=True, return_inverse=True)
+    inds  = np.split(np.argsort(inverse, kind='stable'), np.cumsum(np.bincount(inverse))[:-1])
+    order = np.argsort(first)
+    return uniq[order], [inds[k] for k in order]
+# </editor-fold>
+
+
 # <editor-fold desc="Safety check functions">
 def check_elecid(elec_ids):
     if type(elec_ids) is str and elec_ids != ELEC_ID_DEF:
@@ -437,9 +502,27 @@ class NevFile:
             if header_string == 'NEUEVWAV' and float(self.basic_header['FileSpec']) < 2.3:
                 self.extended_headers[i]['SpikeWidthSamples'] = WAVEFORM_SAMPLES_21
 
+    def getpackets(self):
+        """
+        Memory-map the data packets of the file. No data is read until the returned array is accessed.
+
+        :return: packets: {numpy.memmap} structured array with one entry of BytesInDataPackets bytes per packet,
+                          and fields TimeStamp and PacketID. Use packets.view(nev_packet_dtype(...)) to access
+                          the fields specific to a packet type.
+        """
+        bytes_in_packet = self.basic_header['BytesInDataPackets']
+        bytes_in_header = self.basic_header['BytesInHeader']
+
+        # a partially written last packet is ignored
+        n_packets = (ospath.getsize(self.datafile.name) - bytes_in_header) // bytes_in_packet
+        if n_packets <= 0:
+            return np.zeros((0,), dtype=nev_packet_dtype(bytes_in_packet))
+        return np.memmap(self.datafile.name, dtype=nev_packet_dtype(bytes_in_packet), mode='r',
+                         offset=bytes_in_header, shape=(n_packets,))
+
     def getdata(self, elec_ids='all'):
         """
-        This function is used to return a set of data from the NSx datafile.
+        This function is used to return a set of data from the NEV datafile.
 
         :param elec_ids: [optional] {list} User selection of elec_ids to extract specific spike waveforms (e.g., [13])
         :return: output: {Dictionary} with one or more of the following dictionaries (all include TimeStamps)
@@ -451,220 +534,139 @@ class NevFile:
                     button_trigger_events: TriggerType
                     configuration_events:  ConfigChangeType, ConfigChanged
 
-        Note: For digital and neural data - TimeStamps, Classification, and Data can be lists of lists when more
-        than one digital type or spike event exists for a channel
+        Note: For digital and neural data - TimeStamps, Classification, Data and Waveforms are lists with one entry
+        per digital type or spike channel, in order of first appearance in the file. TimeStamps and Data entries are
+        arrays, Waveforms entries are (n_spikes, n_samples) arrays and Classification entries are lists of labels.
+        The fields of the other events are lists with one entry per packet.
+
+        The packets are memory-mapped and split by type with boolean masks, rather than read one at a time.
         """
 
-        # Initialize output dictionary and reset position in file (if read before, may not be here anymore)
+        # Initialize output dictionary
         output = dict()
-        self.datafile.seek(self.basic_header['BytesInHeader'], 0)
 
         # Safety checks
         elec_ids = check_elecid(elec_ids)
 
-        # Must go through each data packet and process separately until end of file
-        while self.datafile.tell() != ospath.getsize(self.datafile.name):
+        bytes_in_packet = self.basic_header['BytesInDataPackets']
+        packets     = self.getpackets()
+        packet_ids  = np.asarray(packets['PacketID'])
+        time_stamps = np.asarray(packets['TimeStamp']).astype(np.int64)
 
-            time_stamp = unpack('<I', self.datafile.read(4))[0]
-            packet_id  = unpack('<H', self.datafile.read(2))[0]
-
-            # skip unwanted neural data packets if only asking for certain channels
-            if not (elec_ids == 'all' or ( (packet_id in elec_ids) and
-                                           NEURAL_PACKET_ID_MIN <= packet_id <= NEURAL_PACKET_ID_MAX )):
-                self.datafile.seek(self.basic_header['BytesInDataPackets'] - 6, 1)
-                continue
-
-            # For digital event data, read reason, skip one byte (reserved), read digital value,
-            # and skip X bytes (reserved)
-            if packet_id == DIGITAL_PACKET_ID:
-
-                # See if the dictionary exists in output
-                if 'dig_events' not in output:
-                    output['dig_events'] = {'Reason': [], 'TimeStamps': [], 'Data': []}
-
-                reason = unpack('B', self.datafile.read(1))[0]
-                if   reason == PARALLEL_REASON: reason = 'parallel'
-                elif reason == PERIODIC_REASON: reason = 'periodic'
-                elif reason == SERIAL_REASON:   reason = 'serial'
-                else:                           reason = 'unknown'
-                self.datafile.seek(1, 1)
-
-                # Check if this type of data already exists, if not, create an empty list, and then append data
-                if reason in output['dig_events']['Reason']:
-                    idx = output['dig_events']['Reason'].index(reason)
-                else:
-                    idx = -1
-                    output['dig_events']['Reason'].append(reason)
-                    output['dig_events']['TimeStamps'].append([])
-                    output['dig_events']['Data'].append([])
-
-                output['dig_events']['TimeStamps'][idx].append(time_stamp)
-                output['dig_events']['Data'][idx].append(unpack('<H', self.datafile.read(2))[0])
-
-                # For serial data, strip off upper byte
-                if reason == 'serial':
-                    output['dig_events']['Data'][idx][-1] &= LOWER_BYTE_MASK
-
-                # For File Spec < 2.3, also capture analog Data, otherwise skip remaining packet bytes
-                if float(self.basic_header['FileSpec']) < 2.3:
-                    if 'AnalogDataUnits' not in output['dig_events']:
-                        output['dig_events']['AnalogDataUnits'] = 'mv'
-
-                    output['dig_events']['AnalogData'].append([])
-                    for j in range(5):
-                        output['dig_events']['AnalogData'][-1].append(unpack('<h', self.datafile.read(2))[0])
-                else:
-                    self.datafile.seek(self.basic_header['BytesInDataPackets'] - 10, 1)
-
-            # For neural waveforms, read classifier, skip one byte (reserved), and read waveform data
-            elif NEURAL_PACKET_ID_MIN <= packet_id <= NEURAL_PACKET_ID_MAX:
-
-                # See if the dictionary exists in output, if not, create it
-                if 'spike_events' not in output:
-                    output['spike_events'] = {'Units': 'nV', 'ChannelID': [], 'TimeStamps': [],
-                                              'NEUEVWAV_HeaderIndices': [], 'Classification': [], 'Waveforms': []}
-
-                classifier = unpack('B', self.datafile.read(1))[0]
-                if classifier == UNDEFINED:          classifier = 'none'
-                elif CLASSIFIER_MIN <= classifier <= CLASSIFIER_MAX: classifier = classifier
-                elif classifier == CLASSIFIER_NOISE: classifier = 'noise'
-                else:                                classifier = 'error'
-                self.datafile.seek(1, 1)
-
-                # Check if data for this electrode exists and update parameters accordingly
-                if packet_id in output['spike_events']['ChannelID']:
-                    idx = output['spike_events']['ChannelID'].index(packet_id)
-                else:
-                    idx = -1
-                    output['spike_events']['ChannelID'].append(packet_id)
-                    output['spike_events']['TimeStamps'].append([])
-                    output['spike_events']['Classification'].append([])
-
-                    # Find neuevwav extended header for this electrode for use in calculating data info
-                    output['spike_events']['NEUEVWAV_HeaderIndices'].append(
-                        next(item for (item, d) in enumerate(self.extended_headers)
-                             if d["ElectrodeID"] == packet_id and d["PacketID"] == 'NEUEVWAV'))
-
-                output['spike_events']['TimeStamps'][idx].append(time_stamp)
-                output['spike_events']['Classification'][idx].append(classifier)
-
-                # Use extended header idx to get specific data information
-                ext_header_idx = output['spike_events']['NEUEVWAV_HeaderIndices'][idx]
+        # skip everything except the selected neural data packets if only asking for certain channels
+        neural_mask = (NEURAL_PACKET_ID_MIN <= packet_ids) & (packet_ids <= NEURAL_PACKET_ID_MAX)
+        if elec_ids == 'all':
+            def packet_mask(packet_id): return packet_ids == packet_id
+        else:
+            neural_mask &= np.isin(packet_ids, elec_ids)
+            def packet_mask(packet_id): return np.zeros(len(packet_ids), dtype=bool)
+
+        # For digital event data, separate data by reason
+        mask = packet_mask(DIGITAL_PACKET_ID)
+        if np.any(mask):
+            dig = packets.view(nev_packet_dtype(bytes_in_packet, 'digital'))[mask]
+            reasons = np.array(labelcodes(dig['Reason'], {PARALLEL_REASON: 'parallel', PERIODIC_REASON: 'periodic',
+                                                          SERIAL_REASON: 'serial'}, 'unknown'))
+            data = dig['Data'].astype(np.int64)
+
+            # For serial data, strip off upper byte
+            data[reasons == 'serial'] &= LOWER_BYTE_MASK
+
+            output['dig_events'] = {'Reason': [], 'TimeStamps': [], 'Data': []}
+            for reason, inds in zip(*groupbyfirst(reasons)):
+                output['dig_events']['Reason'].append(reason)
+                output['dig_events']['TimeStamps'].append(time_stamps[mask][inds])
+                output['dig_events']['Data'].append(data[inds])
+
+            # For File Spec < 2.3, also capture analog Data
+            if float(self.basic_header['FileSpec']) < 2.3:
+                output['dig_events']['AnalogDataUnits'] = 'mv'
+                output['dig_events']['AnalogData'] = dig['AnalogData'].astype(np.int16)
+
+        # For neural waveforms, separate data by channel
+        if np.any(neural_mask):
+            spikes = packets.view(nev_packet_dtype(bytes_in_packet, 'spike'))[neural_mask]
+            output['spike_events'] = {'Units': 'nV', 'ChannelID': [], 'TimeStamps': [],
+                                      'NEUEVWAV_HeaderIndices': [], 'Classification': [], 'Waveforms': []}
+
+            classifiers = {UNDEFINED: 'none', CLASSIFIER_NOISE: 'noise'}
+            classifiers.update((k, k) for k in range(CLASSIFIER_MIN, CLASSIFIER_MAX + 1))
+
+            for packet_id, inds in zip(*groupbyfirst(spikes['PacketID'])):
+                chan_spikes = spikes[inds]
+
+                # Find neuevwav extended header for this electrode for use in calculating data info
+                ext_header_idx = next(item for (item, d) in enumerate(self.extended_headers)
+                                      if d["ElectrodeID"] == packet_id and d["PacketID"] == 'NEUEVWAV')
                 samples    = self.extended_headers[ext_header_idx]['SpikeWidthSamples']
                 dig_factor = self.extended_headers[ext_header_idx]['DigitizationFactor']
                 num_bytes  = self.extended_headers[ext_header_idx]['BytesPerWaveform']
-                if num_bytes <= 1:   data_type = np.int8
-                elif num_bytes == 2: data_type = np.int16
+                if num_bytes <= 1: data_type = np.dtype(np.int8)
+                else:              data_type = np.dtype('<i2')
 
                 # Extract and scale the data
-                if idx == -1:
-                    output['spike_events']['Waveforms'].append(
-                        [np.fromfile(file=self.datafile, dtype=data_type, count=samples).astype(np.int32) * dig_factor])
-                else:
-                    try:
-                        output['spike_events']['Waveforms'][idx] = \
-                            np.append(output['spike_events']['Waveforms'][idx],
-                                [np.fromfile(file=self.datafile, dtype=data_type, count=samples).astype(np.int32) *
-                                dig_factor], axis=0)
-                    except:
-                        output['spike_events']['Waveforms'][idx] = \
-                            np.append(output['spike_events']['Waveforms'][idx],
-                                [np.zeros((samples,)).astype(np.int32) * dig_factor], axis=0)
-                        print('adding zero waveform')
-
-            # For comment events
-            elif packet_id == COMMENT_PACKET_ID:
-
-                # See if the dictionary exists in output, if not, create it
-                if 'comments' not in output:
-                    output['comments'] = {'TimeStamps': [], 'CharSet': [], 'Flag': [], 'Data': [], 'Comment': []}
-
-                output['comments']['TimeStamps'].append(time_stamp)
-
-                char_set = unpack('B', self.datafile.read(1))[0]
-                if char_set == CHARSET_ANSI:  output['comments']['CharSet'].append('ANSI')
-                elif char_set == CHARSET_UTF: output['comments']['CharSet'].append('UTF-16')
-                elif char_set == CHARSET_ROI: output['comments']['CharSet'].append('NeuroMotive ROI')
-                else:                         output['comments']['CharSet'].append('error')
-
-                comm_flag = unpack('B', self.datafile.read(1))[0]
-                if comm_flag == COMM_RGBA:   output['comments']['Flag'].append('RGBA color code')
-                elif comm_flag == COMM_TIME: output['comments']['Flag'].append('timestamp')
-                else:                        output['comments']['Flag'].append('error')
-
-                output['comments']['Data'].append(unpack('<I', self.datafile.read(4))[0])
-
-                samples = self.basic_header['BytesInDataPackets'] - 12
-                comm_string = bytes.decode(self.datafile.read(samples), 'latin-1')
-                output['comments']['Comment'].append(comm_string.split(STRING_TERMINUS, 1)[0])
-
-            # For video sync event
-            elif packet_id == VIDEO_SYNC_PACKET_ID:
-
-                # See if the dictionary exists in output, if not, create it
-                if 'video_sync_events' not in output:
-                    output['video_sync_events'] = {'TimeStamps': [], 'VideoFileNum': [], 'VideoFrameNum': [],
-                                                   'VideoElapsedTime_ms': [], 'VideoSourceID': []}
-
-                output['video_sync_events']['TimeStamps'].append(          time_stamp)
-                output['video_sync_events']['VideoFileNum'].append(        unpack('<H', self.datafile.read(2))[0])
-                output['video_sync_events']['VideoFrameNum'].append(       unpack('<I', self.datafile.read(4))[0])
-                output['video_sync_events']['VideoElapsedTime_ms'].append( unpack('<I', self.datafile.read(4))[0])
-                output['video_sync_events']['VideoSourceID'].append(       unpack('<I', self.datafile.read(4))[0])
-                self.datafile.seek((self.basic_header['BytesInDataPackets'] - 20), 1)
-
-            # For tracking event
-            elif packet_id == TRACKING_PACKET_ID:
-
-                # See if the dictionary exists in output, if not, create it
-                if 'tracking_events' not in output:
-                    output['tracking_events'] = {'TimeStamps': [], 'ParentID': [], 'NodeID': [], 'NodeCount': [],
-                                                 'PointCount': [], 'TrackingPoints': []}
-
-                output['tracking_events']['TimeStamps'].append( time_stamp)
-                output['tracking_events']['ParentID'].append(   unpack('<H', self.datafile.read(2))[0])
-                output['tracking_events']['NodeID'].append(     unpack('<H', self.datafile.read(2))[0])
-                output['tracking_events']['NodeCount'].append(  unpack('<H', self.datafile.read(2))[0])
-                output['tracking_events']['PointCount'].append( unpack('<H', self.datafile.read(2))[0])
-                samples = (self.basic_header['BytesInDataPackets'] - 14) // 2
-                output['tracking_events']['TrackingPoints'].append(
-                    np.fromfile(file=self.datafile, dtype=np.uint16, count=samples))
-
-            # For button trigger event
-            elif packet_id == BUTTON_PACKET_ID:
-
-                # See if the dictionary exists in output, if not, create it
-                if 'button_trigger_events' not in output:
-                    output['button_trigger_events'] = {'TimeStamps': [], 'TriggerType': []}
-
-                output['button_trigger_events']['TimeStamps'].append(time_stamp)
-                trigger_type = unpack('<H', self.datafile.read(2))[0]
-                if trigger_type == UNDEFINED:      output['button_trigger_events']['TriggerType'].append('undefined')
-                elif trigger_type == BUTTON_PRESS: output['button_trigger_events']['TriggerType'].append('button press')
-                elif trigger_type == BUTTON_RESET: output['button_trigger_events']['TriggerType'].append('event reset')
-                else:                              output['button_trigger_events']['TriggerType'].append('error')
-                self.datafile.seek((self.basic_header['BytesInDataPackets'] - 8), 1)
-
-            # For configuration log event
-            elif packet_id == CONFIGURATION_PACKET_ID:
-
-                # See if the dictionary exists in output, if not, create it
-                if 'configuration_events' not in output:
-                    output['configuration_events'] = {'TimeStamps': [], 'ConfigChangeType': [], 'ConfigChanged': []}
-
-                output['configuration_events']['TimeStamps'].append(time_stamp)
-                change_type = unpack('<H', self.datafile.read(2))[0]
-                if change_type == CHG_NORMAL:     output['configuration_events']['ConfigChangeType'].append('normal')
-                elif change_type == CHG_CRITICAL: output['configuration_events']['ConfigChangeType'].append('critical')
-                else:                             output['configuration_events']['ConfigChangeType'].append('error')
-
-                samples = self.basic_header['BytesInDataPackets'] - 8
-                output['configuration_events']['ConfigChanged'].append(unpack(('<' + str(samples) + 's'),
-                                                                              self.datafile.read(samples))[0])
-
-            # Otherwise, packet unknown, skip to next packet
-            else:  self.datafile.seek((self.basic_header['BytesInDataPackets'] - 6), 1)
-
+                wave_bytes = np.ascontiguousarray(chan_spikes['Waveform'][:, :samples * data_type.itemsize])
+                waveforms  = wave_bytes.view(data_type).astype(np.int32) * dig_factor
+
+                output['spike_events']['ChannelID'].append(int(packet_id))
+                output['spike_events']['NEUEVWAV_HeaderIndices'].append(ext_header_idx)
+                output['spike_events']['TimeStamps'].append(chan_spikes['TimeStamp'].astype(np.int64))
+                output['spike_events']['Classification'].append(
+                    labelcodes(chan_spikes['Classification'], classifiers, 'error'))
+                output['spike_events']['Waveforms'].append(waveforms)
+
+        # For comment events
+        mask = packet_mask(COMMENT_PACKET_ID)
+        if np.any(mask):
+            comments = packets.view(nev_packet_dtype(bytes_in_packet, 'comment'))[mask]
+            output['comments'] = {
+                'TimeStamps': time_stamps[mask].tolist(),
+                'CharSet':    labelcodes(comments['CharSet'], {CHARSET_ANSI: 'ANSI', CHARSET_UTF: 'UTF-16',
+                                                               CHARSET_ROI: 'NeuroMotive ROI'}, 'error'),
+                'Flag':       labelcodes(comments['Flag'], {COMM_RGBA: 'RGBA color code', COMM_TIME: 'timestamp'},
+                                         'error'),
+                'Data':       comments['Data'].tolist(),
+                'Comment':    [bytes.decode(comm_string, 'latin-1').split(STRING_TERMINUS, 1)[0]
+                               for comm_string in comments['Comment']]}
+
+        # For video sync event
+        mask = packet_mask(VIDEO_SYNC_PACKET_ID)
+        if np.any(mask):
+            video = packets.view(nev_packet_dtype(bytes_in_packet, 'video_sync'))[mask]
+            output['video_sync_events'] = {'TimeStamps': time_stamps[mask].tolist()}
+            for name in ['VideoFileNum', 'VideoFrameNum', 'VideoElapsedTime_ms', 'VideoSourceID']:
+                output['video_sync_events'][name] = video[name].tolist()
+
+        # For tracking event
+        mask = packet_mask(TRACKING_PACKET_ID)
+        if np.any(mask):
+            tracking = packets.view(nev_packet_dtype(bytes_in_packet, 'tracking'))[mask]
+            output['tracking_events'] = {'TimeStamps': time_stamps[mask].tolist()}
+            for name in ['ParentID', 'NodeID', 'NodeCount', 'PointCount']:
+                output['tracking_events'][name] = tracking[name].tolist()
+            output['tracking_events']['TrackingPoints'] = list(np.array(tracking['TrackingPoints']))
+
+        # For button trigger event
+        mask = packet_mask(BUTTON_PACKET_ID)
+        if np.any(mask):
+            button = packets.view(nev_packet_dtype(bytes_in_packet, 'button_trigger'))[mask]
+            output['button_trigger_events'] = {
+                'TimeStamps':  time_stamps[mask].tolist(),
+                'TriggerType': labelcodes(button['TriggerType'], {UNDEFINED: 'undefined', BUTTON_PRESS: 'button press',
+                                                                  BUTTON_RESET: 'event reset'}, 'error')}
+
+        # For configuration log event
+        mask = packet_mask(CONFIGURATION_PACKET_ID)
+        if np.any(mask):
+            config = packets.view(nev_packet_dtype(bytes_in_packet, 'configuration'))[mask]
+            output['configuration_events'] = {
+                'TimeStamps':       time_stamps[mask].tolist(),
+                'ConfigChangeType': labelcodes(config['ConfigChangeType'], {CHG_NORMAL: 'normal',
+                                                                            CHG_CRITICAL: 'critical'}, 'error'),
+                'ConfigChanged':    [changed.tobytes() for changed in config['ConfigChanged']]}
+
+        # Any other packets are unknown, and skipped
+        del packets
         return output
 
     def processroicomments(self, comments):
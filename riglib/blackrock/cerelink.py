@@ -6,6 +6,7 @@ Blackrock Neural Signal Processor (NSP) (or nPlay).
 import sys
 import time
 from collections import namedtuple
+import numpy as np
 try:
     from cerebus import cbpy
 except ImportError:
@@ -17,6 +18,9 @@ SpikeEventData = namedtuple("SpikeEventData",
 ContinuousData = namedtuple("ContinuousData", 
                             ["chan", "samples", "arrival_ts"])
 
+# spike events returned by a single call to cbpy.trial_event, see Connection.get_event_data_batches
+event_dtype = np.dtype([("chan", np.int32), ("unit", np.int32), ("ts", np.int64), ("arrival_ts", np.float64)])
+
 class Connection(object):
     '''
     A wrapper around a UDP socket which sends the Blackrock NeuroPort system commands and 
@@ -131,8 +135,47 @@ class Connection(object):
     def __del__(self):
         self.disconnect()
 
-    def get_event_data(self):
-        '''A generator that yields spike event data.'''
+    def trial_to_events(self, trial, arrival_ts):
+        '''
+        Convert the spike timestamps returned by cbpy.trial_event into a single array
+
+        Parameters
+        ----------
+        trial : list
+            Per-channel [chan, {'timestamps': [unit 0 timestamps, unit 1 timestamps, ...], ...}] 
+            lists, as returned by cbpy.trial_event
+        arrival_ts : float
+            Time at which the data was received
+
+        Returns
+        -------
+        np.ndarray of shape (N,) and dtype event_dtype
+            Spike events, ordered by channel, then unit, then timestamp as in 'trial'
+        '''
+        chans, units, timestamps = [], [], []
+        for list_ in trial:
+            chan = list_[0]
+            for unit, unit_ts in enumerate(list_[1]['timestamps']):
+                if len(unit_ts) > 0:
+                    chans.append(chan)
+                    units.append(unit)
+                    timestamps.append(unit_ts)
+
+        counts = [len(unit_ts) for unit_ts in timestamps]
+        events = np.empty(sum(counts), dtype=event_dtype)
+        if len(events) > 0:
+            events['chan'] = np.repeat(chans, counts) - self.channel_offset
+            # blackrock unit numbers are 0-based where zero is unsorted unit
+            # Unsorted units are unit 10 (j)
+            units = np.repeat(units, counts)
+            units[units == 0] = 10
+            events['unit'] = units
+            events['ts'] = np.concatenate(timestamps)
+        events['arrival_ts'] = arrival_ts
+        return events
+
+    def get_event_data_batches(self):
+        '''A generator that yields the spike event data received by each call to cbpy.trial_event as one array (see trial_to_events).'''
 
         sleep_time = 0
 
@@ -141,20 +184,17 @@ class Connection(object):
             result, trial = cbpy.trial_event(reset=True)  # TODO -- check if result = 0?
             arrival_ts = time.time()
 
-            for list_ in trial:
-                chan = list_[0]
-                for unit, unit_ts in enumerate(list_[1]['timestamps']):
-                    for ts in unit_ts:
-                        # blackrock unit numbers are 0-based where zero is unsorted unit
-                        if unit == 0:
-                            # Unsorted units are unit 10 (j)
-                            un = 10
-                        else:
-                            un = unit
-                        yield SpikeEventData(chan=chan-self.channel_offset, unit=un, ts=ts, arrival_ts=arrival_ts)
+            yield self.trial_to_events(trial, arrival_ts)
 
             time.sleep(sleep_time)
 
+    def get_event_data(self):
+        '''A generator that yields spike event data.'''
+
+        for events in self.get_event_data_batches():
+            for chan, unit, ts, arrival_ts in events.tolist():
+                yield SpikeEventData(chan=chan, unit=unit, ts=ts, arrival_ts=arrival_ts)
+
 
     def get_continuous_data(self):
         '''A generator that yields continuous data.'''
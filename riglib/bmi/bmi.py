@@ -335,6 +335,28 @@ class GaussianStateHMM(object):
         self.state = self._forward_infer(self.state, obs, **kwargs)
         return self.state.mean
 
+    def forward_infer_batch(self, observations):
+        '''
+        Run the 1-step forward inference over a sequence of observations, starting
+        from the current state. No control inputs are applied.
+
+        Parameters
+        ----------
+        observations : np.ndarray of shape (T, N)
+            One observation per row, decoded in order
+
+        Returns
+        -------
+        np.ndarray of shape (T, n_states)
+            Posterior mean after each observation. The final state estimate is left in self.state
+        '''
+        T = observations.shape[0]
+        means = np.empty((T, self.n_states()))
+        for k in range(T):
+            self.state = self._forward_infer(self.state, np.mat(observations[k]).reshape(-1,1))
+            means[k] = np.asarray(self.state.mean).ravel()
+        return means
+
     def _pickle_init(self):
         pass
 
@@ -803,6 +825,41 @@ class Decoder(object):
             output.append(self.filt.get_mean())
         return np.vstack(output)
 
+    def decode_batch(self, neural_obs):
+        '''
+        Decode a sequence of observations offline. The state estimates are those of
+        calling 'predict' (without assist) on each row of neural_obs in order, after
+        any preprocessing of the raw observations which the decoder applies in
+        '__call__' (subclasses which preprocess observations there, e.g., PPFDecoder,
+        override this method to apply the same preprocessing). The observations are
+        normalized in one step and the whole sequence is handed to the filter at once
+        (see GaussianStateHMM.forward_infer_batch).
+
+        Parameters
+        ----------
+        neural_obs : np.array of shape (# observations, # features)
+            Independent neural observations are rows of the data matrix
+
+        Returns
+        -------
+        np.array of shape (# observations, # states)
+            Decoder state after each observation
+        '''
+        neural_obs = np.array(neural_obs, dtype=np.float64)
+
+        # Hard bounds on the state feed back into the estimate at every step
+        if hasattr(self, 'bounder'):
+            return np.vstack([self.predict(obs) for obs in neural_obs])
+
+        if np.any(neural_obs > 1000):
+            print('observations have counts >> 1000 ')
+
+        if hasattr(self, 'zscore') and self.zscore:
+            neural_obs = (neural_obs - self.mFR) * (1./self.sdFR)
+            neural_obs[:, self.zeromeanunits] = self.mFR[self.zeromeanunits]
+
+        return self.filt.forward_infer_batch(neural_obs)
+
     def __str__(self):
         if hasattr(self, 'db_entry'):
             return self.db_entry.name
@@ -1013,7 +1070,7 @@ class BMISystem(object):
 
             new_params = None # by default, no new parameters are available
             if self.has_updater:
-                new_params = copy.deepcopy(self.updater.get_result())
+                new_params = self.updater.get_result()
 
             # Update the decoder if new parameters are available
             if not (new_params is None):
@@ -1028,6 +1085,16 @@ class BMISystem(object):
                 self.param_hist.append(new_params)
         return decoded_states, update_flag
 
+    def sync_param_hist(self):
+        '''
+        Replace parameters in the parameter history which were received through shared 
+        memory with persistent copies from the updater (the shared buffers are reused 
+        for later updates). Call once the task is no longer running.
+        '''
+        if self.has_updater and getattr(self.updater, 'shared_params', False):
+            for entry, params in zip(self.param_hist, self.updater.get_result_history()):
+                entry.update(params)
+
 
 class BMILoop(object):
     '''
@@ -1300,6 +1367,7 @@ class BMILoop(object):
         log_file.write(str(self.state) + '\n')
         try:
             from . import clda
+            self.bmi_system.sync_param_hist()
             if len(self.bmi_system.param_hist) > 0 and not self.updater is None:
                 log_file.write('n_updates: %g\n' % len(self.bmi_system.param_hist))
                 ignore_none = self.learner.batch_size > 1
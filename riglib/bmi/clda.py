@@ -14,8 +14,9 @@ import tables
 import re
 from . import assist
 import os
-import scipy
+import scipy.linalg
 import copy
+import queue
 
 from utils.angle_utils import *
 
@@ -360,36 +361,80 @@ class RegexKeyDict(dict):
 ##############################################################################
 ## Updaters
 ##############################################################################
-from riglib.mp_calc import MPCompute
+from riglib.mp_calc import MPCompute, SharedParams
 class Updater(object):
     '''
     Wrapper for MPCompute computations running in another process
     '''
-    def __init__(self, fn, multiproc=False, verbose=False):
-        self.verbose = verbose
-        self.multiproc = multiproc
-        if self.multiproc:
-            # create the queues
-            self.work_queue = mp.Queue()
-            self.result_queue = mp.Queue()
+    def __init__(self, fn, multiproc=False, verbose=False, shared_params=False):
+        '''
+        Constructor for Updater
 
-            # Instantiate the process
-            self.calculator = MPCompute(self.work_queue, self.result_queue, fn)
+        Parameters
+        ----------
+        fn : callable
+            Function which calculates the new parameters
+        multiproc : bool, optional, default=False
+            If True, 'fn' runs in a separate process (see riglib.mp_calc.MPCompute). The
+            process is spawned when the first job is queued, so it starts with the
+            updater's state as set up by 'init'.
+        verbose : bool, optional, default=False
+            Print debugging information
+        shared_params : bool, optional, default=False
+            Only used if 'multiproc' is True. If True, the new parameters are handed off
+            through double-buffered shared memory (see riglib.mp_calc.SharedParams) and
+            the Decoder is pointed directly at the shared arrays, so nothing is unpickled
+            or copied on the task loop when an update lands.
 
-            # spawn the process
-            self.calculator.start()
-        else:
-            self.fn = fn
+        Returns
+        -------
+        Updater instance
+        '''
+        self.verbose = verbose
+        self.multiproc = multiproc
+        self.shared_params = multiproc and shared_params
+        self.fn = fn
+        self.calculator = None
 
         self._result = None
         self.waiting = False
+        self.param_buffer = None
+        self._retired_param_buffers = []
+        self._last_seq = 0
+        self.n_results = 0
+        self._result_hist = []
 
     def init(self, decoder):
         pass
 
+    def _start_calculator(self):
+        '''
+        Spawn the process which runs the parameter calculations
+        '''
+        # create the queues
+        self.work_queue = mp.Queue()
+        self.result_queue = mp.Queue()
+        if self.shared_params:
+            # the shared buffers are reused, so the calculator keeps copies of the results
+            # for the parameter history
+            self.hist_queue = mp.Queue()
+            from multiprocessing import resource_tracker
+            resource_tracker.ensure_running()
+        else:
+            self.hist_queue = None
+
+        # Instantiate the process
+        self.calculator = MPCompute(self.work_queue, self.result_queue, self.fn,
+            shared_params=self.shared_params, hist_queue=self.hist_queue)
+
+        # spawn the process
+        self.calculator.start()
+
     def __call__(self, *args, **kwargs):
         input_data = (args, kwargs)
         if self.multiproc:
+            if self.calculator is None:
+                self._start_calculator()
             if self.verbose: print("queuing job")
             self.work_queue.put(input_data)    
             self.prev_input = input_data
@@ -398,30 +443,93 @@ class Updater(object):
             self._result = self.fn(*args, **kwargs)
 
     def get_result(self):
+        '''
+        Get the new parameters, if a calculation has finished since the last call
+
+        Returns
+        -------
+        dict or None
+            New parameters, or None if no new parameters are available. Parameters
+            received through shared memory are only valid until the next result is
+            retrieved (see get_result_history for persistent copies).
+        '''
         if self.multiproc:
+            if self.param_buffer is not None:
+                params, self._last_seq = self.param_buffer.read(self._last_seq)
+                if params is not None:
+                    self.waiting = False
+                    self.n_results += 1
+                    self._drain_result_history()
+                    return params
+
+            if not self.waiting:
+                return None
+
             try:
                 output_data = self.result_queue.get_nowait()
-                self.prev_result = output_data
-                self.waiting = False
-                return output_data
-            except Queue.Empty:
+            except queue.Empty:
                 return None
             except:
                 import traceback
                 traceback.print_exc()
+                return None
+
+            if isinstance(output_data, SharedParams):
+                # the calculator created a new shared buffer. The Decoder (and the
+                # parameter history) can still hold views into the old one, so it is
+                # kept mapped for as long as the updater exists
+                if self.param_buffer is not None:
+                    self._retired_param_buffers.append(self.param_buffer)
+                self.param_buffer = output_data
+                self._last_seq = 0
+                return self.get_result()
+
+            self.prev_result = output_data
+            self.waiting = False
+            self.n_results += 1
+            return output_data
         else:
-            if self._result is not None:
-                res = self._result
-            else:
-                res = None
+            # Copy, since the parameters may share memory with the updater's internal state
+            res = copy.deepcopy(self._result)
             self._result = None
             return res
 
+    def get_result_history(self, timeout=5.):
+        '''
+        Collect copies of all the results returned by get_result from the calculator process.
+        Only needed when the results are handed off through shared memory.
+
+        Parameters
+        ----------
+        timeout : float, optional, default=5.
+            Maximum time (s) to wait for each result
+
+        Returns
+        -------
+        list of dict
+            One entry for each result returned by get_result, in order
+        '''
+        while len(self._result_hist) < self.n_results:
+            self._result_hist.append(self.hist_queue.get(timeout=timeout))
+        return self._result_hist[:self.n_results]
+
+    def _drain_result_history(self):
+        '''
+        Move the copies of the results which have already arrived from the calculator
+        process off of 'hist_queue' without waiting, so that the queue does not grow
+        over the course of the task
+        '''
+        while len(self._result_hist) < self.n_results:
+            try:
+                self._result_hist.append(self.hist_queue.get_nowait())
+            except queue.Empty:
+                break
+
     def __del__(self):
         '''
         Stop the child process if one was spawned
         '''
-        if self.multiproc:
+        if self.multiproc and self.calculator is not None:
             self.calculator.stop()
 
 class PPFContinuousBayesianUpdater(Updater):
@@ -528,7 +636,8 @@ class KFRML(Updater):
     See (Dangi et al, Neural Computation, 2014) for mathematical details.
     '''
     update_kwargs = dict(steady_state=False)
-    def __init__(self, batch_time, half_life, adapt_C_xpose_Q_inv_C=True, regularizer=None):
+    def __init__(self, batch_time, half_life, adapt_C_xpose_Q_inv_C=True, regularizer=None,
+        multiproc=False, shared_params=False):
         '''
         Constructor for KFRML
 
@@ -543,12 +652,14 @@ class KFRML(Updater):
             defines the feedback dynamics of the final closed-loop system if A and W are known
         regularizer: float
             Defines lambda regularizer to use in calculation of C matrix : C = (X*X.T + lambda*eye).I * (X*Y)
+        multiproc, shared_params : bool, optional, default=False
+            See Updater
 
         Returns
         -------
         KFRML instance
         '''
-        super(KFRML, self).__init__(self.calc, multiproc=False)
+        super(KFRML, self).__init__(self.calc, multiproc=multiproc, shared_params=shared_params)
         self.batch_time = batch_time
         self.half_life = half_life
         self.rho = np.exp(np.log(0.5) / (self.half_life/batch_time))
@@ -709,35 +820,102 @@ class KFRML(Updater):
             mFR_old = decoder.mFR
             sdFR_old = decoder.sdFR
 
-        x = np.mat(intended_kin)
-        y = np.mat(spike_counts)
-        #limit x to the indices that can adapt:
-        #x = x[self.state_adapting_inds, :]
+        x = np.asarray(intended_kin, dtype=np.float64)
+        y = np.asarray(spike_counts, dtype=np.float64)
+
+        if values is not None:
+            values = np.asarray(values, dtype=np.float64).ravel()
+        self._update_suff_stats(x, y, values, rho, decoder.drives_neurons)
+
+        C, Q, C_xpose_Q_inv = self._calc_obs_model(decoder, drives_neurons)
+
+        #mFR and sdFR are not exempt from the 'adapting_inds'
+        try:
+            mFR = mFR_old.copy()
+            sdFR = sdFR_old.copy()
+        except:
+            mFR = 0.
+            sdFR = 1.
+
+        if self.adapt_mFR_stats:
+            mFR[self.adapting_inds] = (1-rho)*np.mean(spike_counts[self.adapting_inds,:].T, axis=0) + rho*mFR_old[self.adapting_inds]
+            sdFR[self.adapting_inds] = (1-rho)*np.std(spike_counts[self.adapting_inds,:].T, axis=0) + rho*sdFR_old[self.adapting_inds]
+
+        new_params = {'filt.C':C, 'filt.Q':Q, 'filt.C_xpose_Q_inv':C_xpose_Q_inv,
+            'mFR':mFR, 'sdFR':sdFR, 'kf.ESS':self.ESS, 'filt.S':self.S, 'filt.T':self.T}
 
-        # limit y to the features which are permitted to adapt
-        #y = y[self.adapting_inds, :]
+        if self.adapt_C_xpose_Q_inv_C:
+            C_xpose_Q_inv_C = C_xpose_Q_inv * C
+            new_params['filt.C_xpose_Q_inv_C'] = C_xpose_Q_inv_C
+            new_params['filt.C_xpose_Q_inv'] = C_xpose_Q_inv
+            new_params['filt.R'] = self.R
+        else:
+            new_params['filt.C_xpose_Q_inv_C'] = decoder.filt.C_xpose_Q_inv_C
+            new_params['filt.R'] = decoder.filt.R
 
+        self._new_params = new_params
+        return new_params
+
+    def _update_suff_stats(self, x, y, values, rho, drives_neurons):
+        '''
+        Forget old data by a factor rho and add a batch of weighted samples to 
+        the sufficient statistics R, S, T and ESS. The sample weights are applied 
+        by scaling the columns of x and y, rather than multiplying through 
+        a (batch_size, batch_size) diagonal matrix.
+
+        Parameters
+        ----------
+        x : np.ndarray of shape (n_states, batch_size)
+            Batch of intended kinematics
+        y : np.ndarray of shape (n_features, batch_size)
+            Batch of observations of decoder features
+        values : np.ndarray of shape (batch_size,) or None
+            Relative value of each sample. If None, samples are equally weighted.
+        rho : float
+            Forgetting factor for the old sufficient statistics
+        drives_neurons : np.ndarray of shape (n_states,)
+            Boolean mask of the states which drive the observations
+
+        Returns
+        -------
+        None
+        '''
         if values is not None:
             n_samples = np.sum(values)
-            B = np.mat(np.diag(values))
+            xw = x * values
+            yw = y * values
         else:
-            n_samples = spike_counts.shape[1]
-            B = np.mat(np.eye(n_samples))
+            n_samples = y.shape[1]
+            xw = x
+            yw = y
 
         if self.adapt_C_xpose_Q_inv_C:
-            #self.R[self.state_adapting_inds_mesh] = rho*self.R[self.state_adapting_inds_mesh] + (x*B*x.T)
-            self.R = rho*self.R + (x*B*x.T)
+            self.R = rho*self.R + np.dot(xw, x.T)
 
         if np.any(np.isnan(self.R)):
             print('np.nan in self.R in riglib/bmi/clda.py!')
 
-        #self.S[self.neur_by_state_adapting_inds_mesh] = rho*self.S[self.neur_by_state_adapting_inds_mesh] + (y*B*x.T)
-        #self.T[self.adapting_inds_mesh] = rho*self.T[self.adapting_inds_mesh] + np.dot(y, B*y.T)
-
-        self.S[:, decoder.drives_neurons] = rho*self.S[:, decoder.drives_neurons] + (y*B*x[decoder.drives_neurons, :].T)
-        self.T = rho*self.T + np.dot(y, B*y.T)
+        self.S[:, drives_neurons] = rho*self.S[:, drives_neurons] + np.dot(y, xw[drives_neurons, :].T)
+        self.T = rho*self.T + np.dot(yw, y.T)
         self.ESS = rho*self.ESS + n_samples
 
+    def _calc_obs_model(self, decoder, drives_neurons):
+        '''
+        Calculate the observation model parameters from the current sufficient statistics
+
+        Parameters
+        ----------
+        decoder : bmi.Decoder instance
+            Reference to the Decoder instance
+        drives_neurons : np.ndarray of shape (n_states,)
+            Boolean mask of the states which drive the observations
+
+        Returns
+        -------
+        C : np.matrix of shape (n_features, n_states)
+        Q : np.matrix of shape (n_features, n_features)
+        C_xpose_Q_inv : np.matrix of shape (n_states, n_features)
+        '''
         R_inv = np.mat(np.zeros(self.R.shape))
         
         try:
@@ -765,33 +943,8 @@ class KFRML(Updater):
             Q[np.ix_(self.stable_inds, self.adapting_inds)] = 0
             Q[np.ix_(self.adapting_inds, self.stable_inds)] = 0
 
-        #mFR and sdFR are not exempt from the 'adapting_inds'
-        try:
-            mFR = mFR_old.copy()
-            sdFR = sdFR_old.copy()
-        except:
-            mFR = 0.
-            sdFR = 1.
-
-        if self.adapt_mFR_stats:
-            mFR[self.adapting_inds] = (1-rho)*np.mean(spike_counts[self.adapting_inds,:].T, axis=0) + rho*mFR_old[self.adapting_inds]
-            sdFR[self.adapting_inds] = (1-rho)*np.std(spike_counts[self.adapting_inds,:].T, axis=0) + rho*sdFR_old[self.adapting_inds]
-
         C_xpose_Q_inv = C.T * np.linalg.pinv(Q)
-        new_params = {'filt.C':C, 'filt.Q':Q, 'filt.C_xpose_Q_inv':C_xpose_Q_inv,
-            'mFR':mFR, 'sdFR':sdFR, 'kf.ESS':self.ESS, 'filt.S':self.S, 'filt.T':self.T}
-
-        if self.adapt_C_xpose_Q_inv_C:
-            C_xpose_Q_inv_C = C_xpose_Q_inv * C
-            new_params['filt.C_xpose_Q_inv_C'] = C_xpose_Q_inv_C
-            new_params['filt.C_xpose_Q_inv'] = C_xpose_Q_inv
-            new_params['filt.R'] = self.R
-        else:
-            new_params['filt.C_xpose_Q_inv_C'] = decoder.filt.C_xpose_Q_inv_C
-            new_params['filt.R'] = decoder.filt.R
-
-        self._new_params = new_params
-        return new_params
+        return C, Q, C_xpose_Q_inv
 
     def set_stable_inds(self, stable_inds, adapting_inds=None, stable_inds_independent=False):
         '''
@@ -830,10 +983,11 @@ class KFRML_IVC(KFRML):
         See KFRML.calc for input argument documentation
         '''
         new_params = super(KFRML_IVC, self).calc(intended_kin=intended_kin, spike_counts=spike_counts, decoder=decoder, half_life=half_life, values=values, **kwargs)
-        C, Q, = new_params['filt.C'], new_params['filt.Q']
+        C = new_params['filt.C']
 
-        D = (C.T * np.linalg.pinv(Q) * C)
-        if self.default_gain == None:
+        # C^T Q^{-1} was already computed by the parent update
+        D = new_params['filt.C_xpose_Q_inv'] * C
+        if self.default_gain is None:
             # assume velocity states are last half of states: 
             v0 = int(.5*(D.shape[0] - 1))
             
@@ -861,7 +1015,6 @@ class KFRML_IVC(KFRML):
             D[3:6, 3:6] = np.mat(np.diag(D_diag))
 
         new_params['filt.C_xpose_Q_inv_C'] = D
-        new_params['filt.C_xpose_Q_inv'] = C.T * np.linalg.pinv(Q)
         return new_params
 
     @classmethod
@@ -886,6 +1039,129 @@ class KFRML_IVC(KFRML):
         '''
         return (1-a*n)/w * (a-n)/n         
 
+class KFRML_Woodbury(KFRML):
+    '''
+    RML version which tracks the inverse of the joint second-moment matrix 
+
+        M = [[R, S^T], [S, T]]
+
+    (restricted to the states which drive the neurons) using rank-k Woodbury 
+    updates, one rank per sample of the batch. Since Q is proportional to the 
+    Schur complement of R in M, both C^T Q^{-1} and Q^{-1} are blocks of M^{-1}, 
+    so no (n_features, n_features) pseudo-inverse is taken on each update.
+
+    The incremental update only applies when every feature and every state adapts, 
+    C^T Q^{-1} C is adapted and no regularizer is used. Otherwise, or if M is 
+    not positive definite (e.g., a unit which has never fired), the update 
+    falls back to KFRML. Batches with negative sample weights are not applied
+    incrementally; M^{-1} is recomputed on the next update.
+    '''
+    def __init__(self, batch_time, half_life, adapt_C_xpose_Q_inv_C=True, regularizer=None,
+        multiproc=False, shared_params=False, refresh_interval=50):
+        '''
+        Constructor for KFRML_Woodbury
+
+        Parameters
+        ----------
+        batch_time, half_life, adapt_C_xpose_Q_inv_C, regularizer, multiproc, shared_params : 
+            See KFRML
+        refresh_interval : int, optional, default=50
+            Number of incremental updates after which M^{-1} is recomputed 
+            from the sufficient statistics, to bound the accumulation of roundoff error
+
+        Returns
+        -------
+        KFRML_Woodbury instance
+        '''
+        super(KFRML_Woodbury, self).__init__(batch_time, half_life, adapt_C_xpose_Q_inv_C=adapt_C_xpose_Q_inv_C, 
+            regularizer=regularizer, multiproc=multiproc, shared_params=shared_params)
+        self.refresh_interval = refresh_interval
+        self._M_inv = None
+        self._n_incremental = 0
+
+    def init(self, decoder):
+        '''
+        See KFRML.init
+        '''
+        super(KFRML_Woodbury, self).init(decoder)
+        self._M_inv = None
+        self._n_incremental = 0
+
+    def _incremental(self):
+        return self.adapt_C_xpose_Q_inv_C and self.regularizer is None and len(self.stable_inds) == 0 \
+            and len(self.adapting_inds) == len(self.feature_inds) \
+            and len(self.state_adapting_inds) == len(self.state_inds)
+
+    def _update_suff_stats(self, x, y, values, rho, drives_neurons):
+        '''
+        See KFRML._update_suff_stats. Also applies the same update to M^{-1}, if it is being tracked.
+        '''
+        super(KFRML_Woodbury, self)._update_suff_stats(x, y, values, rho, drives_neurons)
+        if self._M_inv is None:
+            return
+        elif not self._incremental() or self._n_incremental >= self.refresh_interval:
+            self._M_inv = None
+            return
+
+        if values is not None and np.any(values < 0):
+            # negatively weighted samples are a downdate, which can make M indefinite,
+            # so M^{-1} is recomputed (and checked) from the sufficient statistics
+            self._M_inv = None
+            return
+
+        # rho*M + U*U^T, with the sample weights folded into U. Samples with zero
+        # weight do not change M
+        U = np.vstack([x[drives_neurons, :], y])
+        if values is not None:
+            keep = values > 0
+            U = U[:, keep] * np.sqrt(values[keep])
+
+        n_rank = U.shape[1]
+        if n_rank >= U.shape[0]:
+            # direct inversion is cheaper than the Woodbury identity
+            self._M_inv = None
+            return
+
+        M_inv_U = np.dot(self._M_inv, U)
+        G = rho*np.eye(n_rank) + np.dot(U.T, M_inv_U)
+        M_inv = (self._M_inv - np.dot(M_inv_U, scipy.linalg.cho_solve(scipy.linalg.cho_factor(G), M_inv_U.T))) / rho
+        self._M_inv = 0.5*(M_inv + M_inv.T)
+        self._n_incremental += 1
+
+    def _calc_obs_model(self, decoder, drives_neurons):
+        '''
+        See KFRML._calc_obs_model
+        '''
+        if not self._incremental():
+            self._M_inv = None
+            return super(KFRML_Woodbury, self)._calc_obs_model(decoder, drives_neurons)
+
+        R = np.asarray(self.R)[np.ix_(drives_neurons, drives_neurons)]
+        S = np.asarray(self.S)[:, drives_neurons]
+        T = np.asarray(self.T)
+
+        if self._M_inv is None:
+            M = np.vstack([np.hstack([R, S.T]), np.hstack([S, T])])
+            try:
+                M_chol = scipy.linalg.cho_factor(M)
+            except np.linalg.LinAlgError:
+                return super(KFRML_Woodbury, self)._calc_obs_model(decoder, drives_neurons)
+            self._M_inv = scipy.linalg.cho_solve(M_chol, np.eye(M.shape[0]))
+            self._n_incremental = 0
+
+        n_dn = R.shape[0]
+        C_dn = scipy.linalg.cho_solve(scipy.linalg.cho_factor(R), S.T).T
+
+        C = np.mat(np.zeros(decoder.filt.C.shape))
+        C[:, drives_neurons] = C_dn
+        Q = np.mat((T - np.dot(S, C_dn.T)) / self.ESS)
+
+        # Q = (T - S R^{-1} S^T)/ESS, so C^T Q^{-1} = -ESS * (M^{-1})_{XY}
+        C_xpose_Q_inv = np.mat(np.zeros([C.shape[1], C.shape[0]]))
+        C_xpose_Q_inv[drives_neurons, :] = -self.ESS * self._M_inv[:n_dn, n_dn:]
+        return C, Q, C_xpose_Q_inv
+
+
 class KFRML_baseline(KFRML):
     '''
     RML version where only the baseline firing rates are adapted
@@ -989,7 +1265,7 @@ class KFSmoothbatch(Updater):
     Calculate KF Parameter updates using the SmoothBatch method. See [Orsborn et al, 2012] for mathematical details
     '''
     update_kwargs = dict(steady_state=True)
-    def __init__(self, batch_time, half_life):
+    def __init__(self, batch_time, half_life, multiproc=False, shared_params=False):
         '''
         Constructor for KFSmoothbatch
 
@@ -999,12 +1275,14 @@ class KFSmoothbatch(Updater):
             Time over which to collect sample data
         half_life : float
             Time over which parameters are half-overwritten
+        multiproc, shared_params : bool, optional, default=False
+            See Updater
 
         Return
         ------
         KFSmoothbatch instance
         '''
-        super(KFSmoothbatch, self).__init__(self.calc, multiproc=False)
+        super(KFSmoothbatch, self).__init__(self.calc, multiproc=multiproc, shared_params=shared_params)
         self.half_life = half_life
         self.batch_time = batch_time
         self.rho = np.exp(np.log(0.5) / (self.half_life/batch_time))
@@ -1038,9 +1316,10 @@ class KFSmoothbatch(Updater):
         mFR = (1-rho)*np.mean(spike_counts.T, axis=0) + rho*mFR_old
         sdFR = (1-rho)*np.std(spike_counts.T, axis=0) + rho*sdFR_old
         
-        D = C.T * np.linalg.pinv(Q) * C
+        C_xpose_Q_inv = C.T * np.linalg.pinv(Q)
+        D = C_xpose_Q_inv * C
         new_params = {'kf.C':C, 'kf.Q':Q, 
-            'kf.C_xpose_Q_inv_C':D, 'kf.C_xpose_Q_inv':C.T * np.linalg.pinv(Q),
+            'kf.C_xpose_Q_inv_C':D, 'kf.C_xpose_Q_inv':C_xpose_Q_inv,
             'mFR':mFR, 'sdFR':sdFR, 'rho':rho }
         return new_params
 
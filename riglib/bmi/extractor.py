@@ -4,10 +4,11 @@ Examples include spike rate estimation, LFP power, and EMG amplitude.
 '''
 import numpy as np
 import time
-from scipy.signal import butter, lfilter
+from scipy.signal import butter, lfilter, sosfilt
 import math
 import os
 import nitime.algorithms as tsa
+from numpy.lib.stride_tricks import as_strided
 
 class FeatureExtractor(object):
     '''
@@ -123,6 +124,184 @@ class BinnedSpikeCountsExtractor(FeatureExtractor):
             max_ind = np.argmax(ts['ts'])
             bin_edges = np.array([ts[min_ind]['ts'], ts[max_ind]['ts']])
 
+    @staticmethod
+    def make_unit_lut(units):
+        '''
+        Create a dense lookup table from (channel, unit) to the index of each unit
+        in the spike counts.
+
+        Parameters
+        ----------
+        units : np.ndarray of shape (N, 2)
+            Each row corresponds to (channel, unit)
+
+        Returns
+        -------
+        np.ndarray of shape (max channel + 2, max unit + 2)
+            lut[chan, unit] is the index of the unit in 'units', or N if the unit is not 
+            used. The last row and column are always N, for spikes from channels or units 
+            out of the range of the table (see count_spikes).
+        '''
+        units = np.asarray(units, dtype=np.int64).reshape(-1, 2)
+        n_units = len(units)
+        if n_units == 0:
+            return np.zeros((1, 1), dtype=np.intp)
+
+        lut = np.full((units[:,0].max() + 2, units[:,1].max() + 2), n_units, dtype=np.intp)
+        lut[units[:,0], units[:,1]] = np.arange(n_units)
+        return lut
+
+    @staticmethod
+    def count_spikes(ts, lut, n_units, subbin_inds=None, n_subbins=1):
+        '''
+        Count spikes per unit (and subbin) with a single np.bincount
+
+        Parameters
+        ----------
+        ts : numpy record array
+            Must have fields 'chan' and 'unit'
+        lut : np.ndarray
+            Lookup table from (channel, unit) to unit index, see make_unit_lut
+        n_units : int
+            Number of units in the lookup table
+        subbin_inds : np.ndarray of shape (len(ts),), optional
+            Subbin of each spike, from 1 to n_subbins (as returned by np.digitize). 
+            Spikes with any other index are not counted. If None, all spikes are counted in one bin.
+        n_subbins : int, optional, default=1
+            Number of subbins
+
+        Returns
+        -------
+        np.ndarray of shape (n_units, n_subbins)
+        '''
+        # Clip to [-1, last] so that every out-of-range channel/unit maps to the last row/column
+        # of the table (or, for unit -1, the last column of the previous row) in the flattened table
+        n_rows, n_cols = lut.shape
+        chan = ts['chan'].astype(np.intp)
+        np.minimum(chan, n_rows - 1, out=chan)
+        np.maximum(chan, -1, out=chan)
+        unit = ts['unit'].astype(np.intp)
+        np.minimum(unit, n_cols - 1, out=unit)
+        np.maximum(unit, -1, out=unit)
+
+        chan *= n_cols
+        chan += unit
+        inds = lut.ravel()[chan]
+
+        if subbin_inds is None:
+            counts = np.bincount(inds, minlength=n_units+1)
+            return counts[:n_units].reshape(-1, 1)
+        else:
+            n_cols = n_units + 1
+            subbin_inds = np.minimum(subbin_inds, n_subbins+1)
+            counts = np.bincount(subbin_inds*n_cols + inds, minlength=(n_subbins+2)*n_cols)
+            return counts.reshape(n_subbins+2, n_cols)[1:n_subbins+1, :n_units].T
+
+    @classmethod
+    def bin_spike_times(cls, ts, chan, unit, units, bin_edges):
+        '''
+        Bin the spike times of many units at once. Equivalent to calling np.histogram on 
+        the spike times of each unit separately, but with a single pass over the spikes.
+
+        Parameters
+        ----------
+        ts : np.ndarray of shape (n_spikes,)
+            Spike times
+        chan : np.ndarray of shape (n_spikes,)
+            Channel of each spike
+        unit : np.ndarray of shape (n_spikes,)
+            Unit (on its channel) of each spike
+        units : np.ndarray of shape (N, 2)
+            Units to count spikes for. Each row corresponds to (channel, unit)
+        bin_edges : np.ndarray of shape (T+1,)
+            Monotonically increasing bin edges, in the same time reference as ts
+
+        Returns
+        -------
+        np.ndarray of shape (T, N)
+        '''
+        ts = np.asarray(ts)
+        n_bins = len(bin_edges) - 1
+        bin_inds = np.searchsorted(bin_edges, ts, side='right')
+
+        # like np.histogram, the last bin includes its right edge
+        bin_inds[ts == bin_edges[-1]] = n_bins
+
+        spikes = dict(chan=np.asarray(chan), unit=np.asarray(unit))
+        counts = cls.count_spikes(spikes, cls.make_unit_lut(units), len(units), 
+            subbin_inds=bin_inds, n_subbins=n_bins)
+        return counts.T
+
+    @staticmethod
+    def _read_nev_spikes(nev_fname):
+        '''
+        Read the spike times, channels and units from a Blackrock .nev file. Unsorted 
+        spikes are assigned to unit 10 and noise is discarded, as in db.tracker.models.make_hdf_spks
+        '''
+        from riglib.blackrock import brpylib
+        nev_file = brpylib.NevFile(nev_fname)
+        packets = nev_file.getpackets()
+        fs = float(nev_file.basic_header['TimeStampResolution'])
+
+        packet_ids = np.asarray(packets['PacketID'])
+        neural_inds, = np.nonzero((packet_ids >= brpylib.NEURAL_PACKET_ID_MIN) & (packet_ids <= brpylib.NEURAL_PACKET_ID_MAX))
+        spikes = packets.view(brpylib.nev_packet_dtype(packets.dtype.itemsize, 'spike'))
+        unit = spikes['Classification'][neural_inds].astype(np.int64)
+        ts = packets['TimeStamp'][neural_inds] / fs
+        chan = packet_ids[neural_inds].astype(np.int64)
+        del packets, spikes
+        nev_file.datafile.close()
+
+        unit[unit == brpylib.UNDEFINED] = 10
+        keep = unit != brpylib.CLASSIFIER_NOISE
+        return ts[keep], chan[keep], unit[keep]
+
+    @staticmethod
+    def _read_nev_hdf_spikes(nev_hdf_fname, channels):
+        '''
+        Read the spike times, channels and units from a .nev.hdf file, loading each channel once
+        '''
+        fs = 30000.
+        ts, chan, unit = [np.zeros(0)], [np.zeros(0, dtype=np.int64)], [np.zeros(0, dtype=np.int64)]
+
+        try:
+            import h5py
+            nev_hdf = h5py.File(nev_hdf_fname, 'r')
+            open_method = 1
+        except:
+            import tables
+            nev_hdf = tables.openFile(nev_hdf_fname)
+            open_method = 2
+
+        for c in channels:
+            chan_str = str(c).zfill(5)
+            path = 'channel/channel%s/spike_set' % chan_str
+            try:
+                if open_method == 1:
+                    spike_set = nev_hdf[path][:]
+                else:
+                    spike_set = nev_hdf.getNode('/'+path)[:]
+            except:
+                print(('no spikes recorded on channel: ', chan_str, ': adding zeros'))
+                continue
+
+            ts.append(spike_set['TimeStamp'] / fs)
+            chan.append(np.full(len(spike_set), c, dtype=np.int64))
+            unit.append(spike_set['Unit'].astype(np.int64))
+
+        nev_hdf.close()
+        return np.hstack(ts), np.hstack(chan), np.hstack(unit)
+
+    def get_unit_lut(self):
+        '''
+        Lookup table from (channel, unit) to row of the spike counts (see make_unit_lut). 
+        Built once and only rebuilt if the 'units' attribute is replaced.
+        '''
+        if getattr(self, '_unit_lut_src', None) is not self.units:
+            self._unit_lut = self.make_unit_lut(self.units)
+            self._unit_lut_src = self.units
+        return self._unit_lut
+
     @classmethod
     def bin_spikes(cls, ts, units, max_units_per_channel=13):
         '''
@@ -137,20 +316,14 @@ class BinnedSpikeCountsExtractor(FeatureExtractor):
             the unit index (an index to differentiate the possibly many units on the same electrode). These are 
             the units used in the BMI.
         max_units_per_channel : int, optional, default=13
-            This int is used to map from a (channel, unit) index to a single 'unit_ind' 
-            for faster binning of spike timestamps. Just set to a large number.
+            Unused; kept for compatibility. Units are looked up by (channel, unit) directly.
 
         Returns
         -------
-        np.ndarray of shape (N, 1)
-            Column vector of counts of spike events for each of the N units.
+        np.ndarray of shape (N,)
+            Counts of spike events for each of the N units.
         '''
-        unit_inds = units[:,0]*max_units_per_channel + units[:,1]
-        edges = np.sort(np.hstack([unit_inds - 0.5, unit_inds + 0.5]))
-
-        spiking_unit_inds = ts['chan']*max_units_per_channel + ts['unit']
-        counts, _ = np.histogram(spiking_unit_inds, edges)
-        return counts[::2]
+        return cls.count_spikes(ts, cls.make_unit_lut(units), len(units)).ravel()
 
     def __call__(self, start_time, *args, **kwargs):
         '''
@@ -181,9 +354,10 @@ class BinnedSpikeCountsExtractor(FeatureExtractor):
             # on the millisecond order
             subbin_edges[0] -= 1
             subbin_inds = np.digitize(ts['arrival_ts'], subbin_edges)
-            counts = np.vstack([self.bin_spikes(ts[subbin_inds == k], self.units) for k in range(1, self.n_subbins+1)]).T
+            counts = self.count_spikes(ts, self.get_unit_lut(), len(self.units), 
+                subbin_inds=subbin_inds, n_subbins=self.n_subbins)
         else:
-            counts = self.bin_spikes(ts, self.units).reshape(-1, 1)
+            counts = self.count_spikes(ts, self.get_unit_lut(), len(self.units))
 
         counts = np.array(counts, dtype=np.uint32)
         bin_edges = self.get_bin_edges(ts)
@@ -253,7 +427,7 @@ class BinnedSpikeCountsExtractor(FeatureExtractor):
             return spike_counts, units, extractor_kwargs
 
         elif 'blackrock' in files:
-            nev_fname = [name for name in files['blackrock'] if '.nev' in name][0]  # only one of them
+            nev_fname = [name for name in files['blackrock'] if name[-4:] == '.nev']
             nev_hdf_fname = [name for name in files['blackrock'] if '.nev' in name and name[-4:]=='.hdf']
             nsx_fnames = [name for name in files['blackrock'] if '.ns' in name]            
             # interpolate between the rows to 180 Hz
@@ -267,66 +441,21 @@ class BinnedSpikeCountsExtractor(FeatureExtractor):
                 step = int(binlen/(1./strobe_rate)) # Downsample kinematic data according to decoder bin length (assumes non-overlapping bins)
                 interp_rows = neurows[::step]
 
-            
-            
+            if len(nev_hdf_fname) == 0 and os.path.isfile(nev_fname[0] + '.hdf'):
+                nev_hdf_fname = [nev_fname[0] + '.hdf']
+
             if len(nev_hdf_fname) == 0:
-                nev_hdf_fname = nev_fname + '.hdf'
-                
-                if not os.path.isfile(nev_hdf_fname):
-                    # convert .nev file to hdf file using Blackrock's n2h5 utility
-                    subprocess.call(['n2h5', nev_fname, nev_hdf_fname])
+                # read the spikes of all the channels directly from the .nev file (only one of them)
+                ts, chan, unit = cls._read_nev_spikes(nev_fname[0])
             else:
-                nev_hdf_fname = nev_hdf_fname[0]
+                # previously converted file, see db.tracker.models.make_hdf_spks
+                ts, chan, unit = cls._read_nev_hdf_spikes(nev_hdf_fname[0], np.unique(units[:,0]))
 
-            try:
-                nev_hdf = h5py.File(nev_hdf_fname, 'r')
-                open_method = 1
-            except:
-                import tables
-                nev_hdf = tables.openFile(nev_hdf_fname)
-                open_method = 2
-                #print 'open method 2'
-
-            n_bins = len(interp_rows)
-            n_units = units.shape[0]
-            spike_counts = np.zeros((n_bins, n_units))
-
-            for i in range(n_units):
-                chan = units[i, 0]
-
-                # 1-based numbering (comes from web interface)
-                unit = units[i, 1]  
-
-                chan_str = str(chan).zfill(5)
-                path = 'channel/channel%s/spike_set' % chan_str
-
-                if open_method == 1:    
-                    ts = nev_hdf.get(path).value['TimeStamp']
-                    # the units corresponding to each timestamp in ts
-                    # 0-based numbering (comes from .nev file), so add 1
-                    units_ts = nev_hdf.get(path).value['Unit']
-                
-                elif open_method == 2:
-                    try:
-                        grp = nev_hdf.getNode('/'+path)
-                        ts = grp[:]['TimeStamp']
-                        units_ts = grp[:]['Unit']
-                    except:
-                        print(('no spikes recorded on channel: ', chan_str, ': adding zeros'))
-                        ts = []
-                        units_ts = []
-
-
-                # get the ts for this unit, in units of secs
-                fs = 30000.
-                ts = [t/fs for idx, (t, u_t) in enumerate(zip(ts, units_ts)) if u_t == unit]
-
-                # insert value interp_rows[0]-step to beginning of interp_rows array
-                interp_rows_ = np.insert(interp_rows, 0, interp_rows[0]-step)
-
-                # use ts to fill in the spike_counts that corresponds to unit i
-                spike_counts[:, i] = np.histogram(ts, interp_rows_)[0]
+            # insert value interp_rows[0]-step to beginning of interp_rows array
+            interp_rows_ = np.insert(interp_rows, 0, interp_rows[0]-step)
 
+            # bin the spikes of every unit at once
+            spike_counts = cls.bin_spike_times(ts, chan, unit, units, interp_rows_).astype(np.float64)
 
             # discard units that never fired at all
             if 'keep_zero_units' in extractor_kwargs:
@@ -403,7 +532,7 @@ class LFPMTMPowerExtractor(object):
 
         self.n_pts = int(self.win_len * self.fs)
         self.nfft = 2**int(np.ceil(np.log2(self.n_pts)))  # nextpow2(self.n_pts)
-        fft_freqs = np.arange(0., fs, float(fs)/self.nfft)[:self.nfft/2 + 1]
+        fft_freqs = np.arange(0., fs, float(fs)/self.nfft)[:self.nfft//2 + 1]
         self.fft_inds = dict()
         for band_idx, band in enumerate(bands):
             self.fft_inds[band_idx] = [freq_idx for freq_idx, freq in enumerate(fft_freqs) if band[0] <= freq < band[1]]
@@ -485,7 +614,7 @@ class LFPMTMPowerExtractor(object):
         return dict(lfp_power=lfp_power)
 
     @classmethod
-    def extract_from_file(cls, files, neurows, binlen, units, extractor_kwargs, strobe_rate=60.0):
+    def extract_from_file(cls, files, neurows, binlen, units, extractor_kwargs, strobe_rate=60.0, chunk_size=100, n_workers=1):
         '''
         Compute binned spike count features
 
@@ -503,6 +632,10 @@ class LFPMTMPowerExtractor(object):
             Any additional parameters to be passed to the feature extractor. This function is agnostic to the actual extractor utilized
         strobe_rate: 60.0
             The rate at which the task sends the sync pulse to the plx file
+        chunk_size: int, optional, default=100
+            Number of bins for which features are computed at once, see extract_windowed_features
+        n_workers: int, optional, default=1
+            Number of processes over which to distribute the chunks of bins
 
         Returns
         -------
@@ -531,7 +664,7 @@ class LFPMTMPowerExtractor(object):
 
 
             # create extractor object
-            f_extractor = LFPMTMPowerExtractor(None, **extractor_kwargs)
+            f_extractor = FastLFPMTMPowerExtractor(None, **extractor_kwargs)
             extractor_kwargs = f_extractor.extractor_kwargs
 
             win_len  = f_extractor.win_len
@@ -549,7 +682,12 @@ class LFPMTMPowerExtractor(object):
             #     lfp_power[i, :] = f_extractor.extract_features(cont_samples.T).T
             lfp = plx.lfp[:].data[:, channels-1]
             n_pts = int(win_len * fs)
-            for i, t in enumerate(interp_rows):
+            sample_nums = (np.asarray(interp_rows) * fs).astype(int)
+            lfp_power, valid = extract_windowed_features(f_extractor, lfp, sample_nums, chunk_size=chunk_size, n_workers=n_workers)
+
+            # windows which extend past the start or end of the recording
+            for i in np.nonzero(~valid)[0]:
+                t = interp_rows[i]
                 try:
                     sample_num = int(t * fs)
                     cont_samples = lfp[sample_num-n_pts:sample_num, :]
@@ -572,6 +710,117 @@ class LFPMTMPowerExtractor(object):
             raise NotImplementedError
 
 
+class FastLFPMTMPowerExtractor(LFPMTMPowerExtractor):
+    '''
+    Same features as LFPMTMPowerExtractor, computed for all channels at once. The 
+    DPSS tapers and the band averaging weights are computed once at construction,
+    rather than by tsa.multi_taper_psd on every call.
+    '''
+    def __init__(self, *args, **kwargs):
+        '''
+        Constructor for FastLFPMTMPowerExtractor. See LFPMTMPowerExtractor.__init__ for docs
+        '''
+        super(FastLFPMTMPowerExtractor, self).__init__(*args, **kwargs)
+
+        # same tapers and weights as tsa.multi_taper_psd(..., jackknife=False, low_bias=True)
+        tapers, eigvals = tsa.dpss_windows(self.n_pts, self.NW, int(2*self.NW))
+        keep = eigvals > 0.9
+        self.tapers = tapers[keep]
+        n_freqs = self.nfft//2 + 1
+
+        # scale of each frequency bin of the one-sided PSD: the weighted average over the 
+        # tapers, doubled for the frequencies between 0 and the Nyquist frequency
+        psd_scale = np.ones(n_freqs) / (np.sum(eigvals[keep]) * self.fs)
+        psd_scale[1:(self.nfft + 1)//2] *= 2
+        self.taper_weights = eigvals[keep].reshape(1, -1)
+        self.psd_scale = psd_scale
+
+        # band power = band_weights * log-PSD of the frequencies in any band
+        self.band_freq_inds = np.unique(np.hstack([self.fft_inds[k] for k in range(len(self.bands))] + [[]])).astype(int)
+        self.band_weights = np.zeros((len(self.bands), len(self.band_freq_inds)))
+        for band_idx in range(len(self.bands)):
+            inds = np.searchsorted(self.band_freq_inds, self.fft_inds[band_idx])
+            # (mean of no frequencies is NaN, as for np.mean)
+            self.band_weights[band_idx, inds] = 1./len(inds) if len(inds) > 0 else np.nan
+
+        n_chan = len(self.channels)
+        self._tapered = np.empty((n_chan, len(self.tapers), self.n_pts))
+        self._power = np.empty((n_chan, len(self.tapers), n_freqs))
+        self._psd = np.empty((n_chan, 1, n_freqs))
+
+    def extract_features(self, cont_samples):
+        '''
+        Extract spectral features from a block of time series samples
+
+        Parameters
+        ----------
+        cont_samples : np.ndarray of shape (n_channels, n_samples)
+            Raw voltage time series (one per channel) from which to extract spectral features 
+
+        Returns
+        -------
+        lfp_power : np.ndarray of shape (n_channels * n_features, 1)
+            Multi-band power estimates for each channel, for each band specified when the feature extractor was instantiated.
+        '''
+        cont_samples = np.asarray(cont_samples, dtype=np.float64)
+        if cont_samples.shape != (self._tapered.shape[0], self.n_pts):
+            # e.g., fewer samples than the window at the start of a file
+            return super(FastLFPMTMPowerExtractor, self).extract_features(cont_samples)
+
+        psd = self._psd_est(cont_samples, tapered=self._tapered, power=self._power, psd=self._psd)
+        return self._psd_features(psd[np.newaxis]).reshape(-1, 1)
+
+    def extract_features_batch(self, windows):
+        '''
+        Extract spectral features from many windows of samples at once, e.g., to compute 
+        training features for a whole recording (see extract_windowed_features)
+
+        Parameters
+        ----------
+        windows : np.ndarray of shape (n_windows, n_channels, n_pts)
+            Raw voltage time series of each channel in each window
+
+        Returns
+        -------
+        lfp_power : np.ndarray of shape (n_windows, n_channels * n_features)
+            Same features as extract_features for each window
+        '''
+        return self._psd_features(self._psd_est(np.asarray(windows, dtype=np.float64)))
+
+    def _psd_est(self, samples, tapered=None, power=None, psd=None):
+        '''
+        Multitaper PSD of windows of samples of shape (..., n_pts), optionally computed
+        in preallocated buffers. Returns an array of shape (..., n_freqs)
+        '''
+        # tapered, de-meaned signals, shape (..., tapers, samples)
+        demeaned = samples - samples.mean(axis=-1, keepdims=True)
+        tapered = np.multiply(demeaned[..., np.newaxis, :], self.tapers, out=tapered)
+        spectra = np.fft.rfft(tapered, n=self.nfft, axis=-1)
+
+        power = np.square(spectra.real, out=power)
+        power += np.square(spectra.imag)
+        psd = np.matmul(self.taper_weights, power, out=psd)[..., 0, :]
+        psd *= self.psd_scale
+        return psd
+
+    def _psd_features(self, psd):
+        '''
+        Features from the PSD of shape (n_windows, n_channels, n_freqs). Returns an array
+        of shape (n_windows, n_channels * n_features)
+        '''
+        n_windows = psd.shape[0]
+        if self.extractor_kwargs['no_mean']:
+            return psd.reshape(n_windows, -1).copy()
+
+        band_psd = psd[..., self.band_freq_inds]
+        if not self.extractor_kwargs['no_log']:
+            band_psd = np.log10(band_psd + self.epsilon)
+
+        # (windows x bands x channels), i.e., all the channels for the first band, then the second band, etc.
+        lfp_power = np.matmul(self.band_weights, band_psd.transpose(0, 2, 1))
+        return lfp_power.reshape(n_windows, -1)
+
+
 #########################################################
 ##### Reconstruction extractors, used in test cases #####
 #########################################################
@@ -806,6 +1055,30 @@ class LFPButterBPFPowerExtractor(object):
 
         return lfp_power
 
+    def extract_features_batch(self, windows):
+        '''
+        Extract band power features from many windows of samples at once, e.g., to compute 
+        training features for a whole recording (see extract_windowed_features)
+
+        Parameters
+        ----------
+        windows : np.ndarray of shape (n_windows, n_channels, n_pts)
+            Raw voltage time series of each channel in each window
+
+        Returns
+        -------
+        lfp_power : np.ndarray of shape (n_windows, n_channels * n_bands)
+            Same features as extract_features for each window
+        '''
+        n_windows, n_chan = windows.shape[:2]
+        lfp_power = np.zeros((n_windows, len(self.bands), n_chan))
+        for i, band in enumerate(self.bands):
+            b, a = self.filt_coeffs[band]
+            y = lfilter(b, a, windows, axis=-1)
+            lfp_power[:, i, :] = np.log((1. / self.n_pts) * np.sum(y**2, axis=-1) + self.epsilon)
+
+        return lfp_power.reshape(n_windows, -1)
+
     def __call__(self, start_time, *args, **kwargs):
         cont_samples = self.get_cont_samples(*args, **kwargs)  # dims of channels x time
         lfp_power = self.extract_features(cont_samples)
@@ -905,6 +1178,187 @@ class LFPButterBPFPowerExtractor(object):
         return lfp_power, units, extractor_kwargs
 
 
+class StreamingLFPButterBPFPowerExtractor(LFPButterBPFPowerExtractor):
+    '''
+    Same features as LFPButterBPFPowerExtractor, computed incrementally. Each call 
+    filters only the samples which arrived since the last call, keeping the state 
+    of the filter for each channel and band between calls, so the cost of each call 
+    scales with the number of new samples rather than the window length and there 
+    are no filter transients at the start of each window. The filters are designed 
+    as second-order sections, which are numerically stable for narrow low-frequency 
+    bands. The power in each band is the mean squared filter output over the last 
+    win_len seconds, kept in a ring buffer.
+
+    Since the features depend on the filter state carried over from all the earlier 
+    samples, training features are computed by running the whole recording through 
+    the same filters (see extract_features_recording) rather than from independent 
+    windows.
+    '''
+    def __init__(self, source, channels=[], bands=default_bands, win_len=0.2, filt_order=5, fs=1000):
+        '''
+        Constructor for StreamingLFPButterBPFPowerExtractor. See LFPButterBPFPowerExtractor for docs
+        '''
+        super(StreamingLFPButterBPFPowerExtractor, self).__init__(source, channels=channels, bands=bands, 
+            win_len=win_len, filt_order=filt_order, fs=fs)
+
+        nyq = 0.5 * self.fs
+        self.filt_sos = [butter(self.filt_order, [band[0] / nyq, band[1] / nyq], btype='band', output='sos') for band in bands]
+
+        n_chan = len(channels)
+        # filter state of each band, shape (n_sections, n_chan, 2)
+        self.filt_state = [np.zeros((sos.shape[0], n_chan, 2)) for sos in self.filt_sos]
+
+        # squared filter output over the last n_pts samples, and its sum over time
+        self.sq_buf = np.zeros((len(bands), n_chan, self.n_pts))
+        self.sq_sum = np.zeros((len(bands), n_chan))
+        self.buf_idx = 0
+
+        # samples of channels which got ahead of the others in get_new
+        self.pending = [np.zeros(0)] * n_chan
+
+    def get_cont_samples(self, *args, **kwargs):
+        '''
+        Retrieve the samples which arrived since the last call for each LFP channel
+
+        Returns
+        -------
+        list of np.ndarray
+            New samples for each channel, see riglib.source.MultiChanDataSource.get_new
+        '''
+        cont_samples = self.source.get_new(self.channels)
+        missing = [chan for chan, samples in zip(self.channels, cont_samples) if samples is None]
+        if len(missing) > 0:
+            raise ValueError("LFP source is not configured to get data on channel(s) %s" % missing)
+        return cont_samples
+
+    def extract_features(self, cont_samples):
+        '''
+        Update the band power estimates with new samples
+
+        Parameters
+        ----------
+        cont_samples : np.ndarray of shape (n_channels, n_new_samples) or list of np.ndarray
+            Raw voltage time series (one per channel) which arrived since the last call. If 
+            a list is given and some channels have more samples than others, the surplus 
+            is held over until the next call, so that the channels stay aligned
+
+        Returns
+        -------
+        lfp_power : np.ndarray of shape (n_channels * n_bands, 1)
+            Log power for each band (all the channels for the first band, then the second band, etc.)
+        '''
+        if isinstance(cont_samples, np.ndarray):
+            new_samples = np.asarray(cont_samples, dtype=np.float64)
+        else:
+            chan_samples = [np.hstack([pending, np.asarray(x, dtype=np.float64)]) 
+                for pending, x in zip(self.pending, cont_samples)]
+            n_new = min(len(x) for x in chan_samples)
+            new_samples = np.vstack([x[:n_new] for x in chan_samples])
+            self.pending = [x[n_new:] for x in chan_samples]
+
+        n_new = new_samples.shape[1]
+        n_pts = self.n_pts
+        if n_new > 0:
+            # keep only the squared outputs for the samples in the window
+            n_keep = min(n_new, n_pts)
+            sq = np.empty((len(self.bands), new_samples.shape[0], n_keep))
+            for i, sos in enumerate(self.filt_sos):
+                y, self.filt_state[i] = sosfilt(sos, new_samples, axis=1, zi=self.filt_state[i])
+                np.square(y[:, n_new-n_keep:], out=sq[i])
+
+            if n_keep == n_pts:
+                self.sq_buf[:] = sq
+                self.buf_idx = 0
+                self.sq_sum = self.sq_buf.sum(axis=2)
+            else:
+                # overwrite the oldest samples, wrapping around the end of the buffer
+                inds = np.arange(self.buf_idx, self.buf_idx + n_keep) % n_pts
+                self.sq_sum += sq.sum(axis=2) - self.sq_buf[:, :, inds].sum(axis=2)
+                self.sq_buf[:, :, inds] = sq
+                self.buf_idx += n_keep
+                if self.buf_idx >= n_pts:
+                    # recompute the sum once per window to discard accumulated roundoff error
+                    self.buf_idx -= n_pts
+                    self.sq_sum = self.sq_buf.sum(axis=2)
+
+        lfp_power = np.log((1. / n_pts) * self.sq_sum + self.epsilon)
+        return lfp_power.reshape(-1, 1)
+
+    def extract_features_batch(self, windows):
+        '''
+        Not supported: the features depend on the filter state carried over from the samples 
+        before each window. Use extract_features_recording instead.
+        '''
+        raise NotImplementedError("Streaming features depend on the preceding samples, use extract_features_recording")
+
+    def extract_features_recording(self, lfp, sample_nums, block_len=65536):
+        '''
+        Compute the features which extract_features would return at each of a sequence of 
+        samples of a recording, if it were given every sample of the recording from the start.
+        The recording is filtered in blocks of samples, carrying the filter state from one
+        block to the next as at run time. The state of the extractor is not modified.
+
+        Parameters
+        ----------
+        lfp : np.ndarray of shape (n_samples, n_channels)
+            Recorded voltages
+        sample_nums : np.ndarray of shape (n_windows,)
+            Index of the sample after the end of each window. Windows which start before 
+            the recording only include the samples in the recording (the ring buffer of 
+            squared filter outputs starts out with zeros), and windows which end after 
+            the recording end at its last sample
+        block_len : int, optional, default=65536
+            Number of samples filtered at once. Bounds the peak memory, 
+            block_len * n_channels * n_bands * 8 bytes
+
+        Returns
+        -------
+        lfp_power : np.ndarray of shape (n_windows, n_channels * n_bands)
+            Log power for each band (all the channels for the first band, then the second band, etc.)
+        '''
+        n_samples, n_chan = lfp.shape
+        n_pts = self.n_pts
+        ends = np.clip(np.asarray(sample_nums, dtype=np.int64), 0, n_samples)
+        sq_sum = np.zeros((len(ends), len(self.bands), n_chan))
+
+        filt_state = [np.zeros((sos.shape[0], n_chan, 2)) for sos in self.filt_sos]
+        # squared filter outputs of the n_pts samples before the current block
+        sq_prev = np.zeros((len(self.bands), n_chan, n_pts))
+        for start in range(0, n_samples, block_len):
+            stop = min(start + block_len, n_samples)
+            block = np.asarray(lfp[start:stop], dtype=np.float64).T
+            sq = np.empty((len(self.bands), n_chan, n_pts + stop - start))
+            sq[:, :, :n_pts] = sq_prev
+            for i, sos in enumerate(self.filt_sos):
+                y, filt_state[i] = sosfilt(sos, block, axis=1, zi=filt_state[i])
+                np.square(y, out=sq[i, :, n_pts:])
+            sq_prev = sq[:, :, -n_pts:]
+
+            # windows ending in this block, as sums over the cumulative sum of the block
+            inds = np.nonzero((ends > start) & (ends <= stop))[0]
+            if len(inds) > 0:
+                csum = np.zeros((len(self.bands), n_chan, sq.shape[2] + 1))
+                np.cumsum(sq, axis=2, out=csum[:, :, 1:])
+                win_ends = ends[inds] - start + n_pts
+                sq_sum[inds] = np.moveaxis(csum[:, :, win_ends] - csum[:, :, win_ends - n_pts], 2, 0)
+
+        lfp_power = np.log((1. / n_pts) * sq_sum + self.epsilon)
+        return lfp_power.reshape(len(ends), -1)
+
+    @classmethod
+    def extract_from_file(cls, files, neurows, binlen, units, extractor_kwargs, strobe_rate=60.0):
+        '''
+        Compute lfp power features from a plexon data file, as they are computed at run time.
+        See get_streaming_butter_bpf_lfp_power for docs
+        '''
+        if 'plexon' in files:
+            from plexon import plexfile
+            plx = plexfile.openFile(str(files['plexon']))
+            return get_streaming_butter_bpf_lfp_power(plx, neurows, binlen, units, extractor_kwargs, strobe_rate=strobe_rate)
+        else:
+            raise NotImplementedError('Not implemented for blackrock/TDT data yet!')
+
+
 class AIMTMPowerExtractor(LFPMTMPowerExtractor):
     ''' Multitaper extractor for Plexon analog input channels'''
 
@@ -937,7 +1391,7 @@ class AIMTMPowerExtractor(LFPMTMPowerExtractor):
 
         self.n_pts = int(self.win_len * self.fs)
         self.nfft = 2**int(np.ceil(np.log2(self.n_pts)))  # nextpow2(self.n_pts)
-        fft_freqs = np.arange(0., fs, float(fs)/self.nfft)[:self.nfft/2 + 1]
+        fft_freqs = np.arange(0., fs, float(fs)/self.nfft)[:self.nfft//2 + 1]
         self.fft_inds = dict()
         for band_idx, band in enumerate(bands):
             self.fft_inds[band_idx] = [freq_idx for freq_idx, freq in enumerate(fft_freqs) if band[0] <= freq < band[1]]
@@ -1216,11 +1670,82 @@ class WaveformClusterCountExtractor(FeatureExtractor):
 
 
 
-def get_butter_bpf_lfp_power(plx, neurows, binlen, units, extractor_kwargs, strobe_rate=60.0):
+def _window_features(f_extractor, lfp, starts):
     '''
-    Compute lfp power features -- corresponds to LFPButterBPFPowerExtractor.
+    Features of the windows of f_extractor.n_pts samples of lfp (n_samples, n_channels)
+    starting at each of the sample indices 'starts'
+    '''
+    lfp = np.asarray(lfp)
+    n_pts = f_extractor.n_pts
+    # read-only (n_windows, n_channels, n_pts) view, as np.lib.stride_tricks.sliding_window_view 
+    # gives in numpy >= 1.20
+    windows = as_strided(lfp, shape=(lfp.shape[0] - n_pts + 1, lfp.shape[1], n_pts), 
+        strides=(lfp.strides[0], lfp.strides[1], lfp.strides[0]), writeable=False)[starts]
+    return f_extractor.extract_features_batch(windows)
+
+def extract_windowed_features(f_extractor, lfp, sample_nums, chunk_size=100, n_workers=1):
+    '''
+    Compute the features of a feature extractor for the window ending at each of a 
+    sequence of samples of a recording, e.g., at each bin of the training data. The 
+    windows are strided views of the recording, and the features are computed for 
+    'chunk_size' windows at a time with the extractor's 'extract_features_batch' method.
+
+    Parameters
+    ----------
+    f_extractor : LFPMTMPowerExtractor or LFPButterBPFPowerExtractor instance
+        Extractor with an 'extract_features_batch' method and window length 'n_pts'
+    lfp : np.ndarray of shape (n_samples, n_channels)
+        Recorded voltages
+    sample_nums : np.ndarray of shape (n_windows,)
+        Index of the sample after the end of each window
+    chunk_size : int, optional, default=100
+        Number of windows for which features are computed at once. Bounds the peak memory,
+        which is dominated by the tapered spectra for multitaper features, 
+        chunk_size * n_channels * n_tapers * nfft * 16 bytes (about 130 MB for 128 channels 
+        and a 200 ms window at 1 kHz)
+    n_workers : int, optional, default=1
+        Number of processes over which to distribute the chunks
+
+    Returns
+    -------
+    features : np.ndarray of shape (n_windows, n_features)
+        Features for each window. Zero for windows which don't lie within the recording
+    valid : np.ndarray of shape (n_windows,)
+        Boolean mask of the windows which lie within the recording
+    '''
+    n_pts = f_extractor.n_pts
+    sample_nums = np.asarray(sample_nums, dtype=np.int64)
+    valid = (sample_nums >= n_pts) & (sample_nums <= len(lfp))
+    features = np.zeros((len(sample_nums), int(np.prod(f_extractor.feature_dtype[2]))))
+
+    # each chunk only needs the segment of the recording spanned by its windows
+    inds = np.nonzero(valid)[0]
+    chunks = []
+    for k in range(0, len(inds), chunk_size):
+        chunk_inds = inds[k:k+chunk_size]
+        seg_start = sample_nums[chunk_inds].min() - n_pts
+        seg_stop = sample_nums[chunk_inds].max()
+        chunks.append((chunk_inds, seg_start, seg_stop))
+
+    if n_workers > 1:
+        from concurrent.futures import ProcessPoolExecutor
+        with ProcessPoolExecutor(max_workers=n_workers) as executor:
+            futures = [executor.submit(_window_features, f_extractor, lfp[seg_start:seg_stop], sample_nums[chunk_inds] - n_pts - seg_start)
+                for chunk_inds, seg_start, seg_stop in chunks]
+            for (chunk_inds, seg_start, seg_stop), future in zip(chunks, futures):
+                features[chunk_inds] = future.result()
+    else:
+        for chunk_inds, seg_start, seg_stop in chunks:
+            features[chunk_inds] = _window_features(f_extractor, lfp[seg_start:seg_stop], sample_nums[chunk_inds] - n_pts - seg_start)
 
+    return features, valid
 
+def get_butter_bpf_lfp_power(plx, neurows, binlen, units, extractor_kwargs, strobe_rate=60.0, chunk_size=100, n_workers=1):
+    '''
+    Compute lfp power features -- corresponds to LFPButterBPFPowerExtractor.
+
+    The features are computed in chunks of windows with extract_windowed_features; 
+    'chunk_size' and 'n_workers' are passed to it.
     '''
     
     # interpolate between the rows to 180 Hz
@@ -1236,7 +1761,7 @@ def get_butter_bpf_lfp_power(plx, neurows, binlen, units, extractor_kwargs, stro
 
 
     # create extractor object
-    f_extractor = extractor.LFPButterBPFPowerExtractor(None, **extractor_kwargs)
+    f_extractor = LFPButterBPFPowerExtractor(None, **extractor_kwargs)
     extractor_kwargs = f_extractor.extractor_kwargs
 
     win_len  = f_extractor.win_len
@@ -1252,9 +1777,12 @@ def get_butter_bpf_lfp_power(plx, neurows, binlen, units, extractor_kwargs, stro
     #     lfp_power[i, :] = f_extractor.extract_features(cont_samples.T).T
     lfp = plx.lfp[:].data[:, channels-1]
     n_pts = int(win_len * fs)
-    for i, t in enumerate(interp_rows):
-        sample_num = int(t * fs)
-        cont_samples = lfp[sample_num-n_pts:sample_num, :]
+    sample_nums = (np.asarray(interp_rows) * fs).astype(int)
+    lfp_power, valid = extract_windowed_features(f_extractor, lfp, sample_nums, chunk_size=chunk_size, n_workers=n_workers)
+
+    # windows which extend past the start or end of the recording
+    for i in np.nonzero(~valid)[0]:
+        cont_samples = lfp[sample_nums[i]-n_pts:sample_nums[i], :]
         lfp_power[i, :] = f_extractor.extract_features(cont_samples.T).T
     
     # TODO -- discard any channel(s) for which the log power in any frequency 
@@ -1266,11 +1794,43 @@ def get_butter_bpf_lfp_power(plx, neurows, binlen, units, extractor_kwargs, stro
     return lfp_power, units, extractor_kwargs
 
 
-def get_mtm_lfp_power(plx, neurows, binlen, units, extractor_kwargs, strobe_rate=60.0):
+def get_streaming_butter_bpf_lfp_power(plx, neurows, binlen, units, extractor_kwargs, strobe_rate=60.0):
     '''
-    Compute lfp power features -- corresponds to LFPMTMPowerExtractor.
+    Compute lfp power features -- corresponds to StreamingLFPButterBPFPowerExtractor.
 
+    The whole recording is run through the extractor's filters, so the features include 
+    the filter state carried over from the preceding samples, as at run time (see 
+    StreamingLFPButterBPFPowerExtractor.extract_features_recording).
+    '''
+    # interpolate between the rows to 180 Hz
+    if binlen < 1./strobe_rate:
+        interp_rows = []
+        neurows = np.hstack([neurows[0] - 1./strobe_rate, neurows])
+        for r1, r2 in zip(neurows[:-1], neurows[1:]):
+            interp_rows += list(np.linspace(r1, r2, 4)[1:])
+        interp_rows = np.array(interp_rows)
+    else:
+        step = int(binlen/(1./strobe_rate)) # Downsample kinematic data according to decoder bin length (assumes non-overlapping bins)
+        interp_rows = neurows[::step]
 
+    # create extractor object
+    f_extractor = StreamingLFPButterBPFPowerExtractor(None, **extractor_kwargs)
+    extractor_kwargs = f_extractor.extractor_kwargs
+
+    channels = np.asarray(f_extractor.channels)
+    lfp = plx.lfp[:].data[:, channels-1]
+    sample_nums = (np.asarray(interp_rows) * f_extractor.fs).astype(int)
+    lfp_power = f_extractor.extract_features_recording(lfp, sample_nums)
+
+    return lfp_power, units, extractor_kwargs
+
+
+def get_mtm_lfp_power(plx, neurows, binlen, units, extractor_kwargs, strobe_rate=60.0, chunk_size=100, n_workers=1):
+    '''
+    Compute lfp power features -- corresponds to LFPMTMPowerExtractor.
+
+    The features are computed in chunks of windows with extract_windowed_features; 
+    'chunk_size' and 'n_workers' are passed to it.
     '''
     
     # interpolate between the rows to 180 Hz
@@ -1286,7 +1846,7 @@ def get_mtm_lfp_power(plx, neurows, binlen, units, extractor_kwargs, strobe_rate
 
 
     # create extractor object
-    f_extractor = extractor.LFPMTMPowerExtractor(None, **extractor_kwargs)
+    f_extractor = FastLFPMTMPowerExtractor(None, **extractor_kwargs)
     extractor_kwargs = f_extractor.extractor_kwargs
 
     win_len  = f_extractor.win_len
@@ -1304,9 +1864,12 @@ def get_mtm_lfp_power(plx, neurows, binlen, units, extractor_kwargs, strobe_rate
     #     lfp_power[i, :] = f_extractor.extract_features(cont_samples.T).T
     lfp = plx.lfp[:].data[:, channels-1]
     n_pts = int(win_len * fs)
-    for i, t in enumerate(interp_rows):
-        sample_num = int(t * fs)
-        cont_samples = lfp[sample_num-n_pts:sample_num, :]
+    sample_nums = (np.asarray(interp_rows) * fs).astype(int)
+    lfp_power, valid = extract_windowed_features(f_extractor, lfp, sample_nums, chunk_size=chunk_size, n_workers=n_workers)
+
+    # windows which extend past the start or end of the recording
+    for i in np.nonzero(~valid)[0]:
+        cont_samples = lfp[sample_nums[i]-n_pts:sample_nums[i], :]
         lfp_power[i, :] = f_extractor.extract_features(cont_samples.T).T
 
 
@@ -6,6 +6,9 @@ applications: (1) assisitve/shared control between neural and pure machine sourc
 functions. 
 '''
 import numpy as np
+import scipy.linalg
+
+from . import riccati
 
 
 class FeedbackController(object):
@@ -171,8 +174,11 @@ class LQRController(LinearFeedbackController):
         K: list or matrix
             Returns a sequence of feedback gains if finite horizon or a single controller if infinite horizon.
 
+        The infinite-horizon gain is found directly from the Riccati equation (see
+        riccati.solve_dare), falling back on iterating the Riccati recursion if that
+        fails, and memoized on (A, B, Q, R).
         '''
-        if Q_f == None: 
+        if Q_f is None: 
             Q_f = Q
 
         if T < np.inf: # Finite horizon
@@ -183,15 +189,38 @@ class LQRController(LinearFeedbackController):
                 P = Q + A.T*P*A -A.T*P*B*K[t]
             return dtype(K)
         else: # Infinite horizon
-            P = Q_f
-            K = np.inf
-            for t in range(max_iter):
-                K_old = K
-                K = (R + B.T*P*B).I * B.T*P*A
-                P = Q + A.T*P*A -A.T*P*B*K 
-                if np.linalg.norm(K - K_old) < eps:
-                    break
-            return dtype(K)
+            key = riccati.array_hash('dlqr', A, B, Q, R, Q_f, max_iter, eps)
+            K = riccati.memoize(key, lambda: LQRController._solve_dlqr(A, B, Q, R, Q_f, max_iter, eps))
+            return dtype(np.array(K))
+
+    @staticmethod
+    def _solve_dlqr(A, B, Q, R, Q_f, max_iter, eps):
+        '''
+        Infinite-horizon LQR gain from the DARE, or from the Riccati recursion if the
+        direct solution fails. See dlqr for docs
+        '''
+        A, B, R = [np.asarray(x, dtype=np.float64) for x in (A, B, R)]
+        def gain(P):
+            B_T_P = np.dot(B.T, P)
+            return scipy.linalg.solve(R + np.dot(B_T_P, B), np.dot(B_T_P, A))
+
+        try:
+            G = np.dot(B, scipy.linalg.solve(R, B.T))
+            P, K = riccati.solve_dare(A, G, Q, gain, tol=eps)
+            return K
+        except np.linalg.LinAlgError:
+            pass
+
+        A, B, Q, R = np.mat(A), np.mat(B), np.mat(Q), np.mat(R)
+        P = np.mat(Q_f)
+        K = np.inf
+        for t in range(max_iter):
+            K_old = K
+            K = (R + B.T*P*B).I * B.T*P*A
+            P = Q + A.T*P*A -A.T*P*B*K 
+            if np.linalg.norm(K - K_old) < eps:
+                break
+        return np.array(K)
 
 
 class MultiModalLFC(LinearFeedbackController):
@@ -4,11 +4,59 @@ Classes for BMI decoding using the Kalman filter.
 
 import numpy as np
 from scipy.io import loadmat
+import scipy.linalg
 
 from . import bmi
+from . import riccati
 import pickle
 import re
 
+
+def linear_recurrence(F, U, x0, max_cond=1e4):
+    '''
+    Evaluate x_t = F*x_{t-1} + u_t for t = 0, ..., T-1
+
+    If F is diagonalizable with a well-conditioned eigenvector matrix, each mode
+    is run through scipy.signal.lfilter as a first-order IIR filter. Otherwise
+    (e.g., a Jordan block from the offset state driving position through velocity)
+    the recurrence is iterated directly.
+
+    Parameters
+    ----------
+    F : np.ndarray of shape (N, N)
+        State transition matrix
+    U : np.ndarray of shape (T, N)
+        Input at each time step, one row per step
+    x0 : np.ndarray of shape (N,)
+        State at t = -1
+    max_cond : float, optional, default=1e4
+        Largest condition number of the eigenvector matrix for which lfilter is used
+
+    Returns
+    -------
+    np.ndarray of shape (T, N)
+    '''
+    from scipy.signal import lfilter
+    T, N = U.shape
+    x0 = np.asarray(x0, dtype=np.float64).ravel()
+
+    evals, V = np.linalg.eig(F)
+    if np.linalg.cond(V) < max_cond:
+        V_inv = np.linalg.inv(V)
+        Z = np.dot(U, V_inv.T)
+        z0 = np.dot(V_inv, x0)
+        for k in range(N):
+            Z[:,k] = lfilter([1.], [1., -evals[k]], Z[:,k], zi=[evals[k]*z0[k]])[0]
+        return np.dot(Z, V.T).real
+
+    X = np.empty((T, N))
+    x = x0
+    for t in range(T):
+        x = np.dot(F, x, out=X[t])
+        x += U[t]
+    return X
+
+
 class KalmanFilter(bmi.GaussianStateHMM):
     """
     Low-level KF, agnostic to application
@@ -20,6 +68,13 @@ class KalmanFilter(bmi.GaussianStateHMM):
     model_attrs = ['A', 'W', 'C', 'Q', 'C_xpose_Q_inv', 'C_xpose_Q_inv_C']
     attrs_to_pickle = ['A', 'W', 'C', 'Q', 'C_xpose_Q_inv', 'C_xpose_Q_inv_C', 'R', 'S', 'T', 'ESS']
 
+    # Use the ndarray implementation of the forward step (see _forward_infer)
+    use_fast_path = True
+
+    # Frobenius-norm tolerance on the change in KC between iterations used to
+    # detect that the Kalman gain has reached steady state
+    ss_tol = 1e-10
+
     def __init__(self, A=None, W=None, C=None, Q=None, is_stochastic=None):
         '''
         Constructor for KalmanFilter    
@@ -125,6 +180,27 @@ class KalmanFilter(bmi.GaussianStateHMM):
         GaussianState
             New state estimate incorporating the most recent observation
 
+        Notes
+        -----
+        Unless 'use_fast_path' is False, the update is computed on plain ndarrays
+        (see _forward_infer_fast). Once the gain stops changing (to within
+        'ss_tol'), the steady-state gains and the covariance at that step are
+        reused for every subsequent step until the model parameters or the state
+        covariance are replaced. The posterior covariance of states which are
+        not observed (e.g., position) can keep growing after the gain has
+        converged; it is held fixed once the steady-state gains are used.
+        '''
+        if not self.use_fast_path:
+            return self._forward_infer_matrix(st, obs_t, Bu=Bu, u=u, x_target=x_target, F=F,
+                obs_is_control_independent=obs_is_control_independent)
+        else:
+            return self._forward_infer_fast(st, obs_t, Bu=Bu, u=u, x_target=x_target, F=F,
+                obs_is_control_independent=obs_is_control_independent)
+
+    def _forward_infer_matrix(self, st, obs_t, Bu=None, u=None, x_target=None, F=None, obs_is_control_independent=True):
+        '''
+        Reference implementation of _forward_infer using np.matrix arithmetic.
+        See _forward_infer for docs
         '''
         using_control_input = (Bu is not None) or (u is not None) or (x_target is not None)
         pred_state = self._ssm_pred(st, target_state=x_target, Bu=Bu, u=u, F=F)
@@ -149,6 +225,127 @@ class KalmanFilter(bmi.GaussianStateHMM):
 
         return post_state
 
+    def _get_fast_path_params(self):
+        '''
+        ndarray views of the model parameters used by _forward_infer_fast, along with
+        preallocated work buffers. The cache is rebuilt (and any steady-state gains
+        discarded) whenever one of the parameter attributes is replaced, e.g., by a
+        CLDA parameter update.
+        '''
+        src = (self.A, self.state_noise.cov, self.C_xpose_Q_inv, self.C_xpose_Q_inv_C)
+        fast = getattr(self, '_fast_params', None)
+        if fast is not None and all(a is b for a, b in zip(fast['src'], src)):
+            return fast
+
+        A, W, L, D = [np.asarray(x, dtype=np.float64) for x in src]
+        nS = A.shape[0]
+        fast = dict(src=src, A=A, W=W, L=L, D=D,
+            AP=np.empty((nS, nS)), P_pred=np.empty((nS, nS)), IPD=np.empty((nS, nS)))
+        self._fast_params = fast
+        self._ss_gains = None
+        self._last_KC = None
+        return fast
+
+    def _forward_infer_fast(self, st, obs_t, Bu=None, u=None, x_target=None, F=None, obs_is_control_independent=True):
+        '''
+        Same update as _forward_infer_matrix, computed on ndarrays. The posterior
+        covariance is calculated as (I + P*D)^{-1} * P with a linear solve rather
+        than an explicit inverse, which also gives KC = P_post*D and K = P_post*L.
+        See _forward_infer for docs
+        '''
+        fast = self._get_fast_path_params()
+        A = fast['A']
+        x = np.asarray(st.mean, dtype=np.float64)
+        y = np.asarray(obs_t, dtype=np.float64).reshape(-1, 1)
+
+        # same precedence of control inputs as _ssm_pred
+        using_control_input = (Bu is not None) or (u is not None) or (x_target is not None)
+        A_pred = A
+        if Bu is not None:
+            c_t = np.asarray(Bu)
+        elif u is not None:
+            c_t = np.asarray(self.B * u)
+        elif x_target is not None:
+            if F is None:
+                F = self.F
+            BF = np.asarray(self.B * F)
+            A_pred = A - BF
+            c_t = np.dot(BF, np.asarray(x_target))
+        else:
+            c_t = None
+
+        x_pred = np.dot(A_pred, x)
+        if c_t is not None:
+            x_pred += c_t
+
+        ss = self._ss_gains
+        if ss is not None and st.cov is ss['cov'] and A_pred is A:
+            K, KC, post_cov = ss['K'], ss['KC'], ss['cov']
+        else:
+            P = np.asarray(st.cov, dtype=np.float64)
+            AP, P_pred, IPD = fast['AP'], fast['P_pred'], fast['IPD']
+            np.dot(A_pred, P, out=AP)
+            np.dot(AP, A_pred.T, out=P_pred)
+            P_pred += fast['W']
+
+            np.dot(P_pred, fast['D'], out=IPD)
+            IPD.flat[::IPD.shape[0]+1] += 1
+            P_post = np.linalg.solve(IPD, P_pred)
+
+            KC = np.dot(P_post, fast['D'])
+            K = np.dot(P_post, fast['L'])
+            post_cov = np.mat(P_post)
+
+            # switch to the steady-state gains once the gain has converged
+            last_KC = self._last_KC
+            if A_pred is A and last_KC is not None and np.linalg.norm(KC - last_KC) < self.ss_tol:
+                self._ss_gains = dict(K=K, KC=KC, cov=post_cov)
+            else:
+                self._ss_gains = None
+            self._last_KC = KC if A_pred is A else None
+
+        if obs_is_control_independent and using_control_input:
+            post_mean = x_pred - np.dot(KC, np.dot(A, x)) + np.dot(K, y)
+        else:
+            post_mean = x_pred - np.dot(KC, x_pred) + np.dot(K, y)
+
+        return bmi.GaussianState(np.mat(post_mean), post_cov)
+
+    def forward_infer_batch(self, observations):
+        '''
+        See bmi.GaussianStateHMM.forward_infer_batch for docs. The time-varying
+        gains are iterated until the posterior covariance converges; the remaining
+        observations are decoded in one pass as the linear system
+            x_t = (I - KC)*A*x_{t-1} + K*y_t
+        using the steady-state gains.
+        '''
+        # subclasses which modify the forward step use the generic loop
+        if not self.use_fast_path or type(self)._forward_infer is not KalmanFilter._forward_infer:
+            return super(KalmanFilter, self).forward_infer_batch(observations)
+
+        obs = np.asarray(observations, dtype=np.float64)
+        T = obs.shape[0]
+        means = np.empty((T, self.n_states()))
+
+        k = 0
+        while k < T:
+            self._get_fast_path_params()
+            if self._ss_gains is not None and self.state.cov is self._ss_gains['cov']:
+                break
+            self.state = self._forward_infer_fast(self.state, obs[k])
+            means[k] = np.asarray(self.state.mean).ravel()
+            k += 1
+
+        if k < T:
+            ss = self._ss_gains
+            A = self._fast_params['A']
+            F = A - np.dot(ss['KC'], A)
+            U = np.dot(obs[k:], ss['K'].T)
+            means[k:] = linear_recurrence(F, U, np.asarray(self.state.mean).ravel())
+            self.state = bmi.GaussianState(np.mat(means[-1]).reshape(-1,1), ss['cov'])
+
+        return means
+
     def set_state_cov(self, n_steps):
         C, Q = self.C, self.Q
         A, W = self.A, self.W
@@ -194,10 +391,79 @@ class KalmanFilter(bmi.GaussianStateHMM):
 
         Parameters
         ----------
+        tol : float, optional, default=1e-15
+            Tolerance on the change in the Kalman gain used to detect convergence
+        return_P : bool, optional, default=False
+            If true, also return the steady-state posterior covariance
+        dtype : callable, optional, default=np.array
+            Callable function to reformat the returned matrices
+        max_iter : int, optional, default=4000
+            Maximum number of steps of the Riccati recursion, if it is iterated
+        verbose : bool, optional, default=False
+            Print the number of iterations of the Riccati recursion
+        return_Khist : bool, optional, default=False
+            If true, iterate the Riccati recursion and also return the Kalman gain at each step
 
         Returns
-        -------        
+        -------
+        F : np.array
+            Steady-state state transition matrix of the filter, (I - KC)*A
+        K : np.array
+            Steady-state Kalman gain
+        P : np.array, returned if return_P is True
+        K_hist : list, returned if return_Khist is True
+
+        The steady-state solution is found directly from the Riccati equation (see
+        riccati.solve_dare), falling back on iterating the Riccati recursion if that
+        fails. The results are memoized on the model parameters, so rebuilding a filter
+        with the same parameters does not repeat the calculation.
         """ 
+        if return_Khist:
+            F, K, P, K_hist = self._iterate_sskf(tol=tol, max_iter=max_iter, verbose=verbose)
+        else:
+            key = riccati.array_hash('sskf', self.A, self.W, self.C_xpose_Q_inv_C, self.C_xpose_Q_inv, tol, max_iter)
+            F, K, P = riccati.memoize(key, lambda: self._solve_sskf(tol=tol, max_iter=max_iter, verbose=verbose))
+        F, K, P = np.array(F), np.array(K), np.array(P)
+
+        if return_P and return_Khist:
+            return dtype(F), dtype(K), dtype(P), K_hist
+        elif return_P:
+            return dtype(F), dtype(K), dtype(P)
+        elif return_Khist:
+            return dtype(F), dtype(K), K_hist
+        else:
+            return dtype(F), dtype(K)
+
+    def _solve_sskf(self, tol=1e-15, max_iter=4000, verbose=False):
+        '''
+        Steady-state F, K and posterior covariance from the DARE for the prediction
+        covariance, or from the Riccati recursion if the direct solution fails.
+        See get_sskf for docs
+        '''
+        A = np.asarray(self.A, dtype=np.float64)
+        D = np.asarray(self.C_xpose_Q_inv_C, dtype=np.float64)
+        L = np.asarray(self.C_xpose_Q_inv, dtype=np.float64)
+        I = np.eye(A.shape[0])
+
+        def post_cov(P):
+            # P*(I + D*P)^{-1}, i.e., (P^{-1} + D)^{-1}
+            return scipy.linalg.solve((I + np.dot(D, P)).T, P.T).T
+
+        try:
+            P, K = riccati.solve_dare(A.T, D, self.W, lambda P: np.dot(post_cov(P), L), tol=tol)
+        except np.linalg.LinAlgError:
+            F, K, P, K_hist = self._iterate_sskf(tol=tol, max_iter=max_iter, verbose=verbose)
+            return F, K, P
+
+        P_post = post_cov(P)
+        F = np.dot(I - np.dot(P_post, D), A)
+        return F, K, P_post
+
+    def _iterate_sskf(self, tol=1e-15, max_iter=4000, verbose=False):
+        '''
+        Steady-state F, K and posterior covariance by iterating the Riccati recursion, 
+        along with the Kalman gain at each step. See get_sskf for docs
+        '''
         A, W, C, Q = np.mat(self.A), np.mat(self.W), np.mat(self.C), np.mat(self.Q)
 
         nS = A.shape[0]
@@ -227,15 +493,7 @@ class KalmanFilter(bmi.GaussianStateHMM):
     
         n_state_vars, n_state_vars = A.shape
         F = (np.mat(np.eye(n_state_vars, n_state_vars)) - KC) * A
-    
-        if return_P and return_Khist:
-            return dtype(F), dtype(K), dtype(last_P), K_hist
-        elif return_P:
-            return dtype(F), dtype(K), dtype(last_P)
-        elif return_Khist:
-            return dtype(F), dtype(K), K_hist
-        else:
-            return dtype(F), dtype(K)
+        return F, K, last_P, K_hist
 
 
     def get_kalman_gain_seq(self, N=1000, tol=1e-10, verbose=False):
@@ -3,6 +3,7 @@ Classes for BMI decoding using the Point-process filter.
 '''
 
 import numpy as np
+import scipy.linalg
 
 from . import bmi
 from .bmi import GaussianState
@@ -27,6 +28,9 @@ class PointProcessFilter(bmi.GaussianStateHMM):
     """
     model_attrs = ['A', 'W', 'C']
 
+    # Set to False to run the np.matrix reference implementation of _forward_infer
+    use_fast_path = True
+
     def __init__(self, A=None, W=None, C=None, dt=None, is_stochastic=None, B=0, F=0):
         '''
         Constructor for PointProcessFilter
@@ -142,13 +146,34 @@ class PointProcessFilter(bmi.GaussianStateHMM):
 
     def _forward_infer(self, st, obs_t, Bu=None, u=None, x_target=None, F=None, obs_is_control_independent=False, **kwargs):
         '''
-        Docstring    
-        
+        Point-process filter update for one bin of spike observations
+
         Parameters
         ----------
-        
+        st : GaussianState
+            Current estimate of the hidden state
+        obs_t : np.ndarray of shape (n_units, 1)
+            Spike counts (0 or 1) in the current bin
+        Bu, u, x_target, F : optional
+            Control input, see _ssm_pred
+
         Returns
         -------
+        GaussianState
+            Posterior estimate of the hidden state
+
+        Unless 'use_fast_path' is False, the update is computed on plain ndarrays
+        (see _forward_infer_fast).
+        '''
+        if not self.use_fast_path:
+            return self._forward_infer_matrix(st, obs_t, Bu=Bu, u=u, x_target=x_target, F=F)
+        else:
+            return self._forward_infer_fast(st, obs_t, Bu=Bu, u=u, x_target=x_target, F=F)
+
+    def _forward_infer_matrix(self, st, obs_t, Bu=None, u=None, x_target=None, F=None):
+        '''
+        Reference implementation of _forward_infer using np.matrix arithmetic.
+        See _forward_infer for docs
         '''
         if np.any(obs_t > 1): 
             raise Exception
@@ -199,6 +224,73 @@ class PointProcessFilter(bmi.GaussianStateHMM):
         post_state = GaussianState(x_est, P_est)
         return post_state
 
+    def _get_fast_path_params(self):
+        '''
+        ndarray views of the observation model used by _forward_infer_fast. The cache
+        is rebuilt whenever C or is_stochastic is replaced, e.g., by a CLDA parameter update.
+        '''
+        src = (self.C, self.is_stochastic)
+        fast = getattr(self, '_fast_params', None)
+        if fast is not None and all(a is b for a, b in zip(fast['src'], src)):
+            return fast
+
+        C = np.asarray(self.C, dtype=np.float64)
+        inds, = np.nonzero(self.is_stochastic)
+        fast = dict(src=src, C=C, C_T=np.ascontiguousarray(C.T), C_stoch=C[:,inds],
+            mesh=np.ix_(inds, inds))
+        self._fast_params = fast
+        return fast
+
+    def _forward_infer_fast(self, st, obs_t, Bu=None, u=None, x_target=None, F=None):
+        '''
+        Same update as _forward_infer_matrix, computed on ndarrays. The rates are kept
+        as a vector rather than a diagonal matrix, and the posterior covariance of the
+        stochastic states,
+            P_est = (P_pred^{-1} + C' diag(lambda*dt) C)^{-1},
+        is calculated from the Cholesky factor P_pred = L L' as
+            P_est = L (I + L' C' diag(lambda*dt) C L)^{-1} L'
+        with a Cholesky solve instead of two explicit inverses. P_pred is symmetric, so its
+        condition number is taken from its eigenvalues, which is much cheaper than the SVD
+        in np.linalg.cond. If it is too large (or P_pred is not positive definite), the
+        covariance is not updated, as in _forward_infer_matrix. See _forward_infer for docs
+        '''
+        y = np.asarray(obs_t, dtype=np.float64).reshape(-1, 1)
+        if np.any(y > 1):
+            raise Exception
+        if x_target is not None:
+            x_target = np.mat(x_target[:,0].reshape(-1,1))
+
+        fast = self._get_fast_path_params()
+        pred_state = self._ssm_pred(st, target_state=x_target, Bu=Bu, u=u, F=F)
+        x_pred = np.asarray(pred_state.mean, dtype=np.float64)
+        P_pred = np.asarray(pred_state.cov, dtype=np.float64)[fast['mesh']]
+
+        # lambda*dt for each unit
+        rate_dt = np.exp(np.dot(fast['C'], x_pred))
+
+        eigvals = np.abs(np.linalg.eigvalsh(P_pred))
+
+        P_est_stoch = P_pred
+        if eigvals.max() <= 1e5 * eigvals.min():
+            try:
+                L = np.linalg.cholesky(P_pred)
+                CL = np.dot(fast['C_stoch'], L)
+                S = np.dot(CL.T * rate_dt.ravel(), CL)
+                S.flat[::S.shape[0]+1] += 1
+                P_est_stoch = np.dot(L, scipy.linalg.cho_solve(scipy.linalg.cho_factor(S), L.T))
+            except np.linalg.LinAlgError:
+                pass
+
+        n_states = x_pred.shape[0]
+        P_est = np.zeros([n_states, n_states])
+        P_est[fast['mesh']] = P_est_stoch
+
+        P_est_C_T = np.dot(P_est, fast['C_T'])
+        x_est = x_pred + np.dot(P_est_C_T, y - rate_dt)
+        self.neural_push = np.mat(np.dot(P_est_C_T, y))
+        self.P_est = np.mat(P_est)
+        return GaussianState(np.mat(x_est), self.P_est)
+
     def __getstate__(self):
         '''
         Return model parameters to be pickled. Overrides the default __getstate__ so that things like the P matrix aren't pickled.
@@ -434,6 +526,16 @@ class PPFDecoder(bmi.BMI, bmi.Decoder):
         obs_t[obs_t > 1] = 1
         return super(PPFDecoder, self).__call__(obs_t, **kwargs)
 
+    def decode_batch(self, neural_obs):
+        '''
+        see bmi.Decoder.decode_batch for docs. As in '__call__', counts greater than
+        one are squashed to one before decoding, so the result matches calling the
+        decoder on each row of neural_obs rather than calling 'predict' on the raw counts.
+        '''
+        neural_obs = np.array(neural_obs, dtype=np.float64)
+        neural_obs[neural_obs > 1] = 1
+        return super(PPFDecoder, self).decode_batch(neural_obs)
+
     def shuffle(self):
         '''
         Shuffle the neural model
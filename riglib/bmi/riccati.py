@@ -0,0 +1,146 @@
+'''
+Direct solution of the discrete-time algebraic Riccati equations (DAREs) which give
+the steady-state Kalman filter and infinite-horizon LQR gains, with memoization of
+the results so that rebuilding a decoder or controller with the same model is free
+'''
+import hashlib
+from collections import OrderedDict
+import numpy as np
+import scipy.linalg
+
+# Number of solutions kept by 'memoize'
+max_cached_results = 128
+
+# Relative change in the gain between doublings below which the solution is considered
+# converged. The doubling iteration converges quadratically, so the gain is then
+# accurate to within roundoff
+doubling_rtol = 1e-12
+
+_results = OrderedDict()
+
+
+def array_hash(*args):
+    '''
+    Hash of a set of arrays (or matrices) and other parameters, for use as a memoization key
+
+    Parameters
+    ----------
+    *args : np.ndarray, np.matrix, or any object with a stable repr
+
+    Returns
+    -------
+    string
+        Hex digest of the values (and shapes) of all the arguments
+    '''
+    h = hashlib.sha1()
+    for x in args:
+        if isinstance(x, np.ndarray):
+            x = np.ascontiguousarray(x, dtype=np.float64)
+            h.update(repr(x.shape).encode())
+            h.update(x.tobytes())
+        else:
+            h.update(repr(x).encode())
+        h.update(b'|')
+    return h.hexdigest()
+
+
+def memoize(key, fn):
+    '''
+    Return the result of fn() stored under 'key', computing it if it has not been
+    computed before (or has been dropped from the cache). The 'max_cached_results'
+    most recently used results are kept.
+
+    Parameters
+    ----------
+    key : string
+        Key from array_hash of all the inputs of the calculation
+    fn : callable
+        Function (no arguments) which computes the result
+
+    Returns
+    -------
+    object
+        Result of fn(). This object is shared between callers, so it must not be modified.
+    '''
+    if key in _results:
+        _results.move_to_end(key)
+        return _results[key]
+
+    result = fn()
+    _results[key] = result
+    while len(_results) > max_cached_results:
+        _results.popitem(last=False)
+    return result
+
+
+def clear_cache():
+    '''
+    Discard all the memoized results
+    '''
+    _results.clear()
+
+
+def solve_dare(A, G, Q, gain_fn, tol=0, max_doublings=64):
+    '''
+    Solve the DARE
+        X = A'X(I + GX)^{-1}A + Q
+    with the structure-preserving doubling algorithm. After k doublings the iterate
+    equals the result of 2^k steps of the Riccati recursion
+        X_{t+1} = A'X_t(I + GX_t)^{-1}A + Q, X_0 = 0,
+    so the doubling converges to the same gains as the recursion, in a few dozen
+    small linear solves rather than thousands of matrix inversions. Convergence is
+    judged on the gain computed from X rather than on X itself, since the solution
+    can have blocks which never converge (e.g., the covariance of an unobserved
+    position state which integrates a stochastic velocity) even though the gain does.
+
+    For the LQR problem with cost matrices Q and R, G = BR^{-1}B'. For the Kalman
+    filter prediction covariance, A, G and Q are the transposed state transition
+    matrix, C'Q^{-1}C and the process noise covariance W.
+
+    Parameters
+    ----------
+    A : np.ndarray of shape (n_states, n_states)
+    G : np.ndarray of shape (n_states, n_states)
+    Q : np.ndarray of shape (n_states, n_states)
+    gain_fn : callable; call signature: gain_fn(X)
+        Calculates the gain matrix from an iterate of X
+    tol : float, optional, default=0
+        Absolute tolerance on the change in the gain between doublings, in addition
+        to the relative tolerance 'doubling_rtol'
+    max_doublings : int, optional, default=64
+        Maximum number of doubling steps
+
+    Returns
+    -------
+    X : np.ndarray of shape (n_states, n_states)
+        Solution of the DARE
+    gain : np.ndarray
+        gain_fn(X)
+
+    Raises
+    ------
+    np.linalg.LinAlgError
+        If the iteration diverges or does not converge in max_doublings steps. The
+        caller can then fall back on the Riccati recursion.
+    '''
+    A_k = np.array(A, dtype=np.float64)
+    G_k = np.array(G, dtype=np.float64)
+    X = np.array(Q, dtype=np.float64)
+    I = np.eye(A_k.shape[0])
+
+    gain = gain_fn(X)
+    for k in range(max_doublings):
+        W = I + np.dot(G_k, X)
+        W_inv_A = scipy.linalg.solve(W, A_k)
+        W_inv_G = scipy.linalg.solve(W, G_k)
+        X = X + np.dot(A_k.T, np.dot(X, W_inv_A))
+        G_k = G_k + np.dot(A_k, np.dot(W_inv_G, A_k.T))
+        A_k = np.dot(A_k, W_inv_A)
+
+        last_gain, gain = gain, gain_fn(X)
+        if not (np.all(np.isfinite(X)) and np.all(np.isfinite(gain))):
+            break
+        if np.linalg.norm(gain - last_gain) <= max(tol, doubling_rtol*np.linalg.norm(gain)):
+            return X, gain
+
+    raise np.linalg.LinAlgError("Riccati doubling iteration did not converge")
@@ -705,7 +705,10 @@ class PointProcess(object):
 
 class PointProcessEnsemble(object):
     '''
-    Simulate an ensemble of point processes
+    Simulate an ensemble of point processes. Uses the same time-rescaling 
+    algorithm as PointProcess, but the state of all the units is held in arrays 
+    and the integral of each unit's rate is accumulated as a running 
+    (trapezoidal) sum, so each step is O(1) in the time since the last spike.
     '''
     def __init__(self, beta, dt, init_state=None, tau_samples=None, eps=1e-3, 
                  hist_len=0, units=None):
@@ -722,10 +725,11 @@ class PointProcessEnsemble(object):
              Sampling interval to integrate piont process likelihood over
         init_state : np.array, optional, default=[np.zeros(n_covariates-1), 1]
              Initial state of the common stimuli
-        tau_samples : np.iterable, optional, default=None
-             ARG_DESCR
-        eps : DATA_TYPE, optional, default=0.001
-             ARG_DESCR
+        tau_samples : list of lists, optional, default=None
+             Pre-drawn samples of the (negative) exponential RVs used for time rescaling, 
+             one list per unit. Random samples are drawn once a unit's list is exhausted.
+        eps : float, optional, default=0.001
+             Tolerance on the rescaled time for declaring a spike
         hist_len : DATA_TYPE, optional, default=0
              ARG_DESCR
         units : list of tuples, optional, default=None
@@ -737,26 +741,83 @@ class PointProcessEnsemble(object):
         
         '''
         self.n_neurons, n_covariates = beta.shape
-        if init_state == None:
+        if init_state is None:
             init_state = np.hstack([np.zeros(n_covariates - 1), 1])
-        if tau_samples == None:
-            tau_samples = [[]]*self.n_neurons
-        point_process_units = []
+        if tau_samples is None:
+            tau_samples = [[] for k in range(self.n_neurons)]
 
         self.beta = beta
+        self.dt = dt
+        self.eps = eps
+        self.tau_samples = [list(x) for x in tau_samples]
+        self._init_sampling(init_state)
 
-        for k in range(self.n_neurons):
-            point_proc = PointProcess(beta[k,:], dt, tau_samples=tau_samples[k])
-            point_proc._init_sampling(init_state)
-            point_process_units.append(point_proc)
-
-        self.point_process_units = point_process_units
-
-        if units == None:
+        if units is None:
             self.units = np.vstack([(x, 1) for x in range(self.n_neurons)])
         else:
             self.units = units
 
+    def _calc_rate(self, X):
+        '''
+        Firing rate (Hz) of each unit for the covariates X, of shape (n_covariates,) or (T, n_covariates)
+        '''
+        return np.exp(np.dot(X, np.asarray(self.beta).T)) / self.dt
+
+    def _exp_sample(self, inds):
+        '''
+        Draw new samples of tau for the specified units
+        '''
+        tau = np.log(1 - np.random.rand(len(inds)))
+        for k, unit_ind in enumerate(inds):
+            if len(self.tau_samples[unit_ind]) > 0:
+                tau[k] = self.tau_samples[unit_ind].pop(0)
+        self.tau[inds] = tau
+
+    def _init_sampling(self, x_t):
+        '''
+        Reset the state of all the units, with initial covariates x_t
+        '''
+        n = self.n_neurons
+        self.rate = self._calc_rate(np.asarray(x_t, dtype=np.float64).ravel())
+        self.rate_integral = np.zeros(n) # integral of each unit's rate since initialization
+        self.last_spike_integral = np.zeros(n) # value of rate_integral at each unit's last spike
+        self.resold = np.ones(n) * 1000
+        self.tau = np.zeros(n)
+        self._exp_sample(np.arange(n))
+
+    def _step(self, rate):
+        '''
+        Advance all the units by one time step
+
+        Parameters
+        ----------
+        rate : np.ndarray of shape (n_units,)
+            Firing rate of each unit at the new time step
+
+        Returns
+        -------
+        np.ndarray of shape (n_units,)
+            Boolean array, True for each unit which spiked
+        '''
+        prev_integral = self.rate_integral
+        integral = prev_integral + 0.5*(self.rate + rate)*self.dt
+        resnew = self.tau + (integral - self.last_spike_integral)
+
+        resold = self.resold
+        spiking = (np.abs(resold) < self.eps) | ((resold > 0) & (resnew > resold))
+        self.resold = resnew
+
+        if np.any(spiking):
+            # restart the rescaled time from the previous time step
+            inds, = np.nonzero(spiking)
+            self.last_spike_integral[inds] = prev_integral[inds]
+            self._exp_sample(inds)
+            self.resold[inds] = self.tau[inds] + (integral[inds] - prev_integral[inds])
+
+        self.rate_integral = integral
+        self.rate = rate
+        return spiking
+
     def get_units(self):
         '''
         Docstring    
@@ -771,18 +832,41 @@ class PointProcessEnsemble(object):
 
     def __call__(self, x_t):
         '''
-        Docstring    
-        
+        Simulate one time step for all the units in the ensemble
+
         Parameters
         ----------
-        
+        x_t : np.ndarray of size (n_covariates,)
+            Current stimulus
+
         Returns
         -------
+        np.ndarray of shape (n_units,)
+            Spike count (0 or 1) of each unit
         '''
-        
-        # x_t = np.hstack([x_t, 1])
-        x_t = np.array(x_t).ravel()
-        counts = np.array([unit(x_t) for unit in self.point_process_units]).astype(int)
+        x_t = np.array(x_t, dtype=np.float64).ravel()
+        return self._step(self._calc_rate(x_t)).astype(int)
+
+    def sim_batch(self, X):
+        '''
+        Simulate many time steps for all the units in the ensemble. Equivalent to calling 
+        the ensemble on each row of X in order, but the rates are computed for the whole 
+        batch at once.
+
+        Parameters
+        ----------
+        X : np.ndarray of shape (T, n_covariates)
+            Stimulus at each time step
+
+        Returns
+        -------
+        np.ndarray of shape (T, n_units)
+            Spike count (0 or 1) of each unit at each time step
+        '''
+        rates = self._calc_rate(np.asarray(X, dtype=np.float64))
+        counts = np.zeros(rates.shape, dtype=int)
+        for t in range(len(rates)):
+            counts[t] = self._step(rates[t])
         return counts
 
 class CLDASimPointProcessEnsemble(PointProcessEnsemble):
@@ -810,14 +894,17 @@ class CLDASimPointProcessEnsemble(PointProcessEnsemble):
         Returns
         -------
         '''
-        ts_data = []
-        for k in range(3):
-            counts = super(CLDASimPointProcessEnsemble, self).__call__(x_t)
-            nonzero_units, = np.nonzero(counts)
-            fake_time = self.call_count * 1./60 + (k + 0.5)*1./180
-            for unit_ind in nonzero_units:
-                ts = (fake_time, self.units[unit_ind, 0], self.units[unit_ind, 1], fake_time)
-                ts_data.append(ts)
+        x_t = np.array(x_t, dtype=np.float64).ravel()
+        rate = self._calc_rate(x_t)
+        spiking = np.vstack([self._step(rate) for k in range(3)])
+        subbin_inds, unit_inds = np.nonzero(spiking)
+
+        fake_time = self.call_count * 1./60 + (subbin_inds + 0.5)*1./180
+        ts_data = np.empty(len(unit_inds), dtype=ts_dtype_new)
+        ts_data['ts'] = fake_time
+        ts_data['chan'] = self.units[unit_inds, 0]
+        ts_data['unit'] = self.units[unit_inds, 1]
+        ts_data['arrival_ts'] = fake_time
 
         self.call_count += 1
-        return np.array(ts_data, dtype=ts_dtype_new)
\ No newline at end of file
+        return ts_data
\ No newline at end of file
@@ -142,10 +142,7 @@ class Experiment(ThreadedFSM, traits.HasTraits):
         self.dtype = []
 
         self.cycle_count = 0
-        if pygame_avail:
-            self.clock = pygame.time.Clock()
-        else:
-            self.clock = fsm.Clock()
+        self.clock = fsm.Clock()
 
         self.pause = False
 
@@ -143,6 +143,35 @@ class System(object):
         while samp != pylink.SAMPLE_TYPE:
             time.sleep(.001)
             samp = self.tracker.getNextData()
+        return self._get_gaze()
+
+    def get_many(self):
+        '''
+        Retrieve all the gaze samples queued by the EyeLink since the last call, 
+        blocking until at least one sample is available. Used by DataSource in 
+        place of 'get' so that samples are forwarded in blocks.
+
+        Parameters
+        ----------
+        None
+
+        Returns
+        -------
+        np.ndarray of shape (N, 2)
+            Gaze position of the left eye for each queued sample
+        '''
+        samples = []
+        while len(samples) == 0:
+            samp = self.tracker.getNextData()
+            while samp:
+                if samp == pylink.SAMPLE_TYPE:
+                    samples.append(self._get_gaze())
+                samp = self.tracker.getNextData()
+            if len(samples) == 0:
+                time.sleep(.001)
+        return np.array(samples)
+
+    def _get_gaze(self):
         try:
             data = np.array(self.tracker.getFloatData().getLeftEye().getGaze())
             if data.sum() < -1e4:
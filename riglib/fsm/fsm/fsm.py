@@ -64,9 +64,92 @@ class StateTransitions(object):
 
 
 class Clock(object):
+    '''
+    Deadline-based loop clock. Each call to 'tick' sleeps until the next absolute deadline, 
+    with deadlines spaced 1/fps apart, so the time spent doing work in the cycle does not 
+    add to the loop period and the loop rate does not drift.
+    '''
+    def __init__(self, busy_wait=0.):
+        '''
+        Parameters
+        ----------
+        busy_wait : float, optional, default=0
+            Length of time (s) before each deadline to stop sleeping and spin instead, 
+            for sub-ms precision at the cost of CPU time
+
+        Returns
+        -------
+        Clock instance
+        '''
+        self.busy_wait = busy_wait
+        self.reset()
+
+    def reset(self):
+        '''
+        Forget the current deadline and clear the timing statistics
+        '''
+        self.deadline = None
+        self.n_ticks = 0
+        self.n_overruns = 0
+        self.jitter_sum = 0.
+        self.jitter_sq_sum = 0.
+        self.jitter_max = 0.
+
     def tick(self, fps):
-        import time
-        time.sleep(1.0/fps)
+        '''
+        Wait until the end of the current cycle
+
+        Parameters
+        ----------
+        fps : float
+            Loop rate (cycles per second)
+
+        Returns
+        -------
+        None
+        '''
+        period = 1.0/fps
+        now = time.perf_counter()
+        if self.deadline is None:
+            self.deadline = now + period
+        elif now > self.deadline:
+            # the work in this cycle took longer than the time left before the deadline
+            self.n_overruns += 1
+            if now - self.deadline > period:
+                # fell behind by more than a cycle. Skip the missed ticks instead of 
+                # running the next cycles back-to-back to catch up
+                self.deadline = now
+
+        sleep_time = self.deadline - now - self.busy_wait
+        if sleep_time > 0:
+            time.sleep(sleep_time)
+        while time.perf_counter() < self.deadline:
+            pass
+
+        jitter = time.perf_counter() - self.deadline
+        self.n_ticks += 1
+        self.jitter_sum += jitter
+        self.jitter_sq_sum += jitter**2
+        self.jitter_max = max(self.jitter_max, jitter)
+
+        self.deadline += period
+
+    def get_stats(self):
+        '''
+        Timing statistics since the clock was created or last reset
+
+        Returns
+        -------
+        dict
+            n_ticks: number of cycles
+            n_overruns: number of cycles where the work did not finish before the deadline
+            jitter_mean, jitter_std, jitter_max: lateness (s) of the end of each cycle relative to its deadline
+        '''
+        n = max(self.n_ticks, 1)
+        jitter_mean = self.jitter_sum / n
+        jitter_var = max(self.jitter_sq_sum / n - jitter_mean**2, 0.)
+        return dict(n_ticks=self.n_ticks, n_overruns=self.n_overruns, jitter_mean=jitter_mean, 
+            jitter_std=np.sqrt(jitter_var), jitter_max=self.jitter_max)
 
 
 class FSM(object):
@@ -82,6 +165,9 @@ class FSM(object):
 
     log_exclude = set()  # List out state/trigger pairs to exclude from logging
 
+    # Bound '_while_' and '_test_' methods for each state, see compile_dispatch_table
+    dispatch_table = None
+
     def __init__(self, *args, **kwargs):
         self.verbose = kwargs.pop('verbose', False)
 
@@ -135,6 +221,7 @@ class FSM(object):
         '''
 
         ## Initialize the FSM before the loop
+        self.compile_dispatch_table()
         self.set_state(self.state)
         
         while self.state is not None:
@@ -166,22 +253,46 @@ class FSM(object):
     ###########################################################
     ##### Finite state machine (FSM) transition functions #####
     ###########################################################
+    def compile_dispatch_table(self):
+        '''
+        Look up the bound '_while_<state>' and '_test_<event>' methods of every state once, 
+        so that each tick of the event loop does not need to format method names and search 
+        for them through the (possibly deep) inheritance hierarchy of the task. 
+        Must be re-run if 'status' or the state methods are changed after the FSM starts running.
+        '''
+        self.dispatch_table = dict()
+        for state in self.status:
+            while_fn = getattr(self, "_while_%s" % state, None)
+            transition_tests = []
+            for event in self.status[state]:
+                test_fn = getattr(self, "_test_%s" % event, None)
+                if test_fn is not None:
+                    transition_tests.append((event, test_fn))
+            self.dispatch_table[state] = (while_fn, tuple(transition_tests))
+
     def fsm_tick(self):
         '''
         Execute the commands corresponding to a single tick of the event loop
         '''
+        if self.dispatch_table is None:
+            self.compile_dispatch_table()
+
         # Execute commands
-        self.exec_state_specific_actions(self.state)
+        while_fn, _ = self.dispatch_table[self.state]
+        if while_fn is not None:
+            while_fn()
 
         # Execute the commands which must run every loop, independent of the FSM state
         # (e.g., running the BMI decoder)
         self._cycle()
 
         current_state = self.state
+        _, transition_tests = self.dispatch_table[current_state]
+        time_since_state_started = self.get_time() - self.start_time
 
         # iterate over the possible events which could move the task out of the current state
-        for event in self.status[current_state]:
-            if self.test_state_transition_event(event): # if the event has occurred
+        for event, test_fn in transition_tests:
+            if test_fn(time_since_state_started): # if the event has occurred
                 # execute commands to end the current state
                 self.end_state(current_state)
 
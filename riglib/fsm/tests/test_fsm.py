@@ -2,7 +2,7 @@
 import unittest
 import time
 
-from fsm import FSM, ThreadedFSM, FSMTable, StateTransitions
+from fsm import FSM, ThreadedFSM, FSMTable, StateTransitions, Clock
 
 
 event1to2 = [False, True,  False, False, False, False, False, False]
@@ -97,5 +97,36 @@ class ThreadedFSM(unittest.TestCase):
     #     self.assertTrue(exp.cycle_count > exp.fps - margin)
     #     self.assertTrue(exp.cycle_count < exp.fps + margin)        
 
+class TestClock(unittest.TestCase):
+    def test_work_does_not_add_to_period(self):
+        """Loop period should be 1/fps regardless of the work done in each cycle"""
+        clock = Clock()
+        fps = 100
+        n_ticks = 50
+        t_start = time.perf_counter()
+        for k in range(n_ticks):
+            time.sleep(0.005) # work
+            clock.tick(fps)
+        elapsed = time.perf_counter() - t_start
+
+        # the sleeps are real, so allow for the occasional late wakeup on a busy machine: 
+        # the mean period should still be close to 1/fps and only a few cycles should overrun
+        self.assertAlmostEqual(elapsed / n_ticks, 1./fps, delta=0.2/fps)
+        stats = clock.get_stats()
+        self.assertEqual(stats['n_ticks'], n_ticks)
+        self.assertLessEqual(stats['n_overruns'], max(1, n_ticks // 10))
+
+    def test_overrun(self):
+        """Cycles which take longer than 1/fps should be counted and not make up the lost time later"""
+        clock = Clock(busy_wait=0.001)
+        fps = 100
+        clock.tick(fps)
+        time.sleep(0.05)
+        clock.tick(fps)
+        t_start = time.perf_counter()
+        clock.tick(fps)
+        self.assertTrue(time.perf_counter() - t_start > 0.005)
+        self.assertEqual(clock.get_stats()['n_overruns'], 1)
+
 if __name__ == '__main__':
     unittest.main()
\ No newline at end of file
@@ -1,15 +1,199 @@
 import multiprocessing as mp
+from multiprocessing import shared_memory
 import time
+import copy
 
 import numpy as np
 import queue
 
+
+class SharedParams(object):
+    '''
+    Double-buffered set of named arrays in shared memory, used to hand off parameters
+    computed in one process to another without pickling. The writer fills the back
+    buffer and then publishes it by flipping the index of the front buffer; the reader
+    only swaps to the (preallocated) views of the new front buffer.
+
+    The writer waits for the reader to acknowledge the last set of parameters before
+    writing the next one, so the buffer the reader is using is never overwritten.
+
+    Created by the writer and pickled (e.g., through a queue) to attach to it by name
+    from the reading process.
+    '''
+    header_size = 24 # three int64: no. of sets written, index of the front buffer, no. of sets read
+
+    def __init__(self, layout, name=None):
+        '''
+        Parameters
+        ----------
+        layout : list of tuples
+            (key, shape, dtype, kind) for each parameter, where kind is one of
+            'matrix', 'array' or 'scalar'. See SharedParams.get_layout
+        name : string, optional, default=None
+            Name of an existing shared memory block to attach to. If None, a new block is created
+
+        Returns
+        -------
+        SharedParams instance
+        '''
+        self.layout = layout
+        offsets = []
+        buffer_size = 0
+        for key, shape, dtype, kind in layout:
+            offsets.append(buffer_size)
+            nbytes = int(np.prod(shape)) * np.dtype(dtype).itemsize
+            buffer_size += int(np.ceil(nbytes / 8.)) * 8
+        self.buffer_size = buffer_size
+
+        if name is None:
+            size = self.header_size + 2 * max(buffer_size, 8)
+            self.shm = shared_memory.SharedMemory(create=True, size=size)
+        else:
+            self.shm = shared_memory.SharedMemory(name=name)
+
+        self.header = np.ndarray((3,), dtype=np.int64, buffer=self.shm.buf)
+        self.views = []
+        for k in range(2):
+            views = dict()
+            for (key, shape, dtype, kind), offset in zip(layout, offsets):
+                view = np.ndarray(shape, dtype=dtype, buffer=self.shm.buf,
+                    offset=self.header_size + k*self.buffer_size + offset)
+                views[key] = np.asmatrix(view) if kind == 'matrix' else view
+            self.views.append(views)
+        self.kinds = dict((key, kind) for key, shape, dtype, kind in layout)
+
+    def __getstate__(self):
+        return dict(layout=self.layout, name=self.shm.name)
+
+    def __setstate__(self, state):
+        self.__init__(**state)
+
+    @staticmethod
+    def get_layout(params):
+        '''
+        Determine the shared-memory layout for a dictionary of parameters
+
+        Parameters
+        ----------
+        params : dict
+            Values should be numeric arrays or scalars
+
+        Returns
+        -------
+        list or None
+            Layout to pass to the SharedParams constructor, or None if any of
+            the values cannot be stored in shared memory
+        '''
+        if not isinstance(params, dict):
+            return None
+        layout = []
+        for key, val in params.items():
+            if isinstance(val, np.matrix):
+                kind = 'matrix'
+            elif isinstance(val, np.ndarray):
+                kind = 'array'
+            elif isinstance(val, (int, float, np.number)) and not isinstance(val, bool):
+                kind = 'scalar'
+            else:
+                return None
+            arr = np.asarray(val)
+            if arr.dtype.hasobject:
+                return None
+            layout.append((key, arr.shape, arr.dtype.str, kind))
+        return layout
+
+    def wait_for_reader(self, is_open=lambda: True):
+        '''
+        Wait for the reader to acknowledge the last set of parameters written
+
+        Parameters
+        ----------
+        is_open : callable, optional
+            Checked while waiting. If it returns False, stop waiting
+
+        Returns
+        -------
+        bool
+            True if the reader is up to date
+        '''
+        while int(self.header[2]) != int(self.header[0]):
+            if not is_open():
+                return False
+            time.sleep(0.001)
+        return True
+
+    def write(self, params, is_open=lambda: True):
+        '''
+        Copy a set of parameters into the back buffer and publish it. Called by the writer.
+
+        Parameters
+        ----------
+        params : dict
+            Parameters with the same layout as the buffer
+        is_open : callable, optional
+            Checked while waiting for the reader to acknowledge the last set of parameters.
+            If it returns False, the parameters are dropped
+
+        Returns
+        -------
+        bool
+            True if the parameters were published
+        '''
+        if not self.wait_for_reader(is_open):
+            return False
+
+        back = 1 - int(self.header[1])
+        views = self.views[back]
+        for key, val in params.items():
+            views[key][...] = val
+        self.header[1] = back
+        self.header[0] += 1
+        return True
+
+    def read(self, last_seq):
+        '''
+        Get the most recently published set of parameters. Called by the reader.
+
+        Parameters
+        ----------
+        last_seq : int
+            Sequence number returned by the last call to 'read'
+
+        Returns
+        -------
+        params : dict or None
+            Views into shared memory of the new parameters, or None if nothing new 
+            has been published. The arrays remain valid until the next set of 
+            parameters is read.
+        seq : int
+            Sequence number of the parameters returned
+        '''
+        seq = int(self.header[0])
+        if seq == last_seq:
+            return None, last_seq
+
+        params = dict()
+        for key, view in self.views[int(self.header[1])].items():
+            params[key] = view[()] if self.kinds[key] == 'scalar' else view
+        self.header[2] = seq
+        return params, seq
+
+    def close(self, unlink=False):
+        del self.header, self.views
+        self.shm.close()
+        if unlink:
+            self.shm.unlink()
+
+
 class MPCompute(mp.Process):
     """
     Generic class for running computations that occur infrequently
     but take longer than a single BMI loop iteration
     """
-    def __init__(self, work_queue, result_queue, fn):
+    # Maximum time (s) the worker blocks waiting for a job before checking whether it should stop
+    poll_timeout = 0.1
+
+    def __init__(self, work_queue, result_queue, fn, shared_params=False, hist_queue=None):
         '''
         Constructor for MPCompute
 
@@ -19,6 +203,15 @@ class MPCompute(mp.Process):
             Jobs start when an entry is found in work_queue
         result_queue : mp.Queue
             Results of job are placed back onto result_queue
+        fn : callable
+            Function which performs the computation
+        shared_params : bool, optional, default=False
+            If True, results which are dictionaries of arrays are published through a 
+            SharedParams buffer instead of being pickled. The buffer itself is sent through 
+            result_queue when it is created (or re-created because the layout changed).
+        hist_queue : mp.Queue, optional, default=None
+            If specified, a copy of every result is also placed on this queue, for 
+            the parent process to collect once it is no longer time-critical
 
         Returns
         -------
@@ -29,23 +222,51 @@ class MPCompute(mp.Process):
 
         self.work_queue = work_queue
         self.result_queue = result_queue
+        self.hist_queue = hist_queue
+        self.shared_params = shared_params
         self.done = mp.Event()
         self.fn = fn
 
     def _check_for_job(self):
         '''
-        Non-blocking check to see if data is present in the input queue
+        Wait (up to 'poll_timeout' seconds) for data to be present in the input queue
         '''
         try:
-            job = self.work_queue.get_nowait()
-        except:
+            job = self.work_queue.get(timeout=self.poll_timeout)
+        except queue.Empty:
             job = None
         return job
-        
+
+    def _publish(self, result):
+        '''
+        Send a result back to the parent process
+        '''
+        if self.hist_queue is not None:
+            # copy now, since the queue pickles in a background thread
+            self.hist_queue.put(copy.deepcopy(result))
+
+        if self.shared_params:
+            layout = SharedParams.get_layout(result)
+            if layout is not None:
+                param_buffer = self.param_buffer
+                if param_buffer is None or param_buffer.layout != layout:
+                    if param_buffer is not None:
+                        # wait until the parent has read the last parameters from the old buffer
+                        param_buffer.wait_for_reader(is_open=lambda: not self.done.is_set())
+                        param_buffer.close(unlink=True)
+                    param_buffer = self.param_buffer = SharedParams(layout)
+                    param_buffer.write(result)
+                    self.result_queue.put(param_buffer)
+                else:
+                    param_buffer.write(result, is_open=lambda: not self.done.is_set())
+                return
+
+        self.result_queue.put(result)
+
     def run(self):
         '''
         The main loop. Starts automatically when the process is spawned. See mp.Process.run for additional docs.
-        Every 0.5 seconds, check for new computation to carry out
+        Blocks until a new computation is available to carry out
 
         Parameters
         ----------
@@ -55,16 +276,17 @@ class MPCompute(mp.Process):
         -------
         None
         '''
+        self.param_buffer = None
         while not self.done.is_set():
             job = self._check_for_job()
 
             # unpack the data
             if not (job is None):
                 new_params = self.calc(*job[0], **job[1])
-                self.result_queue.put(new_params)
+                self._publish(new_params)
 
-            # Pause to lower the process's effective priority
-            time.sleep(0.5)
+        if self.param_buffer is not None:
+            self.param_buffer.close(unlink=True)
 
     def calc(self, *args, **kwargs):
         '''
@@ -77,6 +299,7 @@ class MPCompute(mp.Process):
         Set the flag to stop the 'while' loop in the 'run' method gracefully
         '''
         self.done.set()
+        self.work_queue.put(None) # wake up the worker if it's waiting for a job
 
 
 class FuncProxy(object):
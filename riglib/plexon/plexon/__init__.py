@@ -50,9 +50,10 @@ class Spikes(DataSourceSystem):
         '''
         self.conn.start_data()
 
-        # self.data is a generator (the result of self.conn.get_data() is a 'yield').
-        # Calling 'self.data.next()' in the 'get' function pulls a new spike timestamp
-        self.data = self.conn.get_data()
+        # self.data is a generator (the result of self.conn.get_data_batches() is a 'yield').
+        # Calling 'next(self.data)' pulls all the spike timestamps in the next packet
+        self.data = self.conn.get_data_batches()
+        self._pending = np.zeros(0, dtype=self.dtype)
 
     def stop(self):
         '''
@@ -61,15 +62,39 @@ class Spikes(DataSourceSystem):
         self.conn.stop_data()
         self.conn.disconnect()
 
+    def get_many(self):
+        '''
+        Return the timestamps of all the spikes in the next data packet received from the 
+        plexon server. Used by riglib.source.DataSource in place of 'get'
+
+        Returns
+        -------
+        np.ndarray of shape (N,) and dtype self.dtype
+            Spikes in the packet, N >= 0
+        '''
+        if len(self._pending) > 0:
+            spikes, self._pending = self._pending, self._pending[:0]
+            return spikes
+
+        events = next(self.data).events
+        events = events[events['type'] == PL_SingleWFType]
+
+        spikes = np.empty(len(events), dtype=self.dtype)
+        spikes['ts'] = events['ts'] / self.update_freq
+        spikes['chan'] = events['chan']
+        spikes['unit'] = events['unit']
+        spikes['arrival_ts'] = events['arrival_ts']
+        return spikes
+
     def get(self):
         '''
-        Return a single spike timestamp/waveform. Must be polled continuously for additional spike data. The polling is automatically taken care of by riglib.source.DataSource
+        Return a single spike timestamp. Must be polled continuously for additional spike data. The polling is automatically taken care of by riglib.source.DataSource
         '''
-        d = next(self.data)
-        while d.type != PL_SingleWFType:
-            d = next(self.data)
+        while len(self._pending) == 0:
+            self._pending = self.get_many()
 
-        return np.array([(d.ts / self.update_freq, d.chan, d.unit, d.arrival_ts)], dtype=self.dtype)
+        spike, self._pending = self._pending[:1], self._pending[1:]
+        return spike
 
 
 class LFP(DataSourceSystem):
@@ -122,7 +147,8 @@ class LFP(DataSourceSystem):
         Connect to the plexon server and start receiving data
         '''
         self.conn.start_data()
-        self.data = self.conn.get_data()
+        self.data = self.conn.get_data_batches()
+        self._pending = []
 
     def stop(self):
         '''
@@ -135,18 +161,20 @@ class LFP(DataSourceSystem):
         '''
         Get a new LFP sample/block of LFP samples from the
         '''
-        d = next(self.data)
-        while d.type != PL_ADDataType:
-            d = next(self.data)
+        # each packet can contain several blocks of continuous data, which are 
+        # returned one at a time
+        while len(self._pending) == 0:
+            self._pending = next(self.data).continuous[::-1]
+        chan, waveform = self._pending.pop()
 
         # values are in currently signed integers in the range [-2048, 2047]
         # first convert to float
-        waveform = np.array(d.waveform, dtype='float')
+        waveform = waveform.astype('float')
 
         # convert to units of mV
         waveform = waveform * 16 * (5000. / 2**15) * (1./self.gain_digiamp) * (1./self.gain_headstage)
 
-        return (d.chan-self.chan_offset, waveform)
+        return (chan-self.chan_offset, waveform)
 
 
 class Aux(DataSourceSystem):
@@ -192,22 +220,23 @@ class Aux(DataSourceSystem):
 
     def start(self):
         self.conn.start_data()
-        self.data = self.conn.get_data()
+        self.data = self.conn.get_data_batches()
+        self._pending = []
 
     def stop(self):
         self.conn.stop_data()
 
     def get(self):
-        d = next(self.data)
-        while d.type != PL_ADDataType:
-            d = next(self.data)
+        while len(self._pending) == 0:
+            self._pending = next(self.data).continuous[::-1]
+        chan, waveform = self._pending.pop()
 
         # values are in currently signed integers in the range [-2048, 2047]
         # first convert to float
-        waveform = np.array(d.waveform, dtype='float')
+        waveform = waveform.astype('float')
 
         # convert to units of mV
         waveform = waveform * 16 * (5000. / 2**15) * (1./self.gain_digiamp) * (1./self.gain_headstage)
 
-        return (d.chan-self.chan_offset, waveform)
+        return (chan-self.chan_offset, waveform)
 
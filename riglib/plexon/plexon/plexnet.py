@@ -16,9 +16,26 @@ import matplotlib.pyplot as plt
 
 PACKETSIZE = 512
 
-
+PL_ADDataType = 5
 
 WaveData = namedtuple("WaveData", ["type", "ts", "chan", "unit", "waveform", "arrival_ts"])
+
+# A decoded data packet. 'events' is a record array (see event_dtype) of all the 
+# non-continuous records (e.g., spikes) and 'continuous' is a list of (chan, waveform)
+# pairs, one per block of continuous data, where waveform is an int16 array
+DataBatch = namedtuple("DataBatch", ["events", "continuous"])
+
+# 16-byte header of each record in a data packet, struct format 'hHI4h'
+header_dtype = np.dtype([('type', '<i2'), ('Uts', '<u2'), ('ts', '<u4'), ('chan', '<i2'), 
+    ('unit', '<i2'), ('nwave', '<i2'), ('nword', '<i2')])
+event_dtype = np.dtype([('type', np.int16), ('ts', np.int64), ('chan', np.int32), ('unit', np.int32), 
+    ('arrival_ts', np.float64)])
+
+# Records are read while more than 16 bytes remain in the packet, so a packet holds at 
+# most N_RECORDS headers, which are at fixed offsets if no record carries waveform data
+N_RECORDS = (PACKETSIZE - 16 - 1) // 16
+_fixed_offsets = 16 + 16*np.arange(N_RECORDS)
+
 chan_names = re.compile(r'^(\w{2,4})(\d{2,3})(\w)?')
 
 class Connection(object):
@@ -52,16 +69,24 @@ class Connection(object):
         self.num_server_dropped = 0
         self.num_mmf_dropped = 0
 
+        # preallocated receive buffer, reused for every packet
+        self._buf = bytearray(PACKETSIZE)
+        self._view = memoryview(self._buf)
+
         self._init = False
     
     def _recv(self):
         '''
-        Receives a single PACKETSIZE chunk from the socket
+        Receives a single PACKETSIZE chunk from the socket into the receive buffer.
+        The buffer is overwritten by the next call, so any data to be kept must be copied.
         '''
-        d = ''
-        while len(d) < PACKETSIZE:
-            d += self.sock.recv(PACKETSIZE - len(d))
-        return d
+        n_recv = 0
+        while n_recv < PACKETSIZE:
+            n = self.sock.recv_into(self._view[n_recv:], PACKETSIZE - n_recv)
+            if n == 0:
+                raise ConnectionError("plexnet server closed the connection")
+            n_recv += n
+        return self._buf
     
     def connect(self, channels, waveforms=False, analog=True):
         '''Establish a connection with the plexnet remote server, then request and set parameters
@@ -263,48 +288,130 @@ class Connection(object):
     def __del__(self):
         self.disconnect()
 
+    @staticmethod
+    def _decode_headers(buf):
+        '''
+        Decode the record headers of a data packet
+
+        Parameters
+        ----------
+        buf : bytearray
+            Data packet of PACKETSIZE bytes, including the 16-byte packet header
+
+        Returns
+        -------
+        headers : np.ndarray of dtype header_dtype
+            Headers of the valid records in the packet
+        wave_offsets : np.ndarray of shape (n_records,)
+            Byte offset of the waveform data of each record in the packet
+        '''
+        # When no record carries waveform data, all the headers are decoded at once
+        headers = np.frombuffer(buf, dtype=header_dtype, count=N_RECORDS, offset=16)
+        if headers['nwave'].max() <= 0:
+            offsets = _fixed_offsets
+        else:
+            # walk the variable-length records to find the header offsets
+            offsets = []
+            offset = 16
+            while PACKETSIZE - offset > 16:
+                rec_type, _, _, _, _, nwave, nword = struct.unpack_from('hHI4h', buf, offset)
+                offsets.append(offset)
+                offset += 16
+                if rec_type not in (0, -1) and nwave > 0:
+                    offset += nwave * nword * 2
+            offsets = np.array(offsets, dtype=np.intp)
+            headers = np.frombuffer(buf, dtype=np.uint8)[offsets[:,None] + np.arange(16)].copy().view(header_dtype).ravel()
+
+        rec_type = headers['type']
+        invalid = (rec_type == 0) | (rec_type == -1)
+        if invalid.any():
+            valid = ~invalid
+            return headers[valid], offsets[valid] + 16
+        else:
+            return headers, offsets + 16
+
+    def get_data_batches(self):
+        '''
+        A generator which yields one DataBatch per data packet received, with the 
+        headers of all the records in the packet decoded at once
+
+        Spike waveforms are not included in the events, see get_data
+        '''
+        assert self._init, "Please initialize the connection first"
+
+        while self.streaming:
+            buf = self._recv()
+
+            arrival_ts = time.time()
+            ibuf = struct.unpack_from('4i', buf)
+            if ibuf[0] == 1:
+                self.num_server_dropped = ibuf[2]
+                self.num_mmf_dropped = ibuf[3]
+                headers, wave_offsets = self._decode_headers(buf)
+
+                cont = headers['type'] == PL_ADDataType
+                if cont.any():
+                    event_headers = headers[~cont]
+                else:
+                    event_headers = headers
+                events = np.empty(len(event_headers), dtype=event_dtype)
+                events['type'] = event_headers['type']
+                events['ts'] = event_headers['Uts'].astype(np.int64) << 32 | event_headers['ts']
+                events['chan'] = event_headers['chan']
+                events['unit'] = event_headers['unit']
+                events['arrival_ts'] = arrival_ts
+
+                # when returning continuous data, plexon reports the channel numbers
+                #   as between 0--799 instead of 1--800 (but it doesn't do this
+                #   when returning spike data!), so we have add 1 to the channel number
+                continuous = []
+                if len(event_headers) < len(headers):
+                    for header, offset in zip(headers[cont].tolist(), wave_offsets[cont].tolist()):
+                        _, _, _, chan, _, nwave, nword = header
+                        # the last waveform may be truncated at the end of the packet
+                        n_samples = min(nwave * nword, (PACKETSIZE - offset) // 2)
+                        waveform = np.frombuffer(buf, dtype='<i2', count=n_samples, offset=offset).copy()
+                        continuous.append((chan + 1, waveform))
+
+                yield DataBatch(events=events, continuous=continuous)
+
     def get_data(self):
         '''
-        A generator which yields packets as they are received
+        A generator which yields records one at a time as they are received
         '''
         
         assert self._init, "Please initialize the connection first"
-        hnames = 'type,Uts,ts,chan,unit,nwave,nword'.split(',')
         invalid = set([0, -1])
+        unpack_header = struct.Struct('hHI4h').unpack_from
         
         while self.streaming:
-            packet = self._recv()
+            buf = self._recv()
             
             arrival_ts = time.time()
-            ibuf = struct.unpack('4i', packet[:16])
+            ibuf = struct.unpack_from('4i', buf)
             if ibuf[0] == 1:
                 self.num_server_dropped = ibuf[2]
                 self.num_mmf_dropped = ibuf[3]
-                packet = packet[16:]
-                
-                while len(packet) > 16:
-                    header = dict(list(zip(hnames, struct.unpack('hHI4h', packet[:16]))))
-                    packet = packet[16:]
+
+                # walk the records by offset instead of slicing off the front of the packet
+                offset = 16
+                while PACKETSIZE - offset > 16:
+                    rec_type, Uts, ts, chan, unit, nwave, nword = unpack_header(buf, offset)
+                    offset += 16
                     
-                    if header['type'] not in invalid:
+                    if rec_type not in invalid:
                         wavedat = None
-                        if header['nwave'] > 0:
-                            l = header['nwave'] * header['nword'] * 2
-                            wavedat = array.array('h', packet[:l])
-                            packet = packet[l:]
-
-                        chan = header['chan']
-                        # when returning continuous data, plexon reports the channel numbers
-                        #   as between 0--799 instead of 1--800 (but it doesn't do this
-                        #   when returning spike data!), so we have add 1 to the channel number
-                        if header['type'] == 5:  # 5 is PL_ADDataType
-                            chan = header['chan'] + 1
-                        
-                        ts = int(header['Uts']) << 32 | int(header['ts'])
-
-                        yield WaveData(type=header['type'], chan=chan,
-                            unit=header['unit'], ts=ts, waveform=wavedat, 
-                            arrival_ts=arrival_ts)
+                        if nwave > 0:
+                            l = nwave * nword * 2
+                            wavedat = array.array('h', buf[offset:offset + l])
+                            offset += l
+
+                        # see get_data_batches for the channel numbering of continuous data
+                        if rec_type == PL_ADDataType:
+                            chan = chan + 1
+
+                        yield WaveData(type=rec_type, chan=chan, unit=unit, ts=Uts << 32 | ts, 
+                            waveform=wavedat, arrival_ts=arrival_ts)
 
 if __name__ == "__main__":
     import csv
@@ -2,25 +2,238 @@
 Generic data sink. Sinks run in separate processes and interact with the main process through code here
 '''
 import os
+import time
 import inspect
 import traceback
 import multiprocessing as mp
+from multiprocessing import shared_memory, resource_tracker
+
+import numpy as np
 
 from .mp_proxy import FuncProxy, RPCProcess
 from . import singleton
 
 
+class ShmQueue(object):
+    '''
+    Single-producer, single-consumer queue of fixed-size records in shared memory. 
+    Records are copied in and out as raw bytes of the registered dtype, so nothing is pickled.
+
+    The queue is created by the process which owns the sink and can be pickled 
+    (e.g., sent through a pipe) to attach to it by name from another process.
+    '''
+    header_size = 24 # three int64 counters: number of records written, read, and dropped
+    max_wait = 0.005 # longest time (in seconds) the producer waits for space before dropping data
+
+    def __init__(self, dtype, queue_len, name=None):
+        '''
+        Parameters
+        ----------
+        dtype : np.dtype
+            Datatype of each record
+        queue_len : int
+            Maximum number of records which can be in the queue at once
+        name : string, optional, default=None
+            Name of an existing shared memory block to attach to. If None, a new block is created
+
+        Returns
+        -------
+        ShmQueue instance
+        '''
+        self.dtype = np.dtype(dtype)
+        self.queue_len = queue_len
+        if name is None:
+            size = self.header_size + queue_len * self.dtype.itemsize
+            self.shm = shared_memory.SharedMemory(create=True, size=size)
+        else:
+            self.shm = shared_memory.SharedMemory(name=name)
+
+        self.counters = np.ndarray((3,), dtype=np.int64, buffer=self.shm.buf)
+        self.records = np.ndarray((queue_len,), dtype=self.dtype, buffer=self.shm.buf, offset=self.header_size)
+
+    @property
+    def n_dropped(self):
+        '''Number of records dropped by the producer because the queue stayed full'''
+        return int(self.counters[2])
+
+    def __getstate__(self):
+        return dict(dtype=self.dtype, queue_len=self.queue_len, name=self.shm.name)
+
+    def __setstate__(self, state):
+        self.__init__(**state)
+
+    def put(self, data, is_open=lambda: True):
+        '''
+        Copy records into the queue. Called by the producer, usually from a real-time loop. 
+        If the queue is full, waits at most 'max_wait' seconds for the consumer to catch up 
+        and then drops the records which do not fit (see n_dropped).
+
+        Parameters
+        ----------
+        data : np.ndarray
+            Single record or array of records, with the dtype of the queue
+        is_open : callable, optional
+            Checked while waiting for space. If it returns False, the data is dropped
+
+        Returns
+        -------
+        bool
+            False if the data does not have the queue's dtype, so it should be sent some other way
+        '''
+        data = np.asarray(data)
+        if data.dtype != self.dtype:
+            return False
+        data = data.reshape(-1)
+
+        deadline = None
+        for k in range(0, len(data), self.queue_len):
+            block = data[k:k + self.queue_len]
+            n_written = int(self.counters[0])
+            while n_written + len(block) - int(self.counters[1]) > self.queue_len:
+                if deadline is None:
+                    deadline = time.perf_counter() + self.max_wait
+                if not is_open() or time.perf_counter() > deadline:
+                    self.counters[2] += len(data) - k
+                    return True
+                time.sleep(0.0005)
+
+            i = n_written % self.queue_len
+            n_end = min(len(block), self.queue_len - i)
+            self.records[i:i + n_end] = block[:n_end]
+            self.records[:len(block) - n_end] = block[n_end:]
+            self.counters[0] = n_written + len(block)
+        return True
+
+    def get(self):
+        '''
+        Copy all the queued records out of the queue. Called by the consumer.
+
+        Returns
+        -------
+        np.ndarray or None
+            Queued records, or None if the queue is empty
+        '''
+        n_written = int(self.counters[0])
+        n_read = int(self.counters[1])
+        if n_written == n_read:
+            return None
+
+        i = n_read % self.queue_len
+        j = n_written % self.queue_len
+        if i < j:
+            data = self.records[i:j].copy()
+        else:
+            data = np.concatenate([self.records[i:], self.records[:j]])
+        self.counters[1] = n_written
+        return data
+
+    def close(self, unlink=False):
+        del self.counters, self.records
+        self.shm.close()
+        if unlink:
+            self.shm.unlink()
+
+
 class DataSink(RPCProcess):
     '''Generic single-channel data sink'''
+    def __init__(self, target_class=object, target_kwargs=dict(), log_filename='', 
+        shm_transport=False, shm_queue_len=2**14):
+        '''
+        Parameters
+        ----------
+        target_class, target_kwargs, log_filename : 
+            See RPCProcess
+        shm_transport : boolean, optional, default=False
+            If True, data from each registered system is sent through its own shared-memory 
+            queue (see ShmQueue) instead of being pickled through a pipe. Data from 
+            unregistered systems, or sent from processes started before the system was 
+            registered, still goes through the pipe. The sink target must accept 
+            blocks of several records per 'send' call.
+        shm_queue_len : int, optional, default=2**14
+            Number of records in each shared-memory queue
+
+        Returns
+        -------
+        DataSink instance
+        '''
+        super().__init__(target_class=target_class, target_kwargs=target_kwargs, log_filename=log_filename)
+        self.shm_transport = shm_transport
+        self.shm_queue_len = shm_queue_len
+        self.queues = dict()
+
+    def start(self):
+        if self.shm_transport:
+            # Start the parent's shared memory tracker before forking, so that the sink process 
+            # shares it and unlinking the queues there also unregisters them in the parent
+            resource_tracker.ensure_running()
+        return super().start()
+
     def loop_task(self):
-        if self.data_pipe.poll(0.001):
+        received = self.flush_queues()
+        if self.data_pipe.poll(0 if received else 0.001):
             system, data = self.data_pipe.recv()
-            self.target.send(system, data)
+            if isinstance(data, ShmQueue):
+                self.queues[system] = data
+            else:
+                self.target.send(system, data)
+
+    def flush_queues(self):
+        '''
+        Forward all the data waiting in the shared-memory queues to the sink target. 
+        Runs in the remote process.
+        '''
+        received = False
+        for system, queue in self.queues.items():
+            data = queue.get()
+            if data is not None:
+                self.target.send(system, data)
+                received = True
+        return received
+
+    def proc_rpc_command(self):
+        # Flush the queued data first, so that, e.g., messages are stored 
+        # after the data which was sent before them
+        self.flush_queues()
+        super().proc_rpc_command()
 
     def target_destr(self, ret_status, msg):
+        self.flush_queues()
         self.target.close()
+        for system, queue in self.queues.items():
+            if queue.n_dropped > 0:
+                print("Dropped %d records from %s because its shared memory queue was full" % (queue.n_dropped, system))
+            queue.close(unlink=True)
         print("ended datasink")
 
+    def register(self, system, dtype, **kwargs):
+        '''
+        Register a source system with the sink target running in the remote process 
+        and, if enabled, create the shared-memory queue for its data
+
+        Parameters
+        ----------
+        system : string
+            Name of system (source)
+        dtype : np.dtype
+            Datatype of the data from the system
+        kwargs : optional kwargs
+            Passed to the 'register' method of the remote sink target
+
+        Returns
+        -------
+        object
+            Output of the 'register' method of the remote sink target
+        '''
+        ret = self.target_proxy.register(system, dtype, **kwargs)
+        if isinstance(ret, Exception) or not self.shm_transport or dtype is None or dtype.itemsize == 0:
+            return ret
+
+        if system not in self.queues or self.queues[system].dtype != dtype:
+            queue = ShmQueue(dtype, self.shm_queue_len)
+            self.queues[system] = queue
+            self.data_proxy.pipe.send((system, queue))
+        return ret
+
     def send(self, system, data):
         '''
         Send data to the sink system running in the remote process
@@ -37,7 +250,9 @@ class DataSink(RPCProcess):
         None
         '''
         if self.status.value > 0:
-            self.data_proxy.pipe.send((system, data))
+            queue = self.queues.get(system, None)
+            if queue is None or not queue.put(data, is_open=self.is_enabled):
+                self.data_proxy.pipe.send((system, data))
 
 
 class SinkManager(singleton.Singleton):
@@ -53,7 +268,7 @@ class SinkManager(singleton.Singleton):
         self.sources = []
         self.registrations = dict()
 
-    def start(self, output, log_filename='', **kwargs):
+    def start(self, output, log_filename='', shm_transport=False, **kwargs):
         '''
         Create a new sink and register with it all the known sources.
 
@@ -61,6 +276,8 @@ class SinkManager(singleton.Singleton):
         ----------
         output : type
             Data sink target class
+        shm_transport : boolean, optional, default=False
+            Send data to the sink through shared memory instead of pipes. See DataSink
         kwargs : optional kwargs
             arguments passed to the data sink target
 
@@ -70,7 +287,8 @@ class SinkManager(singleton.Singleton):
             Newly-created data sink
         '''
         print(("sinkmanager start %s"%output))
-        sink = DataSink(target_class=output, target_kwargs=kwargs, log_filename=log_filename)
+        sink = DataSink(target_class=output, target_kwargs=kwargs, log_filename=log_filename, 
+            shm_transport=shm_transport)
         sink.start()
         self.registrations[sink] = set()
         for source, dtype in self.sources:
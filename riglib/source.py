@@ -27,6 +27,10 @@ class DataSourceSystem(object):
         3) 'start' method--no arguments
         4) 'stop' method--no arguments
         5) 'get' method--should return a single output argument
+    Optionally, the class can define a 'get_many' method which returns a block of 
+    N >= 0 samples (an array of length N with the same dtype). If present, DataSource 
+    uses it instead of 'get', so the ringbuffer and sink IPC costs are paid once per 
+    block instead of once per sample.
     '''
     dtype = np.dtype([])
     update_freq = 1
@@ -50,7 +54,8 @@ class DataSourceSystem(object):
 
 
 class DataSource(RPCProcess):
-    def __init__(self, source, bufferlen=10, name=None, send_data_to_sink_manager=True, source_kwargs=dict(), **kwargs):
+    def __init__(self, source, bufferlen=10, name=None, send_data_to_sink_manager=True, source_kwargs=dict(), 
+        lockfree=False, **kwargs):
         '''
         Parameters
         ----------
@@ -64,6 +69,13 @@ class DataSource(RPCProcess):
             on the name of the source module
         send_data_to_sink_manager: boolean, optional, default=True
             Flag to indicate whether data should be saved to a sink (e.g., HDF file)
+        lockfree: boolean, optional, default=False
+            If True, the ringbuffer is read without taking a lock. The acquisition process 
+            publishes each sample by incrementing the shared sample counter, which readers 
+            use as a generation counter to detect samples overwritten during a read. 
+            'get' then returns read-only views into shared memory (or a single copy when the 
+            requested data wraps around the end of the ringbuffer), which stay valid until 
+            the writer laps them, i.e., for ~'bufferlen' seconds.
         kwargs: optional keyword arguments
             Passed to the source during object construction if any are specified
 
@@ -85,7 +97,15 @@ class DataSource(RPCProcess):
         
         self.lock = mp.Lock()
         self.idx = shm.RawValue('l', 0)
-        self.data = shm.RawArray('c', self.max_len * self.slice_size)
+        self.claim_idx = shm.RawValue('l', 0)
+        self.batched = hasattr(self.source, 'get_many')
+
+        # In lock-free mode, one extra slot is allocated so that a full-length read
+        # never overlaps the slot currently being written by the acquisition process
+        self.lockfree = lockfree
+        self.ring_len = self.max_len + 1 if lockfree else self.max_len
+        self.data = shm.RawArray('c', self.ring_len * self.slice_size)
+        self.ring = np.frombuffer(self.data, dtype=self.source.dtype)
         # self.pipe, self._pipe = mp.Pipe()
         # self.cmd_event = mp.Event()
         self.status = mp.Value('b', 1)
@@ -124,17 +144,40 @@ class DataSource(RPCProcess):
                 self.stream.clear()
                 self.streaming = not self.streaming
                 if self.streaming:
-                    self.idx.value = 0
+                    # the sample counter doubles as the generation counter for 
+                    # lock-free reads, so it must keep increasing monotonically
+                    if not self.lockfree:
+                        self.idx.value = 0
+                        self.claim_idx.value = 0
                     self.target.start()
                 else:
                     self.target.stop()
 
             if self.streaming:
-                data = self.target.get()
+                if self.batched:
+                    data = self.target.get_many()
+                    if data is None or len(data) == 0:
+                        return
+                else:
+                    data = self.target.get()
                 if self.send_data_to_sink_manager:
                     sink_manager = sink.SinkManager.get_instance()
                     sink_manager.send(self.name, data)
-                if data is not None:
+                if data is not None and self.lockfree:
+                    try:
+                        self.write_ring(data)
+                    except Exception as e:
+                        print("source.DataSource.run, exception saving data to ring buffer")
+                        print(e)
+                elif data is not None and self.batched:
+                    try:
+                        self.lock.acquire()
+                        self.write_ring(data)
+                        self.lock.release()
+                    except Exception as e:
+                        print("source.DataSource.run, exception saving data to ring buffer")
+                        print(e)
+                elif data is not None:
                     try:
                         self.lock.acquire()
                         i = self.idx.value % self.max_len
@@ -147,6 +190,84 @@ class DataSource(RPCProcess):
             else:
                 time.sleep(.001)        
 
+    def write_ring(self, data):
+        '''
+        Write one sample or a block of samples into the ringbuffer with (at most) two 
+        slice assignments. Runs in the remote process.
+
+        The slots about to be overwritten are first claimed by advancing 'claim_idx', then 
+        the samples are copied through the structured view of the shared memory, and only 
+        then is the sample counter incremented, so lock-free readers never see a partially 
+        written sample as available and can detect samples overwritten during a read.
+
+        Parameters
+        ----------
+        data : np.ndarray
+            Single sample or array of samples, with dtype compatible with the DataSourceSystem
+
+        Returns
+        -------
+        None
+        '''
+        data = np.reshape(data, (-1,) + self.ring.shape[1:])
+        n_samples = len(data)
+        if n_samples > self.max_len:
+            # only the most recent samples fit in the ringbuffer
+            data = data[-self.max_len:]
+
+        k = self.idx.value
+        self.claim_idx.value = k + n_samples
+        i = (k + n_samples - len(data)) % self.ring_len
+        n_end = min(len(data), self.ring_len - i)
+        self.ring[i:i + n_end] = data[:n_end]
+        self.ring[:len(data) - n_end] = data[n_end:]
+        self.idx.value = k + n_samples
+
+    def read_ring(self, all=False):
+        '''
+        Lock-free read of the unread samples (or all the buffered samples) in the ringbuffer.
+
+        The shared sample counters act as generation counters: the sample with absolute 
+        index k lives in slot (k % ring_len) and is only overwritten once the writer claims 
+        sample k + ring_len. If the writer claimed that far while the data was being read, 
+        the read is retried.
+
+        Parameters
+        ----------
+        all : boolean, optional, default=False
+            If true, returns all the data currently available (copied, since the oldest 
+            samples are about to be overwritten)
+
+        Returns
+        -------
+        np.ndarray
+            Read-only view into the ringbuffer or a contiguous copy if the data wraps
+        '''
+        while True:
+            idx = self.idx.value
+            if all:
+                n_samples = min(idx, self.max_len)
+            else:
+                n_samples = max(min(idx - self.last_idx, self.max_len), 0)
+
+            start_idx = idx - n_samples
+            i = start_idx % self.ring_len
+            if i + n_samples <= self.ring_len:
+                data = self.ring[i:i + n_samples]
+                if all:
+                    data = data.copy()
+            else:
+                data = np.concatenate([self.ring[i:], self.ring[:idx % self.ring_len]])
+
+            if self.claim_idx.value - start_idx <= self.max_len:
+                break
+
+        if not data.flags.owndata:
+            data = data.view()
+            data.flags.writeable = False
+        self.last_idx = idx
+        return data
+
     def target_destr(self, ret_status, msg):
         # stop the system once self.status.value has been set to a negative number
         self.target.stop()
@@ -170,6 +291,12 @@ class DataSource(RPCProcess):
         '''
         if self.status.value <= 0:
             raise Exception('\n\nError starting datasource: %s\n\n' % self.name)
+
+        if self.lockfree:
+            data = self.read_ring(all=all)
+            if self.filter is not None:
+                return self.filter(data, **kwargs)
+            return data
             
         self.lock.acquire()
         i = (self.idx.value % self.max_len) * self.slice_size
@@ -181,7 +308,7 @@ class DataSource(RPCProcess):
         else:
             mlen = min((self.idx.value - self.last_idx), self.max_len)
             last = ((self.idx.value - mlen) % self.max_len) * self.slice_size
-            if last > i:
+            if last > i or (mlen == self.max_len and mlen > 0):
                 data = self.data[last:] + self.data[:i]
             else:
                 data = self.data[last:i]
@@ -258,7 +385,9 @@ class MultiChanDataSource(mp.Process):
         dtype = self.source.dtype  # e.g., np.dtype('float') for LFP
         self.slice_size = dtype.itemsize
         self.idxs = shm.RawArray('l', self.n_chan)
-        self.last_read_idxs = np.zeros(self.n_chan)
+        self.idxs_view = np.frombuffer(self.idxs, dtype=np.dtype('l'))
+        self.last_read_idxs = np.zeros(self.n_chan, dtype=int)
+        self.rows_cache = dict()
         rawarray = shm.RawArray('c', self.n_chan * self.max_len * self.slice_size)
 
 
@@ -284,10 +413,57 @@ class MultiChanDataSource(mp.Process):
             self.send_to_sinks_dtype = np.dtype([('chan'+str(chan), dtype) for chan in kwargs['channels']])
             self.next_send_idx = mp.Value('l', 0)
             self.wrap_flags = shm.RawArray('b', self.n_chan)  # zeros/Falses by default
+            self.wrap_flags_view = np.frombuffer(self.wrap_flags, dtype=np.dtype('b'))
             self.supp_hdf_file = kwargs['supp_file']
 
 
 
+    def get_rows(self, channels):
+        '''
+        Look up the ringbuffer rows of the specified channels. The lookup is cached 
+        per channel list, since the same channels are typically read on every call.
+
+        Parameters
+        ----------
+        channels : iterable
+            Channels to look up
+
+        Returns
+        -------
+        np.ndarray of shape (n_chan,)
+            Ringbuffer row of each channel, or -1 for channels the source was not configured for
+        '''
+        key = tuple(channels)
+        try:
+            return self.rows_cache[key]
+        except KeyError:
+            pass
+
+        rows = np.array([self.chan_to_row.get(chan, -1) for chan in key], dtype=int)
+        for chan in np.array(key, dtype=object)[rows < 0]:
+            print(('data source was not configured to get data on channel', chan))
+        self.rows_cache[key] = rows
+        return rows
+
+    def to_sink_records(self, cols):
+        '''
+        Convert columns of the ringbuffer into records with the dtype registered with the sinks. 
+        The fields of 'send_to_sinks_dtype' are laid out back-to-back, so a contiguous 
+        (n_samples, n_chan) block can be reinterpreted in place, without per-sample tuples.
+
+        Parameters
+        ----------
+        cols : np.ndarray
+            Indices of the ringbuffer columns to convert
+
+        Returns
+        -------
+        np.ndarray of shape (n_samples,)
+            Record array with dtype self.send_to_sinks_dtype
+        '''
+        block = np.ascontiguousarray(self.data[:, cols].T)
+        return block.view(self.send_to_sinks_dtype).reshape(-1)
+
     def register_supp_hdf(self):
         try:
             from ismore.brainamp import brainamp_hdf_writer
@@ -423,21 +599,22 @@ class MultiChanDataSource(mp.Process):
 
                         # check if there is at least one column of data that
                         # has not yet been sent to the sink manager
-                        if all(self.next_send_idx.value < idx + int(flag)*self.max_len for (idx, flag) in zip(self.idxs, self.wrap_flags)):
+                        idxs = self.idxs_view
+                        wrapped = self.wrap_flags_view.astype(bool)
+                        if np.all(self.next_send_idx.value < idxs + wrapped*self.max_len):
                             start_idx = self.next_send_idx.value
-                            if not all(self.wrap_flags):
+                            if not np.all(wrapped):
 
                                 # look at minimum value of self.idxs only 
                                 # among channels which have not wrapped, 
                                 # in order to determine end_idx
-                                end_idx = np.min([idx for (idx, flag) in zip(self.idxs, self.wrap_flags) if not flag])
-                                idxs_to_send = list(range(start_idx, end_idx))
+                                end_idx = np.min(idxs[~wrapped])
+                                idxs_to_send = np.arange(start_idx, end_idx)
                             else:
-                                min_idx = np.min(self.idxs[:])
-                                idxs_to_send = list(range(start_idx, self.max_len)) + list(range(0, min_idx))
+                                min_idx = np.min(idxs)
+                                idxs_to_send = np.r_[start_idx:self.max_len, 0:min_idx]
                                 
-                                for row in range(self.n_chan):
-                                    self.wrap_flags[row] = False
+                                self.wrap_flags_view[:] = False
 
                             # Old way to send data to the sink manager, one column at a time
                             # for idx in idxs_to_send:
@@ -452,7 +629,7 @@ class MultiChanDataSource(mp.Process):
                             #self.sinks.send(self.name, data)
 
                             #Newest way to send data to the supp hdf file, all columns at a time (1/21/2016)
-                            data = np.array(list(map(tuple, self.data[:, idxs_to_send].T)), dtype = self.send_to_sinks_dtype)
+                            data = self.to_sink_records(idxs_to_send)
                             self.supp_hdf.add_data(data)
 
 
@@ -490,30 +667,30 @@ class MultiChanDataSource(mp.Process):
         if self.status.value <= 0:
             raise Exception('\n\nError starting datasource: %s\n\n' % self.name)
 
-        self.lock.acquire()   
-   
         # these channels must be a subset of the channels passed into __init__
-        n_chan = len(channels)
-        data = np.zeros((n_chan, n_pts), dtype=self.source.dtype)
+        rows = self.get_rows(channels)
+        valid = rows >= 0
 
         if n_pts > self.max_len:
             n_pts = self.max_len
-        # print "channels", channels[-1]
-        for chan_num, chan in enumerate(channels):
-            try:
-                row = self.chan_to_row[chan]
-            except KeyError:
-                print(('data source was not configured to get data on channel', chan))
-            else:  # executed if try clause does not raise a KeyError
-                idx = self.idxs[row]
-                if idx >= n_pts:  # no wrap-around required
-                    data[chan_num, :] = self.data[row, idx-n_pts:idx]
-                else:
-                    data[chan_num, :n_pts-idx] = self.data[row, -(n_pts-idx):]
-                    data[chan_num, n_pts-idx:] = self.data[row, :idx]
-                self.last_read_idxs[row] = idx
-        #print (data['data'])
-        #self.fo2.write(str(data[0,0]['data']) + ' ' + str(len(data[0,:]['data'])) + ' ' + str(time.time()) + ' \n')
+        data = np.zeros((len(rows), n_pts), dtype=self.source.dtype)
+
+        self.lock.acquire()   
+        idxs = self.idxs_view[rows[valid]]
+
+        # Each channel has its own write index, but channels are usually written 
+        # together, so there are typically only one or two distinct indices. Copy 
+        # all the rows which share a write index with a single fancy-indexed slice
+        out_rows = np.nonzero(valid)[0]
+        for idx in np.unique(idxs):
+            sel = idxs == idx
+            src_rows = rows[out_rows[sel]]
+            if idx >= n_pts:  # no wrap-around required
+                data[out_rows[sel]] = self.data[src_rows, idx-n_pts:idx]
+            else:
+                data[out_rows[sel], :n_pts-idx] = self.data[src_rows, self.max_len-(n_pts-idx):]
+                data[out_rows[sel], n_pts-idx:] = self.data[src_rows, :idx]
+        self.last_read_idxs[rows[valid]] = idxs
         self.lock.release()
 
         if self.filter is not None:
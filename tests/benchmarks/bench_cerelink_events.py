@@ -0,0 +1,79 @@
+'''
+Time for blackrock.Spikes to deliver the spikes of one second of Utah array data
+streamed through a stand-in for cbpy (tests/unit_tests/mocks.py:MockCbpy), with
+cbpy.trial_event polled every 10 ms.
+
+Compares the previous per-spike path (triple-nested loop yielding one SpikeEventData
+per timestamp, one Spikes.get call per spike) against Spikes.get_many, which
+returns all the spikes of a trial_event call as one array.
+
+Usage: python bench_cerelink_events.py
+'''
+import os
+import sys
+import time
+import numpy as np
+
+from riglib import blackrock
+from riglib.blackrock import cerelink
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'unit_tests'))
+from mocks import MockCbpy
+
+
+class MockConnection(cerelink.Connection):
+    def __del__(self):
+        pass
+
+
+def get_event_data_loop(conn):
+    '''Reference implementation: one SpikeEventData per timestamp'''
+    while conn.streaming:
+        result, trial = cerelink.cbpy.trial_event(reset=True)
+        arrival_ts = time.time()
+        for list_ in trial:
+            chan = list_[0]
+            for unit, unit_ts in enumerate(list_[1]['timestamps']):
+                for ts in unit_ts:
+                    un = 10 if unit == 0 else unit
+                    yield cerelink.SpikeEventData(chan=chan-conn.channel_offset, unit=un, ts=ts, arrival_ts=arrival_ts)
+
+
+def make_spikes(trials):
+    # replay pregenerated trials so that only the conversion is timed
+    cerelink.cbpy = MockCbpy()
+    replay = iter(trials)
+    cerelink.cbpy.trial_event = lambda reset=True: (0, next(replay))
+
+    stdout, sys.stdout = sys.stdout, open(os.devnull, 'w')
+    spikes = blackrock.Spikes.__new__(blackrock.Spikes)
+    spikes.conn = MockConnection()
+    spikes.conn._init = True
+    spikes.start()
+    sys.stdout = stdout
+    return spikes
+
+
+if __name__ == '__main__':
+    n_calls = 100
+    print("%10s %10s %15s %20s %20s" % ("channels", "rate (Hz)", "spikes/s", "per-spike (ms/s)", "get_many (ms/s)"))
+    for n_channels, rate in [(96, 20.), (96, 50.), (256, 50.), (256, 100.)]:
+        cbpy = MockCbpy(channels=range(1, n_channels + 1), rate=rate, samples_per_call=300)
+        trials = [cbpy.trial_event()[1] for _ in range(n_calls)]
+        n_spikes = sum(len(unit_ts) for trial in trials for list_ in trial for unit_ts in list_[1]['timestamps'])
+
+        spikes = make_spikes(trials)
+        data = get_event_data_loop(spikes.conn)
+        t_start = time.perf_counter()
+        for _ in range(n_spikes):
+            d = next(data)
+            np.array([(d.ts / spikes.update_freq, d.chan, d.unit, d.arrival_ts)], dtype=spikes.dtype)
+        t_loop = time.perf_counter() - t_start
+
+        spikes = make_spikes(trials)
+        t_start = time.perf_counter()
+        n_batch = sum(len(spikes.get_many()) for _ in range(n_calls))
+        t_batch = time.perf_counter() - t_start
+        assert n_batch == n_spikes
+
+        print("%10d %10.0f %15d %20.1f %20.1f" % (n_channels, rate, n_spikes, 1000*t_loop, 1000*t_batch))
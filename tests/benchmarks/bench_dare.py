@@ -0,0 +1,68 @@
+'''
+Time to compute the steady-state Kalman filter (KalmanFilter.get_sskf) and the 
+infinite-horizon LQR gain (LQRController.dlqr) for a 3D velocity decoder/assist model.
+
+Compares iterating the Riccati recursion against the direct (doubling) solution of
+the DARE and a memoized repeat of the same calculation.
+
+Usage: python bench_dare.py
+'''
+import time
+import numpy as np
+
+from riglib.bmi import riccati
+from riglib.bmi.kfdecoder import KalmanFilter
+from riglib.bmi.feedback_controllers import LQRController
+
+
+def make_model(n_units, dt=0.1):
+    np.random.seed(0)
+    A = np.mat(np.eye(7))
+    A[0:3, 3:6] = dt*np.eye(3)
+    A[3:6, 3:6] = 0.8*np.eye(3)
+    W = np.mat(np.diag([0, 0, 0, 0.01, 0.01, 0.01, 0]))
+    C = np.mat(np.zeros((n_units, 7)))
+    C[:, 3:7] = np.random.randn(n_units, 4)
+    Q = np.mat(np.diag(np.random.rand(n_units) + 1))
+    B = np.mat(np.vstack([np.zeros((3, 3)), dt*np.eye(3), np.zeros((1, 3))]))
+    return A, W, C, Q, B
+
+
+def dlqr_iterated(A, B, Q, R, max_iter=1000, eps=1e-10):
+    # Riccati recursion previously used by LQRController.dlqr
+    P = Q
+    K = np.inf
+    for t in range(max_iter):
+        K_old = K
+        K = (R + B.T*P*B).I * B.T*P*A
+        P = Q + A.T*P*A -A.T*P*B*K 
+        if np.linalg.norm(K - K_old) < eps:
+            break
+    return K
+
+
+def timeit(fn):
+    t_start = time.perf_counter()
+    fn()
+    return time.perf_counter() - t_start
+
+
+if __name__ == '__main__':
+    print("%24s %14s %14s %14s" % ("", "iterated (ms)", "direct (ms)", "memoized (ms)"))
+    for n_units in [100, 300]:
+        A, W, C, Q, B = make_model(n_units)
+        kf = KalmanFilter(A, W, C, Q)
+        riccati.clear_cache()
+        t_iter = timeit(lambda: kf._iterate_sskf(max_iter=4000))
+        t_direct = timeit(lambda: kf.get_sskf())
+        t_memo = timeit(lambda: kf.get_sskf())
+        print("%24s %14.2f %14.2f %14.2f" % ("get_sskf, %d units" % n_units, t_iter*1e3, t_direct*1e3, t_memo*1e3))
+
+    for r in [1e2, 1e6]:
+        Q_lqr = np.mat(np.diag([7, 7, 7, 0, 0, 0, 0]))
+        R = r*np.mat(np.eye(3))
+        riccati.clear_cache()
+        t_iter = timeit(lambda: dlqr_iterated(A, B, Q_lqr, R))
+        t_direct = timeit(lambda: LQRController.dlqr(A, B, Q_lqr, R))
+        t_memo = timeit(lambda: LQRController.dlqr(A, B, Q_lqr, R))
+        print("%24s %14.2f %14.2f %14.2f" % ("dlqr, R = %g*I" % r, t_iter*1e3, t_direct*1e3, t_memo*1e3))
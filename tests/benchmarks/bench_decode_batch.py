@@ -0,0 +1,43 @@
+'''
+Offline re-decoding of a session with Decoder.decode_batch vs. sequential Decoder.predict.
+
+Uses a 2D endpoint velocity KF decoder with random observation model parameters.
+One hour of 100 ms bins is 36000 observations.
+
+Usage: python bench_decode_batch.py
+'''
+import time
+import numpy as np
+
+from riglib.bmi import state_space_models
+from riglib.bmi.kfdecoder import KalmanFilter, KFDecoder
+
+
+def make_decoder(n_units):
+    np.random.seed(0)
+    ssm = state_space_models.StateSpaceEndptVel2D()
+    A, B, W = ssm.get_ssm_matrices()
+    C = np.mat(np.zeros((n_units, 7)))
+    C[:, [3, 5, 6]] = np.random.randn(n_units, 3)
+    Q = np.mat(np.diag(np.random.rand(n_units) + 1))
+    units = [(k, 1) for k in range(n_units)]
+    return KFDecoder(KalmanFilter(A, W, C, Q, is_stochastic=ssm.is_stochastic), units, ssm)
+
+
+if __name__ == '__main__':
+    n_obs = 36000
+    print("%8s %14s %14s %14s" % ("units", "predict (s)", "batch (s)", "max abs err"))
+    for n_units in [100, 300, 500]:
+        obs = np.random.poisson(2, (n_obs, n_units))
+
+        dec = make_decoder(n_units)
+        t_start = time.perf_counter()
+        expected = np.vstack([dec.predict(y) for y in obs])
+        t_seq = time.perf_counter() - t_start
+
+        dec = make_decoder(n_units)
+        t_start = time.perf_counter()
+        decoded = dec.decode_batch(obs)
+        t_batch = time.perf_counter() - t_start
+
+        print("%8d %14.3f %14.3f %14.2g" % (n_units, t_seq, t_batch, np.max(np.abs(decoded - expected))))
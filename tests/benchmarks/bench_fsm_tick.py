@@ -0,0 +1,70 @@
+'''
+Overhead of FSM.fsm_tick for task classes built from many feature mixins.
+
+Compares the precompiled dispatch table against the previous per-tick string 
+formatting + hasattr/getattr lookups. The clock is disabled (fps = 0) and all the 
+state methods are no-ops, so only the dispatch overhead is measured.
+
+Usage: python bench_fsm_tick.py
+'''
+import time
+
+from riglib.fsm import FSM, FSMTable, StateTransitions
+
+
+class Task(FSM):
+    status = FSMTable(
+        wait=StateTransitions(start_trial="target", stop=None),
+        target=StateTransitions(enter_target="hold", timeout="penalty"),
+        hold=StateTransitions(leave_early="penalty", hold_complete="reward"),
+        reward=StateTransitions(reward_end="wait"),
+        penalty=StateTransitions(penalty_end="wait"),
+    )
+    state = "target"
+    fps = 0
+    stop = False
+
+    def _while_target(self): pass
+    def _test_start_trial(self, ts): return False
+    def _test_enter_target(self, ts): return False
+    def _test_timeout(self, ts): return False
+
+
+def make_task_class(n_features):
+    '''Create a task class with the same MRO depth as a task with n_features features'''
+    bases = []
+    for k in range(n_features):
+        attrs = {'_start_feature%d' % k: lambda self: None, 'feature_attr%d' % k: k}
+        bases.append(type('Feature%d' % k, (object,), attrs))
+    return type('TaskWithFeatures', tuple(bases) + (Task,), {})
+
+
+def fsm_tick_getattr(self):
+    '''Reference implementation: per-tick lookups'''
+    self.exec_state_specific_actions(self.state)
+    self._cycle()
+    for event in self.status[self.state]:
+        if self.test_state_transition_event(event):
+            self.end_state(self.state)
+            self.trigger_event(event)
+            break
+
+
+def time_ticks(task, tick_fn, n_ticks):
+    t_start = time.perf_counter()
+    for k in range(n_ticks):
+        tick_fn(task)
+    return (time.perf_counter() - t_start) / n_ticks
+
+
+if __name__ == '__main__':
+    n_ticks = 20000
+    print("%10s %18s %18s" % ("features", "getattr (us/tick)", "table (us/tick)"))
+    for n_features in [0, 10, 30, 60]:
+        task = make_task_class(n_features)()
+        task.compile_dispatch_table()
+        task.set_state(task.state)
+
+        t_getattr = time_ticks(task, fsm_tick_getattr, n_ticks)
+        t_table = time_ticks(task, FSM.fsm_tick, n_ticks)
+        print("%10d %18.2f %18.2f" % (n_features, t_getattr*1e6, t_table*1e6))
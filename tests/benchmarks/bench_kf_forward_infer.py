@@ -0,0 +1,55 @@
+'''
+Per-iteration cost of KalmanFilter._forward_infer for decoders with 100-500 units.
+
+Compares the np.matrix reference implementation against the ndarray fast path, 
+both while the Kalman gain is still converging (the covariance is reset every 
+iteration) and after the filter has switched to the steady-state gains.
+
+Usage: python bench_kf_forward_infer.py
+'''
+import time
+import numpy as np
+
+from riglib.bmi.kfdecoder import KalmanFilter
+
+
+def make_kf(n_units, n_states=7):
+    np.random.seed(0)
+    A = np.mat(np.eye(n_states)*0.9)
+    A[-1,-1] = 1
+    W = np.mat(np.eye(n_states)*0.1)
+    W[-1,-1] = 0
+    C = np.mat(np.random.randn(n_units, n_states))
+    Q = np.mat(np.diag(np.random.rand(n_units) + 1))
+    kf = KalmanFilter(A, W, C, Q)
+    kf._init_state()
+    return kf
+
+
+def time_iters(kf, obs, reset_cov=False):
+    init_cov = kf.state.cov
+    t_start = time.perf_counter()
+    for y in obs:
+        if reset_cov:
+            kf.state.cov = init_cov
+        kf(y)
+    return (time.perf_counter() - t_start) / len(obs)
+
+
+if __name__ == '__main__':
+    n_iter = 2000
+    print("%8s %18s %18s %18s" % ("units", "matrix (us/iter)", "fast (us/iter)", "steady (us/iter)"))
+    for n_units in [100, 200, 300, 500]:
+        obs = [np.mat(np.random.poisson(2, (n_units, 1))) for k in range(n_iter)]
+
+        kf = make_kf(n_units)
+        kf.use_fast_path = False
+        t_matrix = time_iters(kf, obs)
+
+        kf = make_kf(n_units)
+        t_fast = time_iters(kf, obs, reset_cov=True)
+
+        kf = make_kf(n_units)
+        time_iters(kf, obs[:500]) # converge to the steady-state gains
+        t_steady = time_iters(kf, obs)
+        print("%8d %18.1f %18.1f %18.1f" % (n_units, t_matrix*1e6, t_fast*1e6, t_steady*1e6))
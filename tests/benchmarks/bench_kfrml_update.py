@@ -0,0 +1,95 @@
+'''
+Per-update cost of the KF CLDA updaters across unit counts and batch sizes.
+
+Compares KFRML (pseudo-inverse of Q on every update), KFRML_IVC, KFSmoothbatch and 
+KFRML_Woodbury (rank-k update of the inverse of the joint second-moment matrix), 
+and the previous KFRML sufficient-statistic update through a dense 
+(batch_size, batch_size) diagonal weight matrix.
+
+Usage: python bench_kfrml_update.py
+'''
+import copy
+import io
+import time
+from contextlib import redirect_stdout
+import numpy as np
+
+from riglib.bmi import clda, state_space_models
+from riglib.bmi.kfdecoder import KalmanFilter, KFDecoder
+
+
+def make_decoder(n_units, n_samples=5000):
+    ssm = state_space_models.StateSpaceEndptVel2D()
+    A, B, W = ssm.get_ssm_matrices()
+    kin = np.random.randn(ssm.n_states, n_samples)
+    kin[-1] = 1
+    C = np.mat(np.zeros((n_units, ssm.n_states)))
+    C[:, ssm.drives_obs_inds] = np.random.randn(n_units, len(ssm.drives_obs_inds))
+    obs = np.asarray(C * kin) + np.random.randn(n_units, n_samples)
+
+    C[:, ssm.drives_obs_inds], Q = KalmanFilter.MLE_obs_model(kin[ssm.train_inds, :], obs)
+    decoder = KFDecoder(KalmanFilter(A, W, C, Q, is_stochastic=ssm.is_stochastic), [(k, 1) for k in range(n_units)], ssm)
+    R_small, S_small, T, ESS = clda.KFRML.compute_suff_stats(kin[ssm.train_inds, :], obs)
+    decoder.filt.R = np.mat(np.zeros([ssm.n_states, ssm.n_states]))
+    decoder.filt.S = np.mat(np.zeros([n_units, ssm.n_states]))
+    decoder.filt.R[np.ix_(ssm.drives_obs_inds, ssm.drives_obs_inds)] = R_small
+    decoder.filt.S[:, ssm.drives_obs_inds] = S_small
+    decoder.filt.T = T
+    decoder.filt.ESS = ESS
+    decoder.kf = decoder.filt
+    return decoder, C
+
+
+def dense_suff_stats(updater, x, y, values, rho, drives_neurons):
+    '''Reference implementation: weights applied through a dense diagonal matrix'''
+    x = np.mat(x)
+    y = np.mat(y)
+    B = np.mat(np.diag(values))
+    updater.R = rho*updater.R + (x*B*x.T)
+    updater.S[:, drives_neurons] = rho*updater.S[:, drives_neurons] + (y*B*x[drives_neurons, :].T)
+    updater.T = rho*updater.T + np.dot(y, B*y.T)
+    updater.ESS = rho*updater.ESS + np.sum(values)
+
+
+if __name__ == '__main__':
+    np.random.seed(0)
+    n_iter = 20
+    updaters = [
+        ('KFRML', lambda: clda.KFRML(1., 120.)),
+        ('KFRML_IVC', lambda: clda.KFRML_IVC(1., 120.)),
+        ('KFSmoothbatch', lambda: clda.KFSmoothbatch(1., 120.)),
+        ('KFRML_Woodbury', lambda: clda.KFRML_Woodbury(1., 120.)),
+    ]
+
+    print("%8s %8s" % ("units", "batch") + "".join("%18s" % name for name, _ in updaters) + "%18s %18s" % ("dense B stats", "scaled stats"))
+    print("%17s" % "" + "%18s" % "(ms/update)" * (len(updaters) + 2))
+    for n_units in [50, 200, 400]:
+        decoder, C = make_decoder(n_units)
+        for batch_size in [10, 60, 600]:
+            kin = np.random.randn(7, batch_size)
+            kin[-1] = 1
+            obs = np.asarray(C * kin) + np.random.randn(n_units, batch_size)
+            values = np.random.rand(batch_size)
+
+            times = []
+            for name, updater_cls in updaters:
+                updater = updater_cls()
+                updater.init(copy.deepcopy(decoder))
+                with redirect_stdout(io.StringIO()): # KFSmoothbatch prints on every update
+                    updater.calc(intended_kin=kin, spike_counts=obs, decoder=decoder)
+
+                    t_start = time.perf_counter()
+                    for k in range(n_iter):
+                        updater.calc(intended_kin=kin, spike_counts=obs, decoder=decoder)
+                    times.append((time.perf_counter() - t_start) / n_iter)
+
+            # sufficient-statistic update alone, weighted samples
+            updater = clda.KFRML(1., 120.)
+            updater.init(copy.deepcopy(decoder))
+            for suff_stats in [dense_suff_stats, type(updater)._update_suff_stats]:
+                t_start = time.perf_counter()
+                for k in range(n_iter):
+                    suff_stats(updater, kin, obs, values, updater.rho, decoder.drives_neurons)
+                times.append((time.perf_counter() - t_start) / n_iter)
+
+            print("%8d %8d" % (n_units, batch_size) + "".join("%18.2f" % (t*1e3) for t in times))
@@ -0,0 +1,40 @@
+'''
+Per-bin cost of Butterworth band power extraction for 256 channels and 6 bands at 
+1 kHz, for different window lengths and 10 ms of new samples per bin.
+
+Compares LFPButterBPFPowerExtractor (refilters the whole window every bin) against
+StreamingLFPButterBPFPowerExtractor (filters only the new samples).
+
+Usage: python bench_lfp_butter_power.py
+'''
+import time
+import numpy as np
+
+from riglib.bmi.extractor import LFPButterBPFPowerExtractor, StreamingLFPButterBPFPowerExtractor
+
+bands = [(10, 20), (20, 40), (40, 80), (80, 150), (150, 250), (250, 350)]
+
+
+if __name__ == '__main__':
+    n_chan = 256
+    n_new = 10
+    n_bins = 100
+    channels = list(range(1, n_chan + 1))
+    print("%12s %14s %16s" % ("window (ms)", "refilter (ms)", "streaming (ms)"))
+    for win_len in [0.1, 0.2, 0.5, 1.0]:
+        n_pts = int(win_len * 1000)
+        lfp = np.random.randn(n_chan, n_pts + n_bins*n_new)
+
+        f_extractor = LFPButterBPFPowerExtractor(None, channels=channels, bands=bands, win_len=win_len, fs=1000)
+        t_start = time.perf_counter()
+        for k in range(n_bins):
+            f_extractor.extract_features(lfp[:, k*n_new:k*n_new + n_pts])
+        t_window = (time.perf_counter() - t_start) / n_bins
+
+        f_extractor = StreamingLFPButterBPFPowerExtractor(None, channels=channels, bands=bands, win_len=win_len, fs=1000)
+        f_extractor.extract_features(lfp[:, :n_pts])
+        t_start = time.perf_counter()
+        for k in range(n_bins):
+            f_extractor.extract_features(lfp[:, n_pts + k*n_new:n_pts + (k+1)*n_new])
+        t_stream = (time.perf_counter() - t_start) / n_bins
+        print("%12d %14.2f %16.2f" % (n_pts, t_window*1e3, t_stream*1e3))
@@ -0,0 +1,48 @@
+'''
+Time to compute multitaper and Butterworth LFP training features for 128 channels 
+(200 ms windows at 1 kHz, bins at 180 Hz), extrapolated to a one-hour session.
+
+Compares the per-bin loop previously used by get_mtm_lfp_power/get_butter_bpf_lfp_power
+against extract_windowed_features, serially and with a process pool.
+
+Usage: python bench_lfp_training_features.py
+'''
+import time
+import numpy as np
+
+from riglib.bmi.extractor import LFPMTMPowerExtractor, FastLFPMTMPowerExtractor, LFPButterBPFPowerExtractor
+from riglib.bmi.extractor import extract_windowed_features
+
+bands = [(10, 20), (20, 40), (40, 80), (80, 150), (150, 250), (250, 350)]
+session_bins = 3600*180
+
+
+def per_bin(f_extractor, lfp, sample_nums):
+    n_pts = f_extractor.n_pts
+    for sample_num in sample_nums:
+        f_extractor.extract_features(lfp[sample_num-n_pts:sample_num, :].T)
+
+
+if __name__ == '__main__':
+    n_chan = 128
+    channels = list(range(1, n_chan + 1))
+    lfp = np.random.randn(60*1000, n_chan)
+    sample_nums = (np.arange(1., 59., 1./180)*1000).astype(int)
+
+    print("%12s %22s %22s %22s" % ("", "per-bin loop (s/hour)", "batched (s/hour)", "4 workers (s/hour)"))
+    for name, cls_loop, cls_batch in [('multitaper', LFPMTMPowerExtractor, FastLFPMTMPowerExtractor), 
+                                      ('butterworth', LFPButterBPFPowerExtractor, LFPButterBPFPowerExtractor)]:
+        n_loop = 500
+        t_start = time.perf_counter()
+        per_bin(cls_loop(None, channels=channels, bands=bands, fs=1000), lfp, sample_nums[:n_loop])
+        t_loop = (time.perf_counter() - t_start) / n_loop * session_bins
+
+        f_extractor = cls_batch(None, channels=channels, bands=bands, fs=1000)
+        t_start = time.perf_counter()
+        extract_windowed_features(f_extractor, lfp, sample_nums)
+        t_batch = (time.perf_counter() - t_start) / len(sample_nums) * session_bins
+
+        t_start = time.perf_counter()
+        extract_windowed_features(f_extractor, lfp, sample_nums, n_workers=4)
+        t_parallel = (time.perf_counter() - t_start) / len(sample_nums) * session_bins
+        print("%12s %22.0f %22.0f %22.0f" % (name, t_loop, t_batch, t_parallel))
@@ -0,0 +1,67 @@
+'''
+Benchmark of MultiChanDataSource reads and sink record conversion vs. channel count.
+
+Compares the vectorized ringbuffer reads against the previous per-channel loop. 
+The data source process is not started; the ringbuffer is filled directly.
+
+Usage: python bench_multichan_source.py
+'''
+import time
+import numpy as np
+
+from riglib import source
+
+
+class MockLFP(source.DataSourceSystem):
+    update_freq = 1000.
+    dtype = np.dtype('float')
+
+
+def get_loop(ds, n_pts, channels):
+    '''Reference implementation: one copy per channel'''
+    data = np.zeros((len(channels), n_pts), dtype=ds.source.dtype)
+    for chan_num, chan in enumerate(channels):
+        row = ds.chan_to_row[chan]
+        idx = ds.idxs[row]
+        if idx >= n_pts:
+            data[chan_num, :] = ds.data[row, idx-n_pts:idx]
+        else:
+            data[chan_num, :n_pts-idx] = ds.data[row, -(n_pts-idx):]
+            data[chan_num, n_pts-idx:] = ds.data[row, :idx]
+    return data
+
+
+def to_sink_records_loop(ds, cols):
+    '''Reference implementation: one tuple per sample'''
+    return np.array(list(map(tuple, ds.data[:, cols].T)), dtype=ds.send_to_sinks_dtype)
+
+
+def time_call(fn, n_reps):
+    t_start = time.perf_counter()
+    for k in range(n_reps):
+        fn()
+    return (time.perf_counter() - t_start) / n_reps
+
+
+if __name__ == '__main__':
+    n_pts = 200 # e.g., 200 ms LFP window at 1 kHz
+    n_reps = 200
+    print("%8s %14s %14s %14s %14s" % ("n_chan", "get loop (us)", "get (us)", "sink loop (us)", "sink (us)"))
+    for n_chan in [16, 64, 128, 256, 512]:
+        channels = list(range(1, n_chan + 1))
+        ds = source.MultiChanDataSource(MockLFP, channels=channels, send_data_to_sink_manager=True, supp_file='')
+        ds.data[:] = np.random.randn(*ds.data.shape)
+
+        # channels arrive in packets, so at read time some channels are one packet ahead
+        ds.idxs_view[:] = 100
+        ds.idxs_view[:n_chan//2] = 110
+
+        assert np.array_equal(ds.get(n_pts, channels), get_loop(ds, n_pts, channels))
+        cols = np.arange(ds.max_len - 100, ds.max_len)
+        assert np.array_equal(ds.to_sink_records(cols), to_sink_records_loop(ds, cols))
+
+        t_loop = time_call(lambda: get_loop(ds, n_pts, channels), n_reps)
+        t_get = time_call(lambda: ds.get(n_pts, channels), n_reps)
+        t_sink_loop = time_call(lambda: to_sink_records_loop(ds, cols), n_reps)
+        t_sink = time_call(lambda: ds.to_sink_records(cols), n_reps)
+        print("%8d %14.1f %14.1f %14.1f %14.1f" % (n_chan, t_loop*1e6, t_get*1e6, t_sink_loop*1e6, t_sink*1e6))
@@ -0,0 +1,88 @@
+'''
+Time to parse the spike packets of a synthetic 96-channel NEV file.
+
+Compares the previous packet-at-a-time parser (struct.unpack of each header, list
+search for the channel, np.append of each waveform) against NevFile.getdata, which
+memory-maps the packet region as a structured array and splits it with masks.
+
+Usage: python bench_nev_parse.py
+'''
+import os
+import struct
+import tempfile
+import time
+import numpy as np
+
+from riglib.blackrock import brpylib
+
+
+def write_nev(filename, n_spikes, channels, bytes_in_packet=104):
+    bytes_in_header = 336 + 32*len(channels)
+    with open(filename, 'wb') as f:
+        f.write(struct.pack('<8s2BHIIII8H32s256sI', b'NEURALEV', 2, 3, 0, bytes_in_header, bytes_in_packet,
+            30000, 30000, 2020, 1, 3, 1, 0, 0, 0, 0, b'bench', b'', len(channels)))
+        for chan in channels:
+            f.write(struct.pack('<8sHBBHHhhBBH8s', b'NEUEVWAV', chan, 1, chan, 250, 0, 0, 0, 0, 2, 48, b''))
+
+        packets = np.zeros(n_spikes, dtype=brpylib.nev_packet_dtype(bytes_in_packet, 'spike'))
+        packets['TimeStamp'] = np.sort(np.random.randint(0, 30000*3600, n_spikes))
+        packets['PacketID'] = np.random.choice(channels, n_spikes)
+        packets['Classification'] = np.random.randint(0, 4, n_spikes)
+        packets['Waveform'] = np.random.randint(0, 256, (n_spikes, bytes_in_packet - 8))
+        packets.tofile(f)
+
+
+def parse_loop(nev):
+    '''Reference implementation: one packet at a time'''
+    datafile = nev.datafile
+    datafile.seek(nev.basic_header['BytesInHeader'], 0)
+    spike_events = {'ChannelID': [], 'TimeStamps': [], 'Classification': [], 'Waveforms': []}
+    file_size = os.path.getsize(datafile.name)
+    while datafile.tell() != file_size:
+        time_stamp = struct.unpack('<I', datafile.read(4))[0]
+        packet_id = struct.unpack('<H', datafile.read(2))[0]
+        classifier = struct.unpack('B', datafile.read(1))[0]
+        datafile.seek(1, 1)
+        if packet_id in spike_events['ChannelID']:
+            idx = spike_events['ChannelID'].index(packet_id)
+            spike_events['Waveforms'][idx] = np.append(spike_events['Waveforms'][idx],
+                [np.fromfile(file=datafile, dtype=np.int16, count=48).astype(np.int32) * 250], axis=0)
+        else:
+            idx = -1
+            spike_events['ChannelID'].append(packet_id)
+            spike_events['TimeStamps'].append([])
+            spike_events['Classification'].append([])
+            spike_events['Waveforms'].append([np.fromfile(file=datafile, dtype=np.int16, count=48).astype(np.int32) * 250])
+        spike_events['TimeStamps'][idx].append(time_stamp)
+        spike_events['Classification'][idx].append(classifier)
+    return spike_events
+
+
+if __name__ == '__main__':
+    np.random.seed(0)
+    channels = list(range(1, 97))
+    print("%10s %20s %20s" % ("spikes", "per-packet (s)", "memmap (s)"))
+    with tempfile.TemporaryDirectory() as tmpdir:
+        for n_spikes in [10000, 50000, 200000]:
+            filename = os.path.join(tmpdir, 'bench_%d.nev' % n_spikes)
+            write_nev(filename, n_spikes, channels)
+            nev = brpylib.NevFile(filename)
+
+            if n_spikes <= 50000:
+                t_start = time.perf_counter()
+                expected = parse_loop(nev)
+                t_loop = time.perf_counter() - t_start
+            else:
+                t_loop = np.nan
+
+            t_start = time.perf_counter()
+            data = nev.getdata()
+            t_memmap = time.perf_counter() - t_start
+
+            if n_spikes <= 50000:
+                for idx, chan in enumerate(expected['ChannelID']):
+                    assert data['spike_events']['ChannelID'][idx] == chan
+                    assert np.array_equal(data['spike_events']['TimeStamps'][idx], expected['TimeStamps'][idx])
+                    assert np.array_equal(data['spike_events']['Waveforms'][idx], expected['Waveforms'][idx])
+            nev.datafile.close()
+            print("%10d %20.3f %20.3f" % (n_spikes, t_loop, t_memmap))
@@ -0,0 +1,98 @@
+'''
+Time to decode plexnet data packets of spike timestamps.
+
+Compares the previous per-record decoder (struct.unpack of each header into a dict,
+slicing the packet after each record) against Connection.get_data, which unpacks the
+headers in place by offset, and Connection.get_data_batches, which decodes all the
+headers of a packet with one np.frombuffer and yields them as one structured array.
+
+Usage: python bench_plexnet_decode.py
+'''
+import struct
+import time
+import numpy as np
+
+from riglib.plexon.plexon import plexnet
+
+
+class FakeSocket(object):
+    def __init__(self, data):
+        self.data = data
+        self.pos = 0
+
+    def recv_into(self, buf, nbytes):
+        n = min(nbytes, len(self.data) - self.pos)
+        buf[:n] = self.data[self.pos:self.pos + n]
+        self.pos += n
+        return n
+
+
+class FakeConnection(plexnet.Connection):
+    def __init__(self, data):
+        self.sock = FakeSocket(data)
+        self.num_server_dropped = 0
+        self.num_mmf_dropped = 0
+        self._buf = bytearray(plexnet.PACKETSIZE)
+        self._view = memoryview(self._buf)
+        self._init = True
+        self.streaming = True
+
+    def __del__(self):
+        pass
+
+
+def make_packets(n_packets):
+    packets = []
+    for k in range(n_packets):
+        packet = struct.pack('4i', 1, 0, 0, 0)
+        for m in range(30):
+            packet += struct.pack('hHI4h', 1, 0, 30*k + m, np.random.randint(1, 257), np.random.randint(0, 4), 0, 0)
+        packets.append(packet.ljust(plexnet.PACKETSIZE, b'\x00'))
+    return b''.join(packets)
+
+
+def decode_loop(data):
+    '''Reference implementation: one record at a time'''
+    hnames = 'type,Uts,ts,chan,unit,nwave,nword'.split(',')
+    invalid = set([0, -1])
+    spikes = []
+    for start in range(0, len(data), plexnet.PACKETSIZE):
+        packet = data[start:start + plexnet.PACKETSIZE]
+        ibuf = struct.unpack('4i', packet[:16])
+        if ibuf[0] == 1:
+            packet = packet[16:]
+            while len(packet) > 16:
+                header = dict(list(zip(hnames, struct.unpack('hHI4h', packet[:16]))))
+                packet = packet[16:]
+                if header['type'] not in invalid:
+                    if header['nwave'] > 0:
+                        packet = packet[header['nwave'] * header['nword'] * 2:]
+                    ts = int(header['Uts']) << 32 | int(header['ts'])
+                    spikes.append((ts, header['chan'], header['unit']))
+    return spikes
+
+
+if __name__ == '__main__':
+    np.random.seed(0)
+    print("%10s %20s %20s %20s" % ("packets", "per-record (s)", "get_data (s)", "batches (s)"))
+    for n_packets in [1000, 10000, 50000]:
+        data = make_packets(n_packets)
+        n_spikes = 30 * n_packets
+
+        t_start = time.perf_counter()
+        expected = decode_loop(data)
+        t_loop = time.perf_counter() - t_start
+
+        t_start = time.perf_counter()
+        gen = FakeConnection(data).get_data()
+        spikes = [next(gen) for _ in range(n_spikes)]
+        t_get_data = time.perf_counter() - t_start
+        assert [(d.ts, d.chan, d.unit) for d in spikes] == expected
+
+        t_start = time.perf_counter()
+        gen = FakeConnection(data).get_data_batches()
+        events = np.hstack([next(gen).events for _ in range(n_packets)])
+        t_batches = time.perf_counter() - t_start
+        assert events[['ts', 'chan', 'unit']].tolist() == expected
+
+        print("%10d %20.3f %20.3f %20.3f" % (n_packets, t_loop, t_get_data, t_batches))
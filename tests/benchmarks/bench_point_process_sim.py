@@ -0,0 +1,46 @@
+'''
+Per-step cost of simulating a point-process ensemble, 100 units at dt = 1/180 s.
+
+Compares a list of single-unit PointProcess objects (one Python object per unit,
+rate integral recomputed over the window since the last spike) against the
+array-valued PointProcessEnsemble, stepped one sample at a time and via sim_batch.
+
+Usage: python bench_point_process_sim.py
+'''
+import time
+import numpy as np
+
+from riglib.bmi import sim_neurons
+
+
+if __name__ == '__main__':
+    np.random.seed(0)
+    n_units = 100
+    dt = 1./180
+    beta = np.vstack([np.zeros(n_units), np.log(np.random.uniform(2, 40, n_units)*dt)]).T
+
+    print("%10s %22s %22s %22s" % ("steps", "per-unit (us/step)", "ensemble (us/step)", "sim_batch (us/step)"))
+    for T in [180, 900, 3600]:
+        X = np.ones((T, 2))
+
+        point_procs = [sim_neurons.PointProcess(beta[k], dt) for k in range(n_units)]
+        for point_proc in point_procs:
+            point_proc._init_sampling(X[0])
+        t_start = time.perf_counter()
+        for t in range(T):
+            for k in range(n_units):
+                point_procs[k](X[t])
+        t_unit = (time.perf_counter() - t_start) / T
+
+        ensemble = sim_neurons.PointProcessEnsemble(beta, dt, init_state=X[0])
+        t_start = time.perf_counter()
+        for t in range(T):
+            ensemble(X[t])
+        t_ens = (time.perf_counter() - t_start) / T
+
+        ensemble = sim_neurons.PointProcessEnsemble(beta, dt, init_state=X[0])
+        t_start = time.perf_counter()
+        ensemble.sim_batch(X)
+        t_batch = (time.perf_counter() - t_start) / T
+
+        print("%10d %22.1f %22.1f %22.1f" % (T, t_unit*1e6, t_ens*1e6, t_batch*1e6))
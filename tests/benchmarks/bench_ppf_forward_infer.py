@@ -0,0 +1,56 @@
+'''
+Per-iteration cost of PointProcessFilter._forward_infer for decoders with 100-500 units.
+
+Compares the np.matrix reference implementation against the ndarray fast path 
+for a 2D velocity decoder (7 states, 2 of them stochastic) updated every 5 ms. Each
+time is the best (and median) of several runs, since single runs on a shared machine
+are noisy.
+
+Usage: python bench_ppf_forward_infer.py
+'''
+import time
+import numpy as np
+
+from riglib.bmi.ppfdecoder import PointProcessFilter
+
+
+def make_ppf(n_units, dt=0.005):
+    np.random.seed(0)
+    A = np.mat(np.eye(7))
+    A[0:3, 3:6] = dt*np.eye(3)
+    A[3:6, 3:6] = 0.8*np.eye(3)
+    W = np.mat(np.diag([0, 0, 0, 0.01, 0, 0.01, 0]))
+    C = np.mat(np.zeros((n_units, 7)))
+    C[:, [3, 5]] = np.random.randn(n_units, 2)
+    C[:, 6] = np.log(np.random.rand(n_units, 1)*0.05 + 0.01)
+    ppf = PointProcessFilter(A, W, C, dt=dt, is_stochastic=[False]*3 + [True, False, True, False])
+    ppf._init_state()
+    return ppf
+
+
+def time_iters(n_units, obs, use_fast_path, n_repeat=7, n_warmup=50):
+    '''
+    Best and median per-iteration time over n_repeat runs, each on a new filter
+    which is first run for n_warmup iterations
+    '''
+    times = []
+    for k in range(n_repeat):
+        ppf = make_ppf(n_units)
+        ppf.use_fast_path = use_fast_path
+        for y in obs[:n_warmup]:
+            ppf(y)
+        t_start = time.perf_counter()
+        for y in obs:
+            ppf(y)
+        times.append((time.perf_counter() - t_start) / len(obs))
+    return min(times), np.median(times)
+
+
+if __name__ == '__main__':
+    n_iter = 1000
+    print("%8s %22s %22s" % ("units", "matrix best (median)", "fast best (median)"))
+    for n_units in [100, 200, 300, 500]:
+        obs = [np.mat(np.random.rand(n_units, 1) < 0.05).astype(float) for k in range(n_iter)]
+        t_matrix = time_iters(n_units, obs, False)
+        t_fast = time_iters(n_units, obs, True)
+        print("%8d %13.1f (%6.1f) %13.1f (%6.1f)" % ((n_units,) + tuple(1e6*np.array(t_matrix + t_fast))))
@@ -0,0 +1,62 @@
+'''
+Throughput of the DataSink transports (pickled pipe vs. shared-memory queue) vs. record size.
+
+One record is sent per 'send' call, as the task does every FSM cycle. Reports the time 
+spent in 'send' by the producer and the end-to-end throughput until the sink has 
+received all the records.
+
+Usage: python bench_sink_transport.py
+'''
+import time
+import numpy as np
+
+from riglib import sink
+
+
+class CountingSink(object):
+    '''Sink target which only counts the records it receives'''
+    def __init__(self):
+        self.n_records = 0
+
+    def register(self, system, dtype):
+        pass
+
+    def send(self, system, data):
+        self.n_records += len(data)
+
+    def get_n_records(self):
+        return self.n_records
+
+    def close(self):
+        pass
+
+
+def run(record_size, n_records, shm_transport):
+    s = sink.DataSink(target_class=CountingSink, shm_transport=shm_transport)
+    s.start()
+    dtype = np.dtype([('data', 'u1', (record_size,))])
+    s.register('system', dtype)
+    records = np.zeros((n_records,), dtype=dtype)
+
+    t_start = time.perf_counter()
+    for k in range(n_records):
+        s.send('system', records[k:k+1])
+    t_send = time.perf_counter() - t_start
+
+    while s.get_n_records() < n_records:
+        time.sleep(0.001)
+    t_total = time.perf_counter() - t_start
+
+    s.stop()
+    s.join()
+    return t_send, t_total
+
+
+if __name__ == '__main__':
+    n_records = 20000
+    print("%10s %10s %16s %16s" % ("bytes", "transport", "send (us/rec)", "records/s"))
+    for record_size in [8, 64, 512, 4096]:
+        for shm_transport in [False, True]:
+            t_send, t_total = run(record_size, n_records, shm_transport)
+            print("%10d %10s %16.2f %16.0f" % (record_size, "shm" if shm_transport else "pipe", 
+                t_send/n_records*1e6, n_records/t_total))
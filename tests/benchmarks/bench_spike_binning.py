@@ -0,0 +1,65 @@
+'''
+Per-call cost of BinnedSpikeCountsExtractor spike binning, 10k spikes per bin, 500 units.
+
+Compares the (channel, unit) lookup table + single bincount against the previous
+np.histogram over chan*13 + unit, repeated once per subbin over boolean masks.
+
+Usage: python bench_spike_binning.py
+'''
+import time
+import numpy as np
+
+from riglib.bmi.extractor import BinnedSpikeCountsExtractor
+from riglib.bmi import sim_neurons
+
+
+def bin_spikes_histogram(ts, units, max_units_per_channel=13):
+    '''Reference implementation: histogram over flattened (chan, unit) indices'''
+    unit_inds = units[:,0]*max_units_per_channel + units[:,1]
+    edges = np.sort(np.hstack([unit_inds - 0.5, unit_inds + 0.5]))
+    spiking_unit_inds = ts['chan']*max_units_per_channel + ts['unit']
+    counts, _ = np.histogram(spiking_unit_inds, edges)
+    return counts[::2]
+
+
+def count_histogram(ts, units, subbin_inds, n_subbins):
+    if n_subbins > 1:
+        return np.vstack([bin_spikes_histogram(ts[subbin_inds == k], units) for k in range(1, n_subbins+1)]).T
+    else:
+        return bin_spikes_histogram(ts, units).reshape(-1, 1)
+
+
+if __name__ == '__main__':
+    np.random.seed(0)
+    n_spikes = 10000
+    n_iter = 500
+    units = np.array([(chan, unit) for chan in range(1, 126) for unit in range(1, 5)])[:500]
+
+    ts = np.zeros(n_spikes, dtype=sim_neurons.ts_dtype_new)
+    ts['chan'] = np.random.randint(1, 129, n_spikes)
+    ts['unit'] = np.random.randint(0, 5, n_spikes)
+    ts['arrival_ts'] = np.sort(np.random.rand(n_spikes))
+
+    extractor = BinnedSpikeCountsExtractor(None, units=units)
+    print("%10s %20s %20s" % ("subbins", "histogram (us/call)", "bincount (us/call)"))
+    for n_subbins in [1, 3, 6]:
+        subbin_edges = np.linspace(0, 1, n_subbins+1)
+        subbin_edges[0] -= 1
+        subbin_inds = np.digitize(ts['arrival_ts'], subbin_edges)
+
+        t_start = time.perf_counter()
+        for k in range(n_iter):
+            expected = count_histogram(ts, units, subbin_inds, n_subbins)
+        t_hist = (time.perf_counter() - t_start) / n_iter
+
+        t_start = time.perf_counter()
+        for k in range(n_iter):
+            if n_subbins > 1:
+                counts = extractor.count_spikes(ts, extractor.get_unit_lut(), len(units), 
+                    subbin_inds=subbin_inds, n_subbins=n_subbins)
+            else:
+                counts = extractor.count_spikes(ts, extractor.get_unit_lut(), len(units))
+        t_lut = (time.perf_counter() - t_start) / n_iter
+
+        assert np.array_equal(counts, expected)
+        print("%10d %20.1f %20.1f" % (n_subbins, t_hist*1e6, t_lut*1e6))
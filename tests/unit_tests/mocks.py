@@ -2,6 +2,8 @@
 Mock classes
 """
 import shutil
+import time
+import numpy as np
 
 class MockDatabase(object):
     """ mock for dbq module """
@@ -11,4 +13,54 @@ class MockDatabase(object):
         f.close()
 
     def save_data(self, filename, system, saveid, dbname="default"):
-        shutil.copy(filename, str(saveid) + "." + system)
\ No newline at end of file
+        shutil.copy(filename, str(saveid) + "." + system)
+
+class MockCbpy(object):
+    """ 
+    Stand-in for the cerebus.cbpy module which generates Poisson spike trains 
+    instead of talking to an NSP. Assign to riglib.blackrock.cerelink.cbpy.
+
+    Each call to trial_event returns the spikes for 'samples_per_call' samples
+    (at 30 kHz), or for the wall-clock time elapsed since the previous call if
+    samples_per_call is None.
+    """
+    def __init__(self, channels=range(1, 97), rate=20., n_units=6, samples_per_call=None, seed=0):
+        self.channels = list(channels)
+        self.rate = rate
+        self.n_units = n_units
+        self.samples_per_call = samples_per_call
+        self.random = np.random.RandomState(seed)
+        self.fs = 30000
+        self.sample = 0
+        self.last_call = time.time()
+
+    def open(self, connection='default', parameter=None):
+        return 0, {'connection': 'Master'}
+
+    def trial_config(self, reset=True, buffer_parameter=None):
+        return 0, reset
+
+    def trial_event(self, reset=True):
+        if self.samples_per_call is None:
+            now = time.time()
+            n_samples = int((now - self.last_call) * self.fs)
+            self.last_call = now
+        else:
+            n_samples = self.samples_per_call
+
+        # spikes of each channel are spread uniformly over its units
+        counts = self.random.poisson(self.rate * n_samples / self.fs / self.n_units,
+            (len(self.channels), self.n_units))
+        trial = []
+        for chan, chan_counts in zip(self.channels, counts):
+            timestamps = [np.sort(self.random.randint(self.sample, self.sample + max(n_samples, 1), n)).astype(np.uint32)
+                for n in chan_counts]
+            trial.append([chan, {'timestamps': timestamps, 'events': []}])
+        self.sample += n_samples
+        return 0, trial
+
+    def trial_continuous(self, reset=True):
+        return 0, []
+
+    def close(self):
+        return 0
@@ -2,6 +2,7 @@ import unittest
 import os
 import numpy as np
 import time
+import tempfile
 
 from riglib import experiment
 from riglib.experiment.mocks import MockSequenceWithGenerators
@@ -9,6 +10,8 @@ from features.hdf_features import SaveHDF
 import h5py
 
 from riglib import sink
+from features.simulation_features import SimHDF
+from utils.record_buffer import GrowingRecordArray
 
 class TestTaskWithFeatures(unittest.TestCase):
     def setUp(self):
@@ -38,7 +41,48 @@ class TestTaskWithFeatures(unittest.TestCase):
         # TODO this length chopping should be needed, but the vector appears to be short sometimes
         L = min(len(ref_current_state), len(saved_current_state))
         self.assertTrue(np.array_equal(ref_current_state[:L], saved_current_state[:L]))
-        
+
+    def test_sim_hdf_task_data_hist(self):
+        task_cls = experiment.make(MockSequenceWithGenerators, feats=(SimHDF,))
+        exp = task_cls(MockSequenceWithGenerators.gen_fn1())
+        exp.run_sync()
+
+        task_data = exp.task_data_hist.get_all()
+        self.assertIsInstance(task_data, np.recarray)
+        self.assertEqual(len(task_data), exp.cycle_count)
+        ref_current_state = np.array(exp.sim_state_seq * 2)[:len(task_data)]
+        self.assertTrue(np.array_equal(task_data.current_state.ravel(), ref_current_state))
+
+
+class TestGrowingRecordArray(unittest.TestCase):
+    dtype = np.dtype([('a', int), ('b', float, (2,))])
+
+    def test_append_grows(self):
+        records = GrowingRecordArray(self.dtype, capacity=3)
+        row = np.zeros((1,), dtype=self.dtype)
+        for k in range(10):
+            row['a'] = k
+            records.append(row)
+        records.append(np.zeros(5, dtype=self.dtype))
+
+        self.assertEqual(len(records), 15)
+        self.assertGreaterEqual(len(records.buffer), 15)
+        self.assertTrue(np.array_equal(records.get_all().a, list(range(10)) + [0]*5))
+        self.assertEqual(records[3]['a'], 3)
+
+    def test_memmap(self):
+        with tempfile.TemporaryDirectory() as tmpdir:
+            filename = os.path.join(tmpdir, 'records.dat')
+            records = GrowingRecordArray(self.dtype, capacity=2, filename=filename)
+            for k in range(7):
+                records.append(np.array([(k, (k, -k))], dtype=self.dtype))
+            records.flush()
+
+            saved = np.memmap(filename, dtype=self.dtype, mode='r')[:len(records)]
+            self.assertTrue(np.array_equal(saved, records.get_all()))
+            self.assertTrue(np.array_equal(saved['b'][:,1], -np.arange(7)))
+            del saved, records
+
 
 if __name__ == '__main__':
     unittest.main()
\ No newline at end of file
@@ -0,0 +1,120 @@
+import unittest
+import os
+import time
+import tempfile
+import multiprocessing as mp
+from unittest import mock
+import numpy as np
+
+from utils.result_cache import ResultCache, function_id
+
+def calc_a():
+    return np.arange(10)
+
+def calc_b():
+    return np.arange(10)
+
+def read_write(cache_dir, n):
+    cache = ResultCache(cache_dir)
+    for k in range(n):
+        key = ResultCache.key('shared', k % 3)
+        cache.put(key, np.full(1000, k % 3))
+        value = cache.get(key)
+        assert value is None or np.all(value == k % 3)
+
+
+class TestResultCache(unittest.TestCase):
+    def setUp(self):
+        self.tmpdir = tempfile.TemporaryDirectory()
+        self.cache = ResultCache(self.tmpdir.name)
+
+    def tearDown(self):
+        self.tmpdir.cleanup()
+
+    def test_put_get(self):
+        key = ResultCache.key(12, 'origin', calc_a)
+        self.assertIsNone(self.cache.get(key))
+
+        self.cache.put(key, np.eye(3))
+        value = self.cache.get(key)
+        self.assertIsInstance(value, np.memmap)
+        self.assertFalse(value.flags.writeable)
+        self.assertTrue(np.array_equal(value, np.eye(3)))
+
+        # non-array values are pickled, and replace the array
+        self.cache.put(key, dict(a=[1, 2]))
+        self.assertEqual(self.cache.get(key), dict(a=[1, 2]))
+        self.assertEqual(len(os.listdir(self.tmpdir.name)), 1)
+
+        self.cache.put(key, np.zeros(0))
+        self.assertEqual(len(self.cache.get(key)), 0)
+
+    def test_key(self):
+        self.assertEqual(ResultCache.key(12, calc_a, x=1, y=2), ResultCache.key(12, calc_a, y=2, x=1))
+        self.assertNotEqual(ResultCache.key(12, calc_a), ResultCache.key(13, calc_a))
+        self.assertNotEqual(ResultCache.key(12, calc_a), ResultCache.key(12, calc_b))
+        self.assertNotEqual(ResultCache.key(12, calc_a, x=1), ResultCache.key(12, calc_a, x=2))
+        self.assertNotEqual(function_id(calc_a), function_id(calc_b))
+
+    def test_get_or_compute(self):
+        calls = []
+        def fn():
+            calls.append(1)
+            return np.arange(5)
+
+        key = ResultCache.key('test')
+        for clean in [False, False, True]:
+            self.assertTrue(np.array_equal(self.cache.get_or_compute(key, fn, clean=clean), np.arange(5)))
+        self.assertEqual(len(calls), 2)
+
+    def test_lru_eviction(self):
+        value = np.zeros(1000)
+        nbytes = os.path.getsize(self._put('a', value))
+        self.cache.max_bytes = 3*nbytes
+
+        t = time.time() - 100
+        for k, name in enumerate(['a', 'b', 'c']):
+            os.utime(self._put(name, value), (t + k, t + k))
+
+        # reading 'a' makes 'b' the least recently used result
+        self.cache.get(ResultCache.key('a'))
+        self._put('d', value)
+        self.assertIsNone(self.cache.get(ResultCache.key('b')))
+        for name in ['a', 'c', 'd']:
+            self.assertIsNotNone(self.cache.get(ResultCache.key(name)))
+
+        self.cache.clear()
+        self.assertEqual(os.listdir(self.tmpdir.name), [])
+
+    def test_lazy_eviction(self):
+        """The cache directory is only listed when the estimated size exceeds max_bytes, or every scan_interval writes"""
+        self.cache.scan_interval = 10
+        with mock.patch('utils.result_cache.os.listdir', wraps=os.listdir) as listdir:
+            for k in range(25):
+                self._put(k, np.zeros(10))
+            self.assertEqual(listdir.call_count, 3)
+
+            self.cache.max_bytes = 0
+            self._put('a', np.zeros(10))
+            self.assertEqual(listdir.call_count, 4)
+        self.assertEqual(os.listdir(self.tmpdir.name), [])
+
+    def test_concurrent_access(self):
+        procs = [mp.Process(target=read_write, args=(self.tmpdir.name, 50)) for _ in range(4)]
+        for proc in procs:
+            proc.start()
+        for proc in procs:
+            proc.join()
+            self.assertEqual(proc.exitcode, 0)
+
+        self.assertTrue(np.all(self.cache.get(ResultCache.key('shared', 2)) == 2))
+        self.assertFalse(any(name.endswith('.tmp') for name in os.listdir(self.tmpdir.name)))
+
+    def _put(self, name, value):
+        key = ResultCache.key(name)
+        self.cache.put(key, value)
+        return os.path.join(self.tmpdir.name, key + '.npy')
+
+
+if __name__ == '__main__':
+    unittest.main()
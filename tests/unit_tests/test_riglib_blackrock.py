@@ -0,0 +1,170 @@
+import unittest
+import os
+import tempfile
+import struct
+import numpy as np
+
+from riglib import blackrock
+from riglib.blackrock import brpylib, cerelink
+from mocks import MockCbpy
+
+def write_nev(filename, channels, packets, bytes_in_packet=104, n_samples=48):
+    """Write a minimal file spec 2.3 NEV file with one NEUEVWAV extended header per channel"""
+    n_ext = len(channels)
+    bytes_in_header = 336 + 32*n_ext
+    with open(filename, 'wb') as f:
+        f.write(struct.pack('<8s2BHIIII8H32s256sI', b'NEURALEV', 2, 3, 0, bytes_in_header, bytes_in_packet,
+            30000, 30000, 2020, 1, 3, 1, 0, 0, 0, 0, b'test', b'', n_ext))
+        for chan in channels:
+            f.write(struct.pack('<8sHBBHHhhBBH8s', b'NEUEVWAV', chan, 1, chan, 250, 0, 0, 0, 0, 2, n_samples, b''))
+        for packet in packets:
+            packet = packet.ljust(bytes_in_packet, b'\x00')
+            f.write(packet)
+
+def spike_packet(ts, chan, unit, wave):
+    return struct.pack('<IHBB', ts, chan, unit, 0) + np.asarray(wave, dtype='<i2').tobytes()
+
+def digital_packet(ts, reason, value):
+    return struct.pack('<IHBBH', ts, 0, reason, 0, value)
+
+def comment_packet(ts, comment):
+    return struct.pack('<IHBBI', ts, 65535, 0, 0, 7) + comment + b'\x00'
+
+def config_packet(ts, change_type, changed):
+    return struct.pack('<IHH', ts, 65531, change_type) + changed
+
+
+class TestNevFile(unittest.TestCase):
+    def setUp(self):
+        np.random.seed(0)
+        self.tmpdir = tempfile.TemporaryDirectory()
+        self.filename = os.path.join(self.tmpdir.name, 'test.nev')
+
+        self.channels = [5, 2, 9]
+        self.spikes = []
+        packets = []
+        for k in range(300):
+            ts = 10*k
+            if k % 50 == 0:
+                packets.append(digital_packet(ts, [1, 129][k % 100 == 0], 0x1234 + k))
+            elif k == 77:
+                packets.append(comment_packet(ts, b'hello'))
+            elif k == 123:
+                packets.append(config_packet(ts, 1, b'cfg'))
+            else:
+                chan = self.channels[np.random.randint(3)]
+                unit = [0, 1, 2, 255][np.random.randint(4)]
+                wave = np.random.randint(-1000, 1000, 48)
+                packets.append(spike_packet(ts, chan, unit, wave))
+                self.spikes.append((ts, chan, unit, wave))
+        write_nev(self.filename, self.channels, packets)
+
+        # a partially written packet at the end of the file is ignored
+        with open(self.filename, 'ab') as f:
+            f.write(b'\x01\x02\x03')
+
+    def tearDown(self):
+        self.tmpdir.cleanup()
+
+    def test_spike_events(self):
+        nev = brpylib.NevFile(self.filename)
+        data = nev.getdata()
+        nev.close()
+
+        spike_events = data['spike_events']
+        self.assertEqual(spike_events['ChannelID'], [5, 2, 9])
+        labels = {0: 'none', 1: 1, 2: 2, 255: 'noise'}
+        for idx, chan in enumerate(spike_events['ChannelID']):
+            chan_spikes = [spike for spike in self.spikes if spike[1] == chan]
+            self.assertTrue(np.array_equal(spike_events['TimeStamps'][idx], [spike[0] for spike in chan_spikes]))
+            self.assertEqual(spike_events['Classification'][idx], [labels[spike[2]] for spike in chan_spikes])
+            self.assertTrue(np.array_equal(spike_events['Waveforms'][idx], 250*np.vstack([spike[3] for spike in chan_spikes])))
+
+    def test_dig_events_and_comments(self):
+        nev = brpylib.NevFile(self.filename)
+        data = nev.getdata()
+        nev.close()
+
+        self.assertEqual(data['dig_events']['Reason'], ['serial', 'parallel'])
+        self.assertTrue(np.array_equal(data['dig_events']['TimeStamps'][0], [0, 1000, 2000]))
+        self.assertTrue(np.array_equal(data['dig_events']['Data'][0], [(0x1234 + k) & 0xff for k in [0, 100, 200]]))
+        self.assertTrue(np.array_equal(data['dig_events']['Data'][1], [0x1234 + k for k in [50, 150, 250]]))
+        self.assertEqual(data['comments']['Comment'], ['hello'])
+        self.assertEqual(data['comments']['CharSet'], ['ANSI'])
+        self.assertEqual(data['comments']['Data'][0], 7)
+        self.assertEqual(data['comments']['TimeStamps'], [770])
+
+    def test_configuration_events(self):
+        nev = brpylib.NevFile(self.filename)
+        data = nev.getdata()
+        nev.close()
+
+        config = data['configuration_events']
+        self.assertEqual(config['TimeStamps'], [1230])
+        self.assertEqual(config['ConfigChangeType'], ['critical'])
+        self.assertEqual(config['ConfigChanged'], [b'cfg'.ljust(104 - 8, b'\x00')])
+
+    def test_elec_ids(self):
+        nev = brpylib.NevFile(self.filename)
+        data = nev.getdata(elec_ids=[9])
+        nev.close()
+
+        self.assertEqual(list(data.keys()), ['spike_events'])
+        self.assertEqual(data['spike_events']['ChannelID'], [9])
+        self.assertEqual(len(data['spike_events']['TimeStamps'][0]), len([s for s in self.spikes if s[1] == 9]))
+
+
+class MockConnection(cerelink.Connection):
+    """Connection which is never opened, so is not closed when deleted"""
+    def __del__(self):
+        pass
+
+class TestCerelink(unittest.TestCase):
+    def setUp(self):
+        self.cbpy = getattr(cerelink, 'cbpy', None)
+        cerelink.cbpy = MockCbpy(channels=[1, 2, 3], rate=2000., samples_per_call=300)
+
+    def tearDown(self):
+        cerelink.cbpy = self.cbpy
+
+    def make_connection(self):
+        conn = MockConnection()
+        conn._init = True
+        conn.start_data()
+        return conn
+
+    def test_trial_to_events(self):
+        conn = self.make_connection()
+        trial = [[1, {'timestamps': [[5, 9], [], [7]]}], [4, {'timestamps': [[], [3, 4, 8]]}]]
+        events = conn.trial_to_events(trial, 1.5)
+        self.assertEqual(events.tolist(), [(1, 10, 5, 1.5), (1, 10, 9, 1.5), (1, 2, 7, 1.5),
+            (4, 1, 3, 1.5), (4, 1, 4, 1.5), (4, 1, 8, 1.5)])
+        self.assertEqual(len(conn.trial_to_events([[1, {'timestamps': [[], []]}]], 1.5)), 0)
+
+        # get_event_data yields the same spikes one at a time
+        batch = next(conn.get_event_data_batches())
+        self.assertTrue(len(batch) > 0)
+        cerelink.cbpy.random.seed(0)
+        cerelink.cbpy.sample = 0
+        gen = conn.get_event_data()
+        data = [next(gen) for _ in range(len(batch))]
+        self.assertEqual([(d.chan, d.unit, d.ts) for d in data], batch[['chan', 'unit', 'ts']].tolist())
+
+    def test_spikes_get_many(self):
+        spikes = blackrock.Spikes.__new__(blackrock.Spikes)
+        spikes.conn = self.make_connection()
+        spikes.start()
+
+        data = spikes.get_many()
+        self.assertEqual(data.dtype, spikes.dtype)
+        self.assertTrue(len(data) > 0)
+        self.assertTrue(np.all(data['ts'] < 300 / spikes.update_freq))
+        self.assertTrue(set(data['unit']) <= set([1, 2, 3, 4, 5, 10]))
+
+        spike = spikes.get()
+        self.assertEqual(spike.shape, (1,))
+        self.assertTrue(spike['ts'][0] >= 300 / spikes.update_freq)
+
+
+if __name__ == '__main__':
+    unittest.main()
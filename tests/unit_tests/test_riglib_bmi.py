@@ -70,10 +70,68 @@ class TestKalmanFilter(unittest.TestCase):
         self.assertTrue(np.abs(A[1, 1] - 1) < tol) # offset "state"
         self.assertTrue(np.all(W < tol))
 
+    def test_kf_fast_path_matches_matrix(self):
+        """ndarray forward step shall match the np.matrix reference, including after switching to steady-state gains"""
+        np.random.seed(0)
+        n_units = 50
+        A = np.mat(np.diag([0.9, 0.9, 0.9, 1.0]))
+        W = np.mat(np.diag([0.5, 0.5, 0.5, 0]))
+        C = np.mat(np.random.randn(n_units, 4))
+        Q = np.mat(np.diag(np.random.rand(n_units) + 1))
+        kf_fast = KalmanFilter(A, W, C, Q)
+        kf_ref = KalmanFilter(A, W, C, Q)
+        kf_ref.use_fast_path = False
+        kf_fast._init_state()
+        kf_ref._init_state()
+
+        Bu = np.mat([0.1, 0, -0.1, 0]).reshape(-1,1)
+        for k in range(200):
+            y = np.mat(np.random.randn(n_units, 1))
+            kwargs = dict(Bu=Bu) if k % 10 == 0 else dict()
+            kf_fast(y, **kwargs)
+            kf_ref(y, **kwargs)
+            self.assertTrue(np.allclose(kf_fast.state.mean, kf_ref.state.mean, atol=1e-10))
+            self.assertTrue(np.allclose(kf_fast.state.cov, kf_ref.state.cov, atol=1e-10))
+        self.assertIsNotNone(kf_fast._ss_gains)
+
+        # replacing a parameter (e.g., a CLDA update) discards the steady-state gains
+        kf_fast.C_xpose_Q_inv = 2*kf_fast.C_xpose_Q_inv
+        kf_ref.C_xpose_Q_inv = 2*kf_ref.C_xpose_Q_inv
+        y = np.mat(np.random.randn(n_units, 1))
+        kf_fast(y)
+        kf_ref(y)
+        self.assertTrue(np.allclose(kf_fast.state.mean, kf_ref.state.mean, atol=1e-10))
+
+    def test_sskf_matches_riccati_recursion(self):
+        """Steady-state KF from the DARE shall match iterating the Riccati recursion, and be memoized"""
+        np.random.seed(0)
+        n_units = 30
+        A = np.mat(np.eye(5))
+        A[0:2, 2:4] = 0.1*np.eye(2)
+        A[2:4, 2:4] = 0.8*np.eye(2)
+        W = np.mat(np.diag([0, 0, 0.01, 0.01, 0]))
+        C = np.mat(np.zeros((n_units, 5)))
+        C[:, 2:5] = np.random.randn(n_units, 3)
+        Q = np.mat(np.diag(np.random.rand(n_units) + 1))
+        kf = KalmanFilter(A, W, C, Q)
+
+        F, K, P = kf.get_sskf(return_P=True)
+        F_iter, K_iter, P_iter, K_hist = kf._iterate_sskf()
+        self.assertTrue(np.allclose(F, F_iter, atol=1e-12))
+        self.assertTrue(np.allclose(K, K_iter, atol=1e-12))
+        # the covariance of the unobserved position states grows without bound
+        self.assertTrue(np.allclose(P[2:,2:], P_iter[2:,2:], atol=1e-12))
+
+        # results are shared between filters with the same parameters but can't be modified by the caller
+        F[:] = 0
+        F2, K2 = KalmanFilter(A, W, C, Q).get_sskf()
+        self.assertTrue(np.allclose(F2, F_iter, atol=1e-12))
+
 
 ###############################################################################
 ## Kalman filter decoder ######################################################
-from riglib.bmi.kfdecoder import KFDecoder
+from riglib.bmi.kfdecoder import KFDecoder, linear_recurrence
+from riglib.bmi import state_space_models
 from riglib.bmi.state_space_models import State, StateSpace
 
 class TestKFDecoder(unittest.TestCase):
@@ -105,6 +163,130 @@ class TestKFDecoder(unittest.TestCase):
         self.assertTrue(np.abs(x_t_est[0] - y*K_expected*(-1)) < tol)
         self.assertTrue(np.abs(x_t_est[1] - y*K_expected*(1)) < tol)
 
+    def test_kfdecoder_decode_batch(self):
+        """Batch decoding shall match sequential decoding, before and after the gain reaches steady state"""
+        np.random.seed(0)
+        ssm = state_space_models.StateSpaceEndptVel2D()
+        A, B, W = ssm.get_ssm_matrices()
+        n_units = 20
+        C = np.mat(np.zeros((n_units, 7)))
+        C[:, [3, 5, 6]] = np.random.randn(n_units, 3)
+        Q = np.mat(np.diag(np.random.rand(n_units) + 1))
+        units = [(k, 1) for k in range(n_units)]
+        obs = np.random.poisson(2, (300, n_units))
+
+        dec_seq = KFDecoder(KalmanFilter(A, W, C, Q, is_stochastic=ssm.is_stochastic), units, ssm)
+        dec_batch = KFDecoder(KalmanFilter(A, W, C, Q, is_stochastic=ssm.is_stochastic), units, ssm)
+        expected = np.vstack([dec_seq.predict(y) for y in obs])
+        decoded = dec_batch.decode_batch(obs[:150])
+        decoded = np.vstack([decoded, dec_batch.decode_batch(obs[150:])])
+
+        self.assertTrue(np.allclose(decoded, expected, atol=1e-8))
+        self.assertTrue(np.allclose(dec_batch.filt.get_mean(), dec_seq.filt.get_mean(), atol=1e-8))
+
+    def test_linear_recurrence(self):
+        """Steady-state recurrence shall match direct iteration for both diagonalizable and defective systems"""
+        np.random.seed(0)
+        U = np.random.randn(100, 3)
+        x0 = np.random.randn(3)
+        for F in [np.diag([0.9, 0.5, 1.0]), np.array([[1, 0.1, 0], [0, 0.8, 0.2], [0, 0, 1]])]:
+            expected = np.empty_like(U)
+            x = x0
+            for t in range(U.shape[0]):
+                x = np.dot(F, x) + U[t]
+                expected[t] = x
+            self.assertTrue(np.allclose(linear_recurrence(F, U, x0), expected))
+
+###############################################################################
+## Point-process filter #######################################################
+from riglib.bmi.ppfdecoder import PointProcessFilter
+
+class TestPointProcessFilter(unittest.TestCase):
+    def test_ppf_fast_path_matches_matrix(self):
+        """ndarray forward step shall match the np.matrix reference"""
+        np.random.seed(0)
+        n_units = 40
+        A = np.mat(np.eye(5))
+        A[0:2, 2:4] = 0.005*np.eye(2)
+        A[2:4, 2:4] = np.array([[0.8, 0.05], [0, 0.8]])
+        W = np.mat(np.diag([0, 0, 0.01, 0.02, 0]))
+        C = np.mat(np.hstack([np.zeros((n_units, 2)), np.random.randn(n_units, 2), np.log(np.random.rand(n_units, 1)*0.02 + 0.005)]))
+        is_stochastic = [False, False, True, True, False]
+        ppf_fast = PointProcessFilter(A, W, C, dt=0.005, is_stochastic=is_stochastic)
+        ppf_ref = PointProcessFilter(A, W, C, dt=0.005, is_stochastic=is_stochastic)
+        ppf_ref.use_fast_path = False
+        for ppf in [ppf_fast, ppf_ref]:
+            ppf._init_state(init_state=np.mat([0, 0, 0, 0, 1]).T, init_cov=np.mat(np.diag([0, 0, 0.1, 0.1, 0])))
+
+        Bu = np.mat([0, 0, 0.01, -0.01, 0]).reshape(-1,1)
+        for k in range(200):
+            y = np.mat(np.random.rand(n_units, 1) < 0.03).astype(float)
+            kwargs = dict(Bu=Bu) if k % 10 == 0 else dict()
+            ppf_fast(y, **kwargs)
+            ppf_ref(y, **kwargs)
+            self.assertTrue(np.allclose(ppf_fast.state.mean, ppf_ref.state.mean, atol=1e-10))
+            self.assertTrue(np.allclose(ppf_fast.state.cov, ppf_ref.state.cov, atol=1e-10))
+            self.assertTrue(np.allclose(ppf_fast.neural_push, ppf_ref.neural_push, atol=1e-10))
+
+    def test_ppf_fast_path_ill_conditioned_covariance(self):
+        """ndarray forward step shall skip the covariance update on the same bins as the np.matrix reference"""
+        np.random.seed(0)
+        n_units = 40
+        A = np.mat(np.eye(5))
+        A[0:2, 2:4] = 0.005*np.eye(2)
+        A[2:4, 2:4] = np.array([[0.8, 0], [0, 0.8]])
+        # no process noise for the y velocity, so its variance decays until P_pred becomes ill-conditioned
+        W = np.mat(np.diag([0, 0, 0.01, 0, 0]))
+        C = np.mat(np.hstack([np.zeros((n_units, 2)), np.random.randn(n_units, 2), np.log(np.random.rand(n_units, 1)*0.02 + 0.005)]))
+        is_stochastic = [False, False, True, True, False]
+        ppf_fast = PointProcessFilter(A, W, C, dt=0.005, is_stochastic=is_stochastic)
+        ppf_ref = PointProcessFilter(A, W, C, dt=0.005, is_stochastic=is_stochastic)
+        ppf_ref.use_fast_path = False
+        for ppf in [ppf_fast, ppf_ref]:
+            ppf._init_state(init_state=np.mat([0, 0, 0, 0, 1]).T, init_cov=np.mat(np.diag([0, 0, 0.1, 0.1, 0])))
+
+        cond = []
+        for k in range(100):
+            y = np.mat(np.random.rand(n_units, 1) < 0.03).astype(float)
+            cond.append(np.linalg.cond((A*ppf_ref.state.cov*A.T + W)[2:4, 2:4]))
+            ppf_fast(y)
+            ppf_ref(y)
+            self.assertTrue(np.allclose(ppf_fast.state.mean, ppf_ref.state.mean, atol=1e-10))
+            self.assertTrue(np.allclose(ppf_fast.state.cov, ppf_ref.state.cov, atol=1e-10))
+
+        # the covariance should have become ill-conditioned partway through the run
+        self.assertTrue(cond[0] < 1e5 < cond[-1])
+
+
+###############################################################################
+## Feedback controllers #######################################################
+from riglib.bmi.feedback_controllers import LQRController
+
+class TestLQRController(unittest.TestCase):
+    def test_dlqr_matches_riccati_recursion(self):
+        """Infinite-horizon LQR gain from the DARE shall match iterating the Riccati recursion"""
+        A = np.mat(np.eye(5))
+        A[0:2, 2:4] = 0.1*np.eye(2)
+        A[2:4, 2:4] = 0.8*np.eye(2)
+        B = np.mat(np.vstack([np.zeros((2, 2)), 0.1*np.eye(2), np.zeros((1, 2))]))
+        Q = np.mat(np.diag([7, 7, 0, 0, 0]))
+        R = np.mat(np.eye(2))
+
+        P = Q
+        K = np.inf
+        for t in range(10000):
+            K_old = K
+            K = (R + B.T*P*B).I * B.T*P*A
+            P = Q + A.T*P*A - A.T*P*B*K
+            if np.linalg.norm(K - K_old) < 1e-14:
+                break
+
+        F = LQRController.dlqr(A, B, Q, R)
+        self.assertIsInstance(F, np.matrix)
+        self.assertTrue(np.allclose(F, K, atol=1e-10))
+        self.assertTrue(np.allclose(LQRController.dlqr(np.array(A), np.array(B), np.array(Q), np.array(R), dtype=np.array), K, atol=1e-10))
+
+
 ###############################################################################
 ## Accumulators ###############################################################
 from riglib.bmi import accumulator
@@ -199,5 +381,384 @@ class TestZeroVelocityGoal(unittest.TestCase):
 
         self.assertTrue(np.array_equal(goal_state.ravel(), np.array([0, 0, 0, 0, 0, 0, 1])))
 
+###############################################################################
+## Feature extractors #########################################################
+from riglib.bmi.extractor import BinnedSpikeCountsExtractor, LFPMTMPowerExtractor, FastLFPMTMPowerExtractor, StreamingLFPButterBPFPowerExtractor
+from riglib.bmi.extractor import LFPButterBPFPowerExtractor, extract_windowed_features, get_mtm_lfp_power
+from riglib.bmi.extractor import get_streaming_butter_bpf_lfp_power
+from scipy.signal import butter, sosfilt
+from riglib.bmi import sim_neurons
+
+class MockSpikeSource(object):
+    def __init__(self, ts):
+        self.ts = ts
+
+    def get(self):
+        return self.ts
+
+class TestBinnedSpikeCountsExtractor(unittest.TestCase):
+    def make_spikes(self, n_spikes):
+        np.random.seed(0)
+        ts = np.zeros(n_spikes, dtype=sim_neurons.ts_dtype_new)
+        ts['chan'] = np.random.randint(-1, 40, n_spikes)
+        ts['unit'] = np.random.randint(0, 16, n_spikes)
+        ts['arrival_ts'] = np.random.rand(n_spikes)
+        ts['ts'] = ts['arrival_ts']
+        return ts
+
+    def test_subbin_counts(self):
+        """Spike counts in each subbin shall match a direct count for each (channel, unit)"""
+        ts = self.make_spikes(5000)
+        units = np.array([(1, 1), (3, 0), (3, 14), (17, 2), (39, 15), (50, 1)])
+        n_subbins = 3
+        extractor = BinnedSpikeCountsExtractor(MockSpikeSource(ts), n_subbins=n_subbins, units=units)
+        extractor.last_get_spike_counts_time = 0.2
+        counts = extractor(0.8)['spike_counts']
+
+        self.assertEqual(counts.shape, (len(units), n_subbins))
+        subbin_edges = np.linspace(0.2, 0.8, n_subbins+1)
+        subbin_edges[0] -= 1
+        for k, (chan, unit) in enumerate(units):
+            for m in range(n_subbins):
+                spikes = (ts['chan'] == chan) & (ts['unit'] == unit) & \
+                    (ts['arrival_ts'] >= subbin_edges[m]) & (ts['arrival_ts'] < subbin_edges[m+1])
+                self.assertEqual(counts[k, m], np.sum(spikes))
+
+    def test_bin_spikes(self):
+        ts = self.make_spikes(1000)
+        units = np.array([(2, 1), (5, 3)])
+        counts = BinnedSpikeCountsExtractor.bin_spikes(ts, units)
+        for k, (chan, unit) in enumerate(units):
+            self.assertEqual(counts[k], np.sum((ts['chan'] == chan) & (ts['unit'] == unit)))
+
+    def test_bin_spike_times(self):
+        """Single-pass binning of all units shall match np.histogram of each unit"""
+        ts = self.make_spikes(5000)
+        units = np.array([(1, 1), (3, 0), (39, 15), (50, 1)])
+        bin_edges = np.hstack([np.linspace(0.1, 0.9, 17), ts['ts'].max()])
+        counts = BinnedSpikeCountsExtractor.bin_spike_times(ts['ts'], ts['chan'], ts['unit'], units, bin_edges)
+
+        self.assertEqual(counts.shape, (len(bin_edges) - 1, len(units)))
+        for k, (chan, unit) in enumerate(units):
+            unit_ts = ts['ts'][(ts['chan'] == chan) & (ts['unit'] == unit)]
+            self.assertTrue(np.array_equal(counts[:, k], np.histogram(unit_ts, bin_edges)[0]))
+
+    def test_extract_from_nev(self):
+        import tempfile, os
+        from test_riglib_blackrock import write_nev, spike_packet
+        np.random.seed(0)
+        spikes = [(30*k, np.random.choice([1, 2]), np.random.choice([0, 1, 255])) for k in range(10000)]
+        with tempfile.TemporaryDirectory() as tmpdir:
+            nev_fname = os.path.join(tmpdir, 'test.nev')
+            write_nev(nev_fname, [1, 2], [spike_packet(t, c, u, np.zeros(48)) for t, c, u in spikes])
+
+            units = np.array([(1, 1), (1, 10), (2, 1), (2, 10), (2, 3)])
+            neurows = np.arange(0, 10, 1./60)
+            counts, used_units, _ = BinnedSpikeCountsExtractor.extract_from_file({'blackrock': [nev_fname]}, 
+                neurows, 0.1, units, {})
+
+        # unsorted spikes are unit 10, noise is dropped, and units which never fire are discarded
+        self.assertTrue(np.array_equal(used_units, units[:4]))
+        bin_edges = np.hstack([neurows[0] - 6, neurows[::6]])
+        for k, (chan, unit) in enumerate(used_units):
+            unit_ts = [t/30000. for t, c, u in spikes if c == chan and {0: 10}.get(u, u) == unit]
+            self.assertTrue(np.array_equal(counts[:, k], np.histogram(unit_ts, bin_edges)[0]))
+
+class TestFastLFPMTMPowerExtractor(unittest.TestCase):
+    def test_matches_multitaper_psd(self):
+        """Band powers from the precomputed tapers shall match LFPMTMPowerExtractor"""
+        np.random.seed(0)
+        bands = [(10, 20), (20, 40), (40, 80), (80, 150), (150, 200)]
+        channels = list(range(1, 9))
+        for kwargs in [dict(), dict(no_log=True), dict(no_mean=True)]:
+            f_extractor = LFPMTMPowerExtractor(None, channels=channels, bands=bands, fs=1000, **kwargs)
+            f_extractor_fast = FastLFPMTMPowerExtractor(None, channels=channels, bands=bands, fs=1000, **kwargs)
+            for k in range(3):
+                cont_samples = 50*np.random.randn(len(channels), f_extractor.n_pts)
+                lfp_power = f_extractor.extract_features(cont_samples)
+                lfp_power_fast = f_extractor_fast.extract_features(cont_samples)
+                self.assertEqual(lfp_power_fast.shape, lfp_power.shape)
+                self.assertTrue(np.allclose(lfp_power_fast, lfp_power, rtol=1e-10, atol=0))
+
+        # windows of a different length are passed to tsa.multi_taper_psd
+        cont_samples = np.random.randn(len(channels), f_extractor.n_pts - 10)
+        self.assertTrue(np.allclose(f_extractor_fast.extract_features(cont_samples), f_extractor.extract_features(cont_samples)))
+
+
+class TestStreamingLFPButterBPFPowerExtractor(unittest.TestCase):
+    def test_matches_filtered_window_power(self):
+        """Streaming band power shall equal the windowed power of the continuously filtered signal"""
+        np.random.seed(0)
+        bands = [(1, 4), (10, 20), (80, 150)]
+        channels = [1, 2, 3]
+        f_extractor = StreamingLFPButterBPFPowerExtractor(None, channels=channels, bands=bands, fs=1000)
+        n_pts = f_extractor.n_pts
+
+        lfp = 50*np.random.randn(len(channels), 3000)
+        sq = np.array([sosfilt(butter(5, [b[0]/500., b[1]/500.], btype='band', output='sos'), lfp, axis=1)**2 for b in bands])
+
+        pos = np.zeros(len(channels), dtype=int)
+        for k, n_new in enumerate([0, 17, 150, 33, 250, 1, 100, 100, 480, 60, 50]):
+            if k < 3:
+                lfp_power = f_extractor.extract_features(lfp[:, pos[0]:pos[0]+n_new])
+                pos += n_new
+            else:
+                # the channels don't all have the same number of new samples
+                n_chan_new = [n_new, max(n_new - 5*(k % 2), 0), n_new + k % 3]
+                lfp_power = f_extractor.extract_features([lfp[c, pos[c]:pos[c]+n] for c, n in enumerate(n_chan_new)])
+                pos += n_chan_new
+            t = pos.min()
+
+            power = sq[:, :, max(t - n_pts, 0):t].sum(axis=2) / n_pts
+            self.assertTrue(np.allclose(lfp_power, np.log(power + f_extractor.epsilon).reshape(-1, 1), rtol=1e-10))
+
+    def test_recording_matches_streaming(self):
+        """Training features for a recording shall match the features computed while streaming it"""
+        np.random.seed(0)
+        bands = [(1, 4), (10, 20), (80, 150)]
+        channels = [1, 2, 3]
+        lfp = 50*np.random.randn(3000, len(channels))
+
+        f_extractor = StreamingLFPButterBPFPowerExtractor(None, channels=channels, bands=bands, fs=1000)
+        sample_nums = np.cumsum([0, 17, 150, 33, 250, 1, 100, 100, 480, 60, 50, 1759])
+        streamed = []
+        for start, stop in zip(np.hstack([0, sample_nums[:-1]]), sample_nums):
+            streamed.append(f_extractor.extract_features(lfp[start:stop].T).ravel())
+
+        f_extractor = StreamingLFPButterBPFPowerExtractor(None, channels=channels, bands=bands, fs=1000)
+        features = f_extractor.extract_features_recording(lfp, np.hstack([sample_nums, 3500]), block_len=300)
+        self.assertTrue(np.allclose(features[:-1], np.vstack(streamed), rtol=1e-10))
+        self.assertTrue(np.allclose(features[-1], streamed[-1], rtol=1e-10))
+        self.assertRaises(NotImplementedError, f_extractor.extract_features_batch, np.zeros((1, 3, 200)))
+
+    def test_unconfigured_channel(self):
+        """Channels which the source does not collect shall raise an error"""
+        class MockSource(object):
+            def get_new(self, channels):
+                return [np.zeros(5) if chan != 3 else None for chan in channels]
+        f_extractor = StreamingLFPButterBPFPowerExtractor(None, channels=[1, 2, 3], bands=[(10, 20)], fs=1000)
+        f_extractor.source = MockSource()
+        self.assertRaises(ValueError, f_extractor.get_cont_samples)
+
+
+class MockPlexonLFP(object):
+    def __init__(self, data):
+        self.data = data
+
+    def __getitem__(self, idx):
+        return MockPlexonLFP(self.data[idx])
+
+class MockPlexonFile(object):
+    def __init__(self, lfp):
+        self.lfp = MockPlexonLFP(lfp)
+
+class TestWindowedLFPFeatures(unittest.TestCase):
+    def test_batch_matches_single_windows(self):
+        """Batched features for windows of a recording shall match extracting the features of each window"""
+        np.random.seed(0)
+        bands = [(10, 20), (20, 40), (80, 150)]
+        channels = [1, 2, 3, 4]
+        lfp = 50*np.random.randn(5000, len(channels))
+        sample_nums = np.hstack([100, np.sort(np.random.randint(200, 5000, 40)), 5100])
+
+        for f_extractor in [FastLFPMTMPowerExtractor(None, channels=channels, bands=bands, fs=1000), 
+                            LFPButterBPFPowerExtractor(None, channels=channels, bands=bands, fs=1000)]:
+            for n_workers in [1, 2]:
+                features, valid = extract_windowed_features(f_extractor, lfp, sample_nums, chunk_size=7, n_workers=n_workers)
+                self.assertTrue(np.array_equal(valid, (sample_nums >= 200) & (sample_nums <= 5000)))
+                self.assertTrue(np.all(features[~valid] == 0))
+                for i in np.nonzero(valid)[0]:
+                    cont_samples = lfp[sample_nums[i]-200:sample_nums[i], :].T
+                    self.assertTrue(np.allclose(features[i], f_extractor.extract_features(cont_samples).ravel(), rtol=1e-10))
+
+    def test_get_mtm_lfp_power(self):
+        """Training features shall match LFPMTMPowerExtractor for each bin, including bins at the end of the recording"""
+        np.random.seed(0)
+        extractor_kwargs = dict(channels=np.array([1, 3]), bands=[(10, 20), (20, 40)], fs=1000)
+        lfp = 50*np.random.randn(3000, 4)
+        neurows = np.arange(0.25, 3.05, 1./60)
+        lfp_power, units, _ = get_mtm_lfp_power(MockPlexonFile(lfp), neurows, 0.1, None, extractor_kwargs)
+
+        f_extractor = LFPMTMPowerExtractor(None, **extractor_kwargs)
+        for i, t in enumerate(neurows[::6]):
+            sample_num = int(t * 1000)
+            cont_samples = lfp[sample_num-200:sample_num, [0, 2]].T
+            self.assertTrue(np.allclose(lfp_power[i], f_extractor.extract_features(cont_samples).ravel(), rtol=1e-10))
+
+    def test_get_streaming_butter_bpf_lfp_power(self):
+        """Training features shall be the streaming features of the recording from its start"""
+        np.random.seed(0)
+        extractor_kwargs = dict(channels=np.array([1, 3]), bands=[(10, 20), (20, 40)], fs=1000)
+        lfp = 50*np.random.randn(3000, 4)
+        neurows = np.arange(0.25, 3.05, 1./60)
+        lfp_power, units, _ = get_streaming_butter_bpf_lfp_power(MockPlexonFile(lfp), neurows, 0.1, None, extractor_kwargs)
+
+        f_extractor = StreamingLFPButterBPFPowerExtractor(None, **extractor_kwargs)
+        sample_num = 0
+        for i, t in enumerate(neurows[::6]):
+            features = f_extractor.extract_features(lfp[sample_num:int(t * 1000), [0, 2]].T)
+            sample_num = max(sample_num, int(t * 1000))
+            self.assertTrue(np.allclose(lfp_power[i], features.ravel(), rtol=1e-10))
+
+
+###############################################################################
+## Point-process simulation ###################################################
+class TestPointProcessEnsemble(unittest.TestCase):
+    def test_matches_single_point_process(self):
+        """Vectorized ensemble shall produce the same spikes as simulating each unit separately"""
+        np.random.seed(0)
+        n_units, T, dt = 5, 400, 0.005
+        beta = np.vstack([np.zeros(n_units), np.log(np.linspace(10, 50, n_units)*dt)]).T
+        X = np.tile([0.3, 1.], (T, 1)) # constant rate, so the rate integral is exact either way
+        tau_samples = [list(np.log(1 - np.random.rand(200))) for k in range(n_units)]
+
+        ensemble = sim_neurons.PointProcessEnsemble(beta, dt, init_state=X[0], 
+            tau_samples=[list(x) for x in tau_samples])
+        counts = ensemble.sim_batch(X[1:])
+
+        for k in range(n_units):
+            point_proc = sim_neurons.PointProcess(beta[k], dt, tau_samples=list(tau_samples[k]))
+            point_proc._init_sampling(X[0])
+            expected = [point_proc(x) for x in X[1:]]
+            self.assertTrue(np.array_equal(counts[:,k], expected))
+
+    def test_firing_rate(self):
+        """Simulated firing rates shall match the rates implied by beta"""
+        np.random.seed(0)
+        rates = np.array([5., 20., 60.])
+        dt = 0.001
+        beta = np.vstack([np.zeros(3), np.log(rates*dt)]).T
+        ensemble = sim_neurons.PointProcessEnsemble(beta, dt)
+        T = 100000
+        counts = ensemble.sim_batch(np.tile([0., 1.], (T, 1)))
+        self.assertTrue(np.allclose(counts.sum(axis=0) / (T*dt), rates, rtol=0.1))
+
+    def test_clda_sim_timestamps(self):
+        np.random.seed(0)
+        beta = np.vstack([np.zeros(10), np.ones(10)*np.log(30./180)]).T
+        ensemble = sim_neurons.CLDASimPointProcessEnsemble(beta, 1./180)
+        ts = np.hstack([ensemble([0., 1.]) for k in range(60)])
+        self.assertTrue(np.all(np.diff(ts['ts']) >= 0))
+        self.assertTrue(np.all(ts['chan'] < 10))
+        self.assertTrue(100 < len(ts) < 500)
+
+###############################################################################
+## CLDA updaters ##############################################################
+from riglib.bmi import clda
+import time
+
+class ScaleUpdater(clda.Updater):
+    def __init__(self, **kwargs):
+        super(ScaleUpdater, self).__init__(self.calc, **kwargs)
+        self.C = np.mat(np.eye(3))
+
+    def calc(self, scale=1, n_units=3):
+        self.C = np.mat(np.eye(n_units)) * scale
+        return {'filt.C': self.C, 'kf.ESS': float(scale)}
+
+class TestUpdater(unittest.TestCase):
+    def wait_for_result(self, updater, timeout=2.):
+        t_start = time.perf_counter()
+        while time.perf_counter() - t_start < timeout:
+            result = updater.get_result()
+            if result is not None:
+                return result, time.perf_counter() - t_start
+            time.sleep(0.001)
+        self.fail("timed out waiting for updater")
+
+    def test_single_process_result_is_copied(self):
+        updater = ScaleUpdater()
+        updater(scale=2)
+        params = updater.get_result()
+        self.assertIsNone(updater.get_result())
+        updater.C[0,0] = 0
+        self.assertEqual(params['filt.C'][0,0], 2)
+
+    def test_shared_params(self):
+        updater = ScaleUpdater(multiproc=True, shared_params=True)
+        self.assertIsNone(updater.get_result())
+        hist = []
+        for scale, n_units in [(2, 3), (3, 3), (4, 3), (5, 4)]:
+            updater(scale=scale, n_units=n_units)
+            params, latency = self.wait_for_result(updater)
+            self.assertLess(latency, 0.5)
+            self.assertIsInstance(params['filt.C'], np.matrix)
+            self.assertTrue(np.array_equal(params['filt.C'], np.eye(n_units)*scale))
+            self.assertEqual(params['kf.ESS'], scale)
+            hist.append(params)
+
+        # views into the buffer used before the layout changed stay valid
+        self.assertTrue(np.array_equal(hist[2]['filt.C'], np.eye(3)*4))
+
+        # buffers are reused, but the history is recovered from the worker
+        result_hist = updater.get_result_history()
+        self.assertEqual(len(result_hist), 4)
+        for scale, params in zip([2, 3, 4, 5], result_hist):
+            self.assertEqual(params['filt.C'][0,0], scale)
+        updater.calculator.stop()
+        updater.calculator.join(2)
+        self.assertFalse(updater.calculator.is_alive())
+
+def make_rml_decoder(n_units, n_samples=2000):
+    """KF decoder with RML sufficient statistics computed from simulated training data"""
+    ssm = state_space_models.StateSpaceEndptVel2D()
+    A, B, W = ssm.get_ssm_matrices()
+    kin = np.random.randn(ssm.n_states, n_samples)
+    kin[-1] = 1
+    C = np.mat(np.zeros((n_units, ssm.n_states)))
+    C[:, ssm.drives_obs_inds] = np.random.randn(n_units, len(ssm.drives_obs_inds))
+    obs = np.asarray(C * kin) + np.random.randn(n_units, n_samples)
+
+    C[:, ssm.drives_obs_inds], Q = KalmanFilter.MLE_obs_model(kin[ssm.train_inds, :], obs)
+    decoder = KFDecoder(KalmanFilter(A, W, C, Q, is_stochastic=ssm.is_stochastic), [(k, 1) for k in range(n_units)], ssm)
+    R_small, S_small, T, ESS = clda.KFRML.compute_suff_stats(kin[ssm.train_inds, :], obs)
+    decoder.filt.R = np.mat(np.zeros([ssm.n_states, ssm.n_states]))
+    decoder.filt.S = np.mat(np.zeros([n_units, ssm.n_states]))
+    decoder.filt.R[np.ix_(ssm.drives_obs_inds, ssm.drives_obs_inds)] = R_small
+    decoder.filt.S[:, ssm.drives_obs_inds] = S_small
+    decoder.filt.T = T
+    decoder.filt.ESS = ESS
+    return decoder, C
+
+class TestKFRML(unittest.TestCase):
+    def test_woodbury_matches_kfrml(self):
+        """Incremental RML update shall match the pseudo-inverse update, with and without sample weights"""
+        np.random.seed(0)
+        import copy
+        decoder, C = make_rml_decoder(30)
+        updaters = [clda.KFRML(1., 10.), clda.KFRML_Woodbury(1., 10., refresh_interval=3)]
+        for updater in updaters:
+            updater.init(copy.deepcopy(decoder))
+
+        for k in range(8):
+            kin = np.random.randn(7, 10)
+            kin[-1] = 1
+            obs = np.asarray(C * kin) + np.random.randn(30, 10)
+            values = np.random.rand(10) if k % 2 else None
+            params = [updater.calc(intended_kin=kin, spike_counts=obs, decoder=decoder, values=values) for updater in updaters]
+            for key in ['filt.C', 'filt.Q', 'filt.C_xpose_Q_inv', 'filt.C_xpose_Q_inv_C']:
+                self.assertTrue(np.allclose(params[0][key], params[1][key], atol=1e-8), key)
+        self.assertIsNotNone(updaters[1]._M_inv)
+
+    def test_woodbury_negative_weights(self):
+        """Negatively weighted samples shall not be dropped from the incremental update"""
+        np.random.seed(1)
+        import copy
+        decoder, C = make_rml_decoder(30)
+        updaters = [clda.KFRML(1., 10.), clda.KFRML_Woodbury(1., 10., refresh_interval=100)]
+        for updater in updaters:
+            updater.init(copy.deepcopy(decoder))
+
+        for k in range(6):
+            kin = np.random.randn(7, 10)
+            kin[-1] = 1
+            obs = np.asarray(C * kin) + np.random.randn(30, 10)
+            values = np.random.rand(10)
+            if k == 2:
+                values[:3] = -0.2
+            params = [updater.calc(intended_kin=kin, spike_counts=obs, decoder=decoder, values=values) for updater in updaters]
+            for key in ['filt.C', 'filt.Q', 'filt.C_xpose_Q_inv', 'filt.C_xpose_Q_inv_C']:
+                self.assertTrue(np.allclose(params[0][key], params[1][key], atol=1e-8), key)
+
 if __name__ == '__main__':
     unittest.main()
\ No newline at end of file
@@ -0,0 +1,109 @@
+import unittest
+import struct
+import numpy as np
+
+from riglib.plexon import plexon
+from riglib.plexon.plexon import plexnet
+
+def data_packet(records, num_server_dropped=0, num_mmf_dropped=0):
+    """Pack (type, ts, chan, unit, waveform) records into a plexnet data packet"""
+    packet = struct.pack('4i', 1, 0, num_server_dropped, num_mmf_dropped)
+    for rec_type, ts, chan, unit, waveform in records:
+        nwave, nword = (0, 0) if waveform is None else (1, len(waveform))
+        packet += struct.pack('hHI4h', rec_type, ts >> 32, ts & 0xffffffff, chan, unit, nwave, nword)
+        if waveform is not None:
+            packet += np.asarray(waveform, dtype='<i2').tobytes()
+    assert len(packet) <= plexnet.PACKETSIZE
+    return packet.ljust(plexnet.PACKETSIZE, b'\x00')
+
+class FakeSocket(object):
+    """Socket which returns the queued packets in chunks of at most 'chunk' bytes"""
+    def __init__(self, packets, chunk=100):
+        self.data = b''.join(packets)
+        self.chunk = chunk
+        self.pos = 0
+
+    def recv_into(self, buf, nbytes):
+        n = min(nbytes, self.chunk, len(self.data) - self.pos)
+        buf[:n] = self.data[self.pos:self.pos + n]
+        self.pos += n
+        return n
+
+class FakeConnection(plexnet.Connection):
+    """Connection to a FakeSocket, which is never connected to a server"""
+    def __del__(self):
+        pass
+
+def make_connection(packets):
+    conn = FakeConnection.__new__(FakeConnection)
+    conn.sock = FakeSocket(packets)
+    conn.num_server_dropped = 0
+    conn.num_mmf_dropped = 0
+    conn._buf = bytearray(plexnet.PACKETSIZE)
+    conn._view = memoryview(conn._buf)
+    conn._init = True
+    conn.streaming = True
+    return conn
+
+def take(gen, n):
+    return [next(gen) for _ in range(n)]
+
+
+class TestPlexnetConnection(unittest.TestCase):
+    def setUp(self):
+        spikes = [(1, (3 << 32) + 40*k, k % 7 + 1, k % 3, None) for k in range(30)]
+        self.packets = [
+            data_packet(spikes, num_server_dropped=2, num_mmf_dropped=1),
+            data_packet([(1, 100, 4, 1, None), (4, 150, 257, 0, None), (5, 200, 512, 0, np.arange(50)),
+                (0, 0, 0, 0, None), (5, 200, 513, 0, -np.arange(20)), (1, 300, 9, 2, None)]),
+        ]
+        self.spikes = spikes
+
+    def test_get_data(self):
+        conn = make_connection(self.packets)
+        data = take(conn.get_data(), 30 + 5)
+        self.assertEqual(conn.num_server_dropped, 0)
+
+        for d, (rec_type, ts, chan, unit, _) in zip(data[:30], self.spikes):
+            self.assertEqual((d.type, d.ts, d.chan, d.unit, d.waveform), (rec_type, ts, chan, unit, None))
+
+        self.assertEqual([(d.type, d.ts, d.chan, d.unit) for d in data[30:]],
+            [(1, 100, 4, 1), (4, 150, 257, 0), (5, 200, 513, 0), (5, 200, 514, 0), (1, 300, 9, 2)])
+        self.assertEqual(list(data[32].waveform), list(range(50)))
+        self.assertEqual(list(data[33].waveform), list(-np.arange(20)))
+
+    def test_get_data_batches(self):
+        conn = make_connection(self.packets)
+        batches = conn.get_data_batches()
+
+        batch = next(batches)
+        self.assertEqual((conn.num_server_dropped, conn.num_mmf_dropped), (2, 1))
+        self.assertEqual(batch.continuous, [])
+        self.assertTrue(np.array_equal(batch.events['ts'], [ts for _, ts, _, _, _ in self.spikes]))
+        self.assertTrue(np.array_equal(batch.events['chan'], [chan for _, _, chan, _, _ in self.spikes]))
+        self.assertTrue(np.array_equal(batch.events['unit'], [unit for _, _, _, unit, _ in self.spikes]))
+
+        batch = next(batches)
+        self.assertEqual(batch.events[['type', 'ts', 'chan', 'unit']].tolist(), [(1, 100, 4, 1), (4, 150, 257, 0), (1, 300, 9, 2)])
+        self.assertEqual([chan for chan, _ in batch.continuous], [513, 514])
+        self.assertTrue(np.array_equal(batch.continuous[0][1], np.arange(50)))
+        self.assertTrue(np.array_equal(batch.continuous[1][1], -np.arange(20)))
+
+    def test_spikes_get_many(self):
+        spikes = plexon.Spikes.__new__(plexon.Spikes)
+        spikes.conn = make_connection(self.packets)
+        spikes.data = spikes.conn.get_data_batches()
+        spikes._pending = np.zeros(0, dtype=spikes.dtype)
+
+        data = spikes.get_many()
+        self.assertEqual(data.dtype, spikes.dtype)
+        self.assertEqual(len(data), 30)
+        self.assertTrue(np.allclose(data['ts'], [ts / spikes.update_freq for _, ts, _, _, _ in self.spikes]))
+
+        # single spikes from the next packet, skipping the non-spike records
+        self.assertEqual(spikes.get()[['chan', 'unit']].tolist(), [(4, 1)])
+        self.assertEqual(spikes.get()[['chan', 'unit']].tolist(), [(9, 2)])
+
+
+if __name__ == '__main__':
+    unittest.main()
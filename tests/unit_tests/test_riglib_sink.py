@@ -105,6 +105,64 @@ class TestSink(unittest.TestCase):
 		time.sleep(1)
 		sink_manager.stop()
 
+	def test_sink_shm_transport(self):
+		s = sink.DataSink(target_class=DataSinkTarget, shm_transport=True, shm_queue_len=16)
+		s.start()
+
+		dtype = np.dtype([('value', 'int'), ('pos', 'float', (3,))])
+		s.register('system1', dtype)
+
+		# send more records than fit in the queue at once, so the producer has to wait
+		N = 100
+		data = np.zeros(N, dtype=dtype)
+		data['value'] = np.arange(N)
+		for k in range(N):
+			s.send('system1', data[k:k+1])
+
+		# unregistered systems should still go through the pipe
+		s.send('system2', 'msg')
+
+		time.sleep(1)
+		rx_systems, rx_data = s.get_sink_data()
+		rx_records = np.hstack([d for sys_name, d in zip(rx_systems, rx_data) if sys_name == 'system1'])
+		self.assertEqual(rx_records.dtype, dtype)
+		self.assertEqual(list(rx_records['value']), list(range(N)))
+		self.assertTrue('system2' in rx_systems)
+
+		s.stop()
+		s.join()
+
+
+class TestShmQueue(unittest.TestCase):
+	def setUp(self):
+		self.dtype = np.dtype([('value', 'int'), ('pos', 'float', (3,))])
+		self.queue = sink.ShmQueue(self.dtype, 4)
+
+	def tearDown(self):
+		self.queue.close(unlink=True)
+
+	def test_rejects_other_dtypes(self):
+		# data which only has the same size as the records should not be reinterpreted
+		self.assertFalse(self.queue.put(np.zeros(4, dtype='int')))
+		self.assertFalse(self.queue.put(np.zeros(1, dtype=[('other', 'int'), ('pos', 'float', (3,))])))
+		self.assertFalse(self.queue.put('msg'))
+		self.assertIsNone(self.queue.get())
+
+	def test_full_queue_drops_after_max_wait(self):
+		data = np.zeros(6, dtype=self.dtype)
+		data['value'] = np.arange(6)
+
+		t_start = time.perf_counter()
+		self.assertTrue(self.queue.put(data))
+		self.assertLess(time.perf_counter() - t_start, 10 * self.queue.max_wait)
+		self.assertEqual(self.queue.n_dropped, 2)
+		self.assertEqual(list(self.queue.get()['value']), [0, 1, 2, 3])
+
+		# once the consumer catches up there is room again
+		self.assertTrue(self.queue.put(data[:3]))
+		self.assertEqual(list(self.queue.get()['value']), [0, 1, 2])
+		self.assertEqual(self.queue.n_dropped, 2)
+
 
 if __name__ == '__main__':
 	unittest.main()
\ No newline at end of file
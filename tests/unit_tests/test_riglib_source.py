@@ -32,6 +32,50 @@ class MockDataSourceSystem3(MockDataSourceSystem):
     delay_for_get = 0.0
 
 
+class MockBatchedDataSourceSystem(MockDataSourceSystem):
+    """ Returns blocks of samples through the optional 'get_many' interface """
+    block_size = 7
+
+    def get_many(self):
+        time.sleep(self.delay_for_get)
+        values = (self.state + 1 + np.arange(self.block_size)) % 255
+        self.state = values[-1]
+        return np.array(values, dtype=self.dtype)
+
+class MockBatchedDataSourceSystem2(MockBatchedDataSourceSystem):
+    """ Same as original, but with simple built-in dtype """
+    dtype = np.dtype("float")
+
+class MockMultiChanDataSourceSystem(source.DataSourceSystem):
+    update_freq = 100
+    dtype = np.dtype('float')
+
+
+class TestMultiChanDataSource(unittest.TestCase):
+    def setUp(self):
+        self.channels = [3, 5, 7, 9]
+        self.src = source.MultiChanDataSource(MockMultiChanDataSourceSystem, bufferlen=1, 
+            channels=self.channels, send_data_to_sink_manager=True, supp_file='')
+        n_chan, max_len = self.src.data.shape
+        self.src.data[:] = np.arange(n_chan)[:, np.newaxis] * 1000 + np.arange(max_len)
+
+    def test_get_with_wraparound(self):
+        self.src.idxs_view[:] = [50, 50, 3, 3]
+        data = self.src.get(10, [9, 3, 4])
+
+        self.assertEqual(data.shape, (3, 10))
+        self.assertEqual(list(data[0]), [3093, 3094, 3095, 3096, 3097, 3098, 3099, 3000, 3001, 3002])
+        self.assertEqual(list(data[1]), list(range(40, 50)))
+        self.assertEqual(list(data[2]), [0] * 10) # channel 4 is not configured
+        self.assertEqual(list(self.src.last_read_idxs), [50, 0, 0, 3])
+
+    def test_to_sink_records(self):
+        data = self.src.to_sink_records(np.r_[98:100, 0:2])
+        self.assertEqual(data.dtype, self.src.send_to_sinks_dtype)
+        self.assertEqual(list(data['chan3']), [98, 99, 0, 1])
+        self.assertEqual(list(data['chan9']), [3098, 3099, 3000, 3001])
+
+
 class TestDataSourceSystem(unittest.TestCase):
     @swreq(req_source)
     def test_basic_data_source_get(self):
@@ -90,6 +134,85 @@ class TestDataSourceSystem(unittest.TestCase):
             if len(data) > 0:
                 self.assertEqual((data[0] + len(data) - 1) % 255, data[-1])
 
+    def test_source_polling_lockfree(self):
+        src = source.DataSource(MockDataSourceSystem3, send_data_to_sink_manager=False, lockfree=True)
+        src.start()
+
+        data_all = []
+        for k in range(60):
+            data = src.get()
+            data_all.append(data.copy())
+            time.sleep(0.100)
+
+        src.stop()
+        del src
+
+        n_samples = 0
+        for data in data_all:
+            n_samples += len(data)
+            if len(data) > 0:
+                self.assertEqual((data[0]["value"] + len(data) - 1) % 255, data[-1]["value"])
+        self.assertTrue(n_samples > 0)
+
+    def test_lockfree_ring_wraparound(self):
+        """Lock-free reads should return read-only views, or one copy when the data wraps around"""
+        src = source.DataSource(MockDataSourceSystem, bufferlen=1, send_data_to_sink_manager=False, lockfree=True)
+        for k in range(src.max_len - 2):
+            src.write_ring(np.array([k], dtype=MockDataSourceSystem.dtype))
+
+        data = src.get()
+        self.assertEqual(len(data), src.max_len - 2)
+        self.assertFalse(data.flags.writeable)
+        self.assertTrue(np.shares_memory(data, src.ring))
+
+        for k in range(src.max_len - 2, src.max_len + 10):
+            src.write_ring(np.array([k], dtype=MockDataSourceSystem.dtype))
+
+        data = src.get()
+        self.assertEqual(list(data["value"]), list(range(src.max_len - 2, src.max_len + 10)))
+        self.assertFalse(np.shares_memory(data, src.ring))
+
+        data = src.get(all=True)
+        self.assertEqual(len(data), src.max_len)
+        self.assertEqual(data["value"][-1], src.max_len + 9)
+
+    def test_source_polling_batched(self):
+        for lockfree in [False, True]:
+            for system in [MockBatchedDataSourceSystem, MockBatchedDataSourceSystem2]:
+                src = source.DataSource(system, bufferlen=1, send_data_to_sink_manager=False, lockfree=lockfree)
+                src.start()
+
+                data_all = []
+                for k in range(20):
+                    data = src.get()
+                    data_all.append(np.array(data))
+                    time.sleep(0.100)
+
+                src.stop()
+                del src
+
+                data_all = [data for data in data_all if len(data) > 0]
+                self.assertTrue(len(data_all) > 0)
+                for data in data_all:
+                    if data.dtype.names is not None:
+                        data = data["value"]
+                    self.assertTrue(np.all(np.diff(data) % 255 == 1))
+                    self.assertEqual(len(data) % MockBatchedDataSourceSystem.block_size, 0)
+
+    def test_write_ring_block(self):
+        """Blocks of samples longer than the buffer or wrapping around it should keep the most recent samples"""
+        for lockfree in [False, True]:
+            src = source.DataSource(MockDataSourceSystem, bufferlen=1, send_data_to_sink_manager=False, lockfree=lockfree)
+            max_len = src.max_len
+            src.write_ring(np.array(np.arange(max_len - 3), dtype=MockDataSourceSystem.dtype))
+            src.get()
+            src.write_ring(np.array(np.arange(10), dtype=MockDataSourceSystem.dtype))
+            self.assertEqual(list(src.get()["value"]), list(range(10)))
+
+            src.write_ring(np.array(np.arange(max_len + 5), dtype=MockDataSourceSystem.dtype))
+            self.assertEqual(list(src.get()["value"]), list(range(5, max_len + 5)))
+            self.assertEqual(src.idx.value, 2*max_len + 12)
+
     def test_source_get_all(self):
         """source.get(all=True) should produce a growing output"""
         src = source.DataSource(MockDataSourceSystem, send_data_to_sink_manager=False)
@@ -0,0 +1,111 @@
+'''
+Append-only storage for fixed-dtype records, e.g., one row of task data per cycle
+'''
+import numpy as np
+
+
+class GrowingRecordArray(object):
+    '''
+    Structured array which is preallocated and grown geometrically as records are
+    appended, so that appending is amortized O(1) and the full history can be
+    accessed as a single record array without concatenating.
+
+    If a filename is given, the records are stored in a memory-mapped file instead
+    of in memory. The file is raw, i.e., without a header, and can be read back
+    with np.memmap(filename, dtype=dtype, mode='r')[:n_records].
+    '''
+    def __init__(self, dtype, capacity=1024, growth_factor=2, filename=None):
+        '''
+        Constructor for GrowingRecordArray
+
+        Parameters
+        ----------
+        dtype : np.dtype or list of tuples
+            Data type of a single record
+        capacity : int, optional, default=1024
+            Number of records to preallocate
+        growth_factor : float, optional, default=2
+            Factor by which to increase the capacity when the buffer is full
+        filename : string, optional, default=None
+            If specified, path of the file to memory-map the records to
+
+        Returns
+        -------
+        GrowingRecordArray instance
+        '''
+        if growth_factor <= 1:
+            raise ValueError("growth_factor must be greater than 1")
+        self.dtype = np.dtype(dtype)
+        self.growth_factor = growth_factor
+        self.filename = filename
+        self.n_records = 0
+        self.buffer = self._alloc(max(int(capacity), 1), mode='w+')
+
+    def _alloc(self, capacity, mode='r+'):
+        if self.filename is None:
+            buf = np.zeros(capacity, dtype=self.dtype)
+            if self.n_records > 0:
+                buf[:self.n_records] = self.buffer[:self.n_records]
+            return buf
+        else:
+            # np.memmap extends the file if it is smaller than the requested shape
+            return np.memmap(self.filename, dtype=self.dtype, mode=mode, shape=(capacity,))
+
+    def _reserve(self, n_records):
+        capacity = len(self.buffer)
+        if n_records <= capacity:
+            return
+        while capacity < n_records:
+            capacity = int(np.ceil(capacity * self.growth_factor))
+        if self.filename is not None:
+            self.buffer.flush()
+        self.buffer = self._alloc(capacity)
+
+    def append(self, record):
+        '''
+        Add one or more records to the end of the array
+
+        Parameters
+        ----------
+        record : np.ndarray or np.void
+            Record(s) of the same dtype as the array, e.g., a (1,)-shaped task_data array
+
+        Returns
+        -------
+        None
+        '''
+        record = np.asarray(record, dtype=self.dtype).ravel()
+        n_new = len(record)
+        self._reserve(self.n_records + n_new)
+        if n_new == 1:
+            self.buffer[self.n_records] = record[0]
+        else:
+            self.buffer[self.n_records:self.n_records + n_new] = record
+        self.n_records += n_new
+
+    def get_all(self):
+        '''
+        Returns a view of all the records appended so far. The view is not copied,
+        so it is only valid until the next append which grows the buffer.
+
+        Returns
+        -------
+        np.recarray of shape (n_records,)
+        '''
+        return self.buffer[:self.n_records].view(np.recarray)
+
+    def flush(self):
+        '''
+        Write any pending changes to the memory-mapped file, if one is in use
+        '''
+        if self.filename is not None:
+            self.buffer.flush()
+
+    def __len__(self):
+        return self.n_records
+
+    def __getitem__(self, idx):
+        return self.get_all()[idx]
+
+    def __iter__(self):
+        return iter(self.get_all())
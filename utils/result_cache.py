@@ -0,0 +1,231 @@
+'''
+Persistent, content-addressed cache for analysis results
+'''
+import os
+import pickle
+import hashlib
+import inspect
+import tempfile
+import numpy as np
+
+
+def function_id(fn):
+    '''
+    Identity of a function for cache keys: its name and a hash of its source code, so
+    that cached results are invalidated when the function is edited
+
+    Parameters
+    ----------
+    fn : callable
+        Function or bound method
+
+    Returns
+    -------
+    string
+    '''
+    fn = getattr(fn, '__func__', fn)
+    try:
+        code = inspect.getsource(fn).encode()
+    except (OSError, TypeError):
+        code = fn.__code__.co_code
+    name = '%s.%s' % (getattr(fn, '__module__', ''), getattr(fn, '__qualname__', repr(fn)))
+    return '%s:%s' % (name, hashlib.sha1(code).hexdigest())
+
+
+class ResultCache(object):
+    '''
+    Directory of cached results, one file per key. Arrays are stored as .npy files and
+    memory-mapped when read; all other values are pickled. Files are written atomically
+    (to a temporary file which is then renamed), so many processes can read from and
+    write to the same cache. When the files exceed max_bytes, the least recently used
+    ones are deleted.
+
+    Rather than listing the directory on every write, the cache keeps a running estimate
+    of its size, and only checks the files when the estimate exceeds max_bytes or after
+    'scan_interval' writes (to account for results written by other processes).
+    '''
+    # Maximum number of writes between checks of the size of the cache directory
+    scan_interval = 100
+
+    def __init__(self, cache_dir, max_bytes=10*2**30):
+        '''
+        Constructor for ResultCache
+
+        Parameters
+        ----------
+        cache_dir : string
+            Directory in which to store the results. Created if it doesn't exist
+        max_bytes : int, optional, default=10 GB
+            Maximum total size of the cached results
+
+        Returns
+        -------
+        ResultCache instance
+        '''
+        self.cache_dir = cache_dir
+        self.max_bytes = max_bytes
+        os.makedirs(cache_dir, exist_ok=True)
+
+        self._size_estimate = None
+        self._n_writes = 0
+
+    @staticmethod
+    def key(*parts, **params):
+        '''
+        Make a cache key from everything the result depends on, e.g., the task entry ID,
+        the function which computes the result and its parameters. Functions are
+        identified by name and source code (see function_id).
+
+        Returns
+        -------
+        string
+            Hex digest which identifies the result
+        '''
+        parts = [function_id(x) if callable(x) else x for x in parts]
+        params = sorted(params.items())
+        return hashlib.sha1(pickle.dumps((parts, params), protocol=4)).hexdigest()
+
+    def _filename(self, key, ext):
+        return os.path.join(self.cache_dir, key + ext)
+
+    def get(self, key, default=None):
+        '''
+        Look up a cached result
+
+        Parameters
+        ----------
+        key : string
+            Key from ResultCache.key
+        default : object, optional, default=None
+            Value to return if the key is not in the cache
+
+        Returns
+        -------
+        object
+            Cached value, as a read-only memory-mapped array if it is an array
+        '''
+        for ext in ['.npy', '.pkl']:
+            filename = self._filename(key, ext)
+            try:
+                if ext == '.npy':
+                    value = np.load(filename, mmap_mode='r')
+                else:
+                    with open(filename, 'rb') as f:
+                        value = pickle.load(f)
+            except FileNotFoundError:
+                continue
+
+            # the modification time marks the last use, for LRU eviction
+            try:
+                os.utime(filename)
+            except OSError:
+                pass
+            return value
+        return default
+
+    def put(self, key, value):
+        '''
+        Add a result to the cache, replacing any previous value for the key
+
+        Parameters
+        ----------
+        key : string
+            Key from ResultCache.key
+        value : object
+            Result to store. Must be picklable if not a numeric array
+
+        Returns
+        -------
+        None
+        '''
+        # (empty arrays can't be memory-mapped)
+        if isinstance(value, np.ndarray) and not value.dtype.hasobject and value.size > 0:
+            ext, stale_ext = '.npy', '.pkl'
+        else:
+            ext, stale_ext = '.pkl', '.npy'
+
+        fd, tmp_filename = tempfile.mkstemp(dir=self.cache_dir, suffix='.tmp')
+        try:
+            with os.fdopen(fd, 'wb') as f:
+                if ext == '.npy':
+                    np.save(f, value, allow_pickle=False)
+                else:
+                    pickle.dump(value, f, protocol=4)
+                nbytes = f.tell()
+            os.replace(tmp_filename, self._filename(key, ext))
+        except:
+            os.remove(tmp_filename)
+            raise
+
+        try:
+            os.remove(self._filename(key, stale_ext))
+        except FileNotFoundError:
+            pass
+
+        # replacing a result over-counts its size, which at worst triggers an early check
+        self._n_writes += 1
+        if self._size_estimate is not None:
+            self._size_estimate += nbytes
+        if self._size_estimate is None or self._size_estimate > self.max_bytes \
+            or self._n_writes >= self.scan_interval:
+            self.evict()
+
+    def get_or_compute(self, key, fn, clean=False):
+        '''
+        Look up a cached result, computing and storing it if it is not in the cache
+
+        Parameters
+        ----------
+        key : string
+            Key from ResultCache.key
+        fn : callable
+            Function (no arguments) which computes the result
+        clean : bool, optional, default=False
+            If true, recompute the result even if it is in the cache
+
+        Returns
+        -------
+        object
+        '''
+        missing = object()
+        value = missing if clean else self.get(key, missing)
+        if value is missing:
+            value = fn()
+            self.put(key, value)
+        return value
+
+    def evict(self):
+        '''
+        Delete the least recently used results until the cache is no larger than max_bytes
+        '''
+        entries = []
+        for name in os.listdir(self.cache_dir):
+            if not (name.endswith('.npy') or name.endswith('.pkl')):
+                continue
+            try:
+                stat = os.stat(os.path.join(self.cache_dir, name))
+            except FileNotFoundError:
+                continue
+            entries.append((stat.st_mtime, stat.st_size, name))
+
+        total_bytes = sum(size for _, size, _ in entries)
+        for _, size, name in sorted(entries):
+            if total_bytes <= self.max_bytes:
+                break
+            try:
+                # readers which already memory-mapped the file keep their data
+                os.remove(os.path.join(self.cache_dir, name))
+            except FileNotFoundError:
+                pass
+            total_bytes -= size
+
+        self._size_estimate = total_bytes
+        self._n_writes = 0
+
+    def clear(self):
+        '''
+        Delete all the cached results
+        '''
+        max_bytes, self.max_bytes = self.max_bytes, 0
+        self.evict()
+        self.max_bytes = max_bytes